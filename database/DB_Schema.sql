@@ -251,7 +251,18 @@ CREATE TABLE strategy_statistics (
   total_ibov_yield REAL NOT NULL,
   total_ibov_yield_ann REAL NOT NULL,
   total_baseline_yield REAL NOT NULL,
-  total_baseline_yield_ann REAL NOT NULL
+  total_baseline_yield_ann REAL NOT NULL,
+  -- Monte Carlo confidence intervals, NULL if not computed
+  profit_ci_low DECIMAL (8,2),
+  profit_ci_high DECIMAL (8,2),
+  max_drawdown_ci_low REAL,
+  max_drawdown_ci_high REAL,
+  shuffled_max_drawdown_ci_low REAL,
+  shuffled_max_drawdown_ci_high REAL,
+  sharpe_ratio_ci_low REAL,
+  sharpe_ratio_ci_high REAL,
+  daily_max_drawdown_ci_low REAL,
+  daily_max_drawdown_ci_high REAL
 );
 
 CREATE TABLE strategy_performance (
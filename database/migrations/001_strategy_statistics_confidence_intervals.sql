@@ -0,0 +1,13 @@
+-- Add Monte Carlo confidence intervals to databases created before them.
+-- Columns are nullable: strategies without Monte Carlo resampling leave them NULL.
+ALTER TABLE strategy_statistics
+  ADD COLUMN IF NOT EXISTS profit_ci_low DECIMAL (8,2),
+  ADD COLUMN IF NOT EXISTS profit_ci_high DECIMAL (8,2),
+  ADD COLUMN IF NOT EXISTS max_drawdown_ci_low REAL,
+  ADD COLUMN IF NOT EXISTS max_drawdown_ci_high REAL,
+  ADD COLUMN IF NOT EXISTS shuffled_max_drawdown_ci_low REAL,
+  ADD COLUMN IF NOT EXISTS shuffled_max_drawdown_ci_high REAL,
+  ADD COLUMN IF NOT EXISTS sharpe_ratio_ci_low REAL,
+  ADD COLUMN IF NOT EXISTS sharpe_ratio_ci_high REAL,
+  ADD COLUMN IF NOT EXISTS daily_max_drawdown_ci_low REAL,
+  ADD COLUMN IF NOT EXISTS daily_max_drawdown_ci_high REAL;
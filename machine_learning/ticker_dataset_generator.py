@@ -8,6 +8,7 @@ import math
 sys.path.insert(1, str(Path(__file__).parent.parent/'src'))
 import ml_constants as mlc
 from db_model import DBStrategyAnalyzerModel
+from rolling_spearman import RollingSpearman
 
 class TickerDatasetGenerator:
 
@@ -671,6 +672,8 @@ class TickerDatasetGenerator2:
 
         # Spearman Correlation Variables
         spearman_corrs = {name: 0.0 for name in self.spearman_corr_column_names}
+        rolling_spearman = RollingSpearman(tuple(dict.fromkeys(
+            (N_pri, *self.spearman_correlations))))
 
         first_iteration = True
         for row_idx, row in candles_df_day.iterrows():
@@ -695,6 +698,7 @@ class TickerDatasetGenerator2:
 
                 # Support variables
                 last_mid_prices.append( (open+close)/2 )
+                rolling_spearman.push( last_mid_prices[-1] )
                 last_max_prices.append( high )
                 last_min_prices.append( low )
                 last_volumes.append( volume )
@@ -722,9 +726,7 @@ class TickerDatasetGenerator2:
             else:
                 # Variables of trend identification Section
                 if len(last_mid_prices) >= N_pri:
-                    cum_spearman.append( stats.spearmanr(
-                        self.spearman_reference[0:N_pri],
-                        last_mid_prices[len(last_mid_prices) - N_pri : len(last_mid_prices)]).correlation )
+                    cum_spearman.append( rolling_spearman.correlation(N_pri) )
                     avg_price.append( np.mean(
                         last_mid_prices[len(last_mid_prices) - N_pri : len(last_mid_prices)]) )
                     std_price.append( np.std(
@@ -825,8 +827,7 @@ class TickerDatasetGenerator2:
 
                     for idx, spear_n in enumerate(self.spearman_correlations):
                         if len(last_mid_prices) >= spear_n:
-                            corr = stats.spearmanr(self.spearman_reference[:spear_n],
-                                last_mid_prices[len(last_mid_prices) - spear_n : len(last_mid_prices)]).correlation
+                            corr = rolling_spearman.correlation(spear_n)
 
                             if math.isnan(corr):
                                 corr = 0.0
@@ -853,6 +854,7 @@ class TickerDatasetGenerator2:
 
                 # Support variables must be the last to avoid non-causality
                 last_mid_prices.append( (open+close)/2 )
+                rolling_spearman.push( last_mid_prices[-1] )
                 last_max_prices.append( high )
                 last_min_prices.append( low )
                 last_volumes.append( volume )
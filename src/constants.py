@@ -9,7 +9,14 @@ MODEL_SUFFIX = '_model.joblib'
 TICKERS_OPER_OPT_PATH = 'optimizers/stop_loss_optimizer/out_csv_files/tickers_oper_opt.csv'
 DATASETS_PATH = 'machine_learning/datasets/'
 DATASET_SUFFIX = '_dataset.csv'
-TICKERS_INFO_PATH = 'src/tickers_info.csv'
+TICKERS_INFO_PATH = 'src/tickers_info/'
+TICKERS_INFO_SUFFIX = '_info.npz'
+SIGNALS_PATH = 'machine_learning/signals/'
+SIGNALS_SUFFIX = '_signals.npz'
+CHECKPOINTS_PATH = 'checkpoints/'
+CHECKPOINT_SUFFIX = '_checkpoint.pkl'
+YAHOO_CACHE_PATH = 'yahoo_cache/'
+YAHOO_CACHE_SUFFIX = '_history.pkl'
 
 # Log
 LOG_FILENAME = 'app.log'
@@ -34,6 +41,14 @@ WFO_MODEL_TAGS = {
     '2021_4': {'end_year': 2023, 'end_month': 12, 'end_day': 31}, # Proposital extended duration
 }
 
+# Monte Carlo robustness statistics (resamples when enabled with --monte-carlo)
+MONTE_CARLO_RESAMPLES = 10000
+MONTE_CARLO_CONFIDENCE = 0.95
+MONTE_CARLO_SEED = 0
+
+# Feature generation
+FEATURES_BATCH_SIZE = 8
+
 # Exit error/warning codes
 CONFIG_FILE_ERR = 1
 DATA_SOURCE_ERR = 2
@@ -1,5 +1,6 @@
 import psycopg2
 import os
+import io
 import logging
 from pathlib import Path
 from logging.handlers import RotatingFileHandler
@@ -11,6 +12,7 @@ from datetime import timedelta
 
 import constants as c
 from utils import State
+from operation import Operation
 
 # Database macros
 DB_USER = os.environ.get('STOCK_MARKET_DB_USER')
@@ -50,6 +52,10 @@ class DBTickerModel:
         self._connection.close()
         self._cursor.close()
 
+    def rollback(self):
+        """Roll back the current transaction, so a failed query does not block the next ones."""
+        self._connection.rollback()
+
     def _insert_update(self, query, params=None):
         """Insert/Update given query in database."""
         try:
@@ -195,6 +201,107 @@ class DBTickerModel:
 
         self._insert_update(query)
 
+    def load_daily_data(self, candles_df, splits_df, dividends_df, normalizations_df):
+        """
+        Insert daily candlesticks, splits and dividends of many tickers and
+        normalize previous candlesticks, in a single transaction.
+
+        Same result of `insert_daily_candles()`, `upsert_splits()`,
+        `upsert_dividends()` and `normalize_daily_candles()` of each ticker, but
+        candles are copied in bulk to a temporary table and each table is written
+        by a single statement, so 'daily_candles' trigger runs once per statement
+        instead of once per ticker. Nothing is written if any statement fails.
+
+        Args
+        ----------
+        candles_df : `pandas.DataFrame`
+            DataFrame of candles with columns 'ticker', 'day', 'Open', 'High',
+            'Low', 'Close', 'Volume' and 'ordinary'. Non ordinary tickers allow
+            duplicate pkey insertion.
+        splits_df : `pandas.DataFrame`
+            DataFrame of splits with columns 'ticker', 'day' and 'Stock Splits'.
+        dividends_df : `pandas.DataFrame`
+            DataFrame of dividends with columns 'ticker', 'day' and 'Dividends'.
+        normalizations_df : `pandas.DataFrame`
+            DataFrame with columns 'ticker', 'start_date', 'end_date' and
+            'normalization_factor'. Candles of each ticker in the closed interval
+            are divided by its factor.
+        """
+        queries = []
+
+        if not candles_df.empty:
+            queries.append("CREATE TEMP TABLE daily_candles_load (\n"
+                "  ticker VARCHAR(7),\n  day TIMESTAMP WITHOUT TIME ZONE,\n"
+                "  open_price DECIMAL(8, 2),\n  max_price DECIMAL(8, 2),\n"
+                "  min_price DECIMAL(8, 2),\n  close_price DECIMAL(8, 2),\n"
+                "  volume BIGINT,\n  ordinary BOOLEAN\n) ON COMMIT DROP")
+
+            columns = "ticker, day, open_price, max_price, min_price, close_price, volume"
+            queries.append(f"INSERT INTO daily_candles ({columns})\n"
+                f"SELECT {columns} FROM daily_candles_load WHERE ordinary;")
+            queries.append(f"INSERT INTO daily_candles ({columns})\n"
+                f"SELECT {columns} FROM daily_candles_load WHERE NOT ordinary\n"
+                f"ON CONFLICT ON CONSTRAINT daily_data_pkey DO NOTHING;")
+
+        if not splits_df.empty:
+            values = ",\n".join(f"('{ticker}', '{day}', {ratio})" for ticker, day, ratio in \
+                zip(splits_df['ticker'], splits_df['day'].dt.strftime('%Y-%m-%d'),
+                splits_df['Stock Splits'].tolist()))
+            queries.append(f"INSERT INTO split (ticker, split_date, ratio)\nVALUES\n{values}\n"
+                f"ON CONFLICT ON CONSTRAINT split_pkey DO\nUPDATE SET ratio = EXCLUDED.ratio")
+
+        if not dividends_df.empty:
+            values = ",\n".join(f"('{ticker}', '{day}', {price})" for ticker, day, price in \
+                zip(dividends_df['ticker'], dividends_df['day'].dt.strftime('%Y-%m-%d'),
+                dividends_df['Dividends'].tolist()))
+            queries.append(f"INSERT INTO dividends (ticker, payment_date, price_per_stock)\n"
+                f"VALUES\n{values}\nON CONFLICT ON CONSTRAINT dividends_pkey DO\n"
+                f"UPDATE SET price_per_stock = EXCLUDED.price_per_stock")
+
+        if not normalizations_df.empty:
+            values = ",\n".join(f"('{ticker}', '{start.strftime('%Y-%m-%d')}'::TIMESTAMP, "
+                f"'{end.strftime('%Y-%m-%d')}'::TIMESTAMP, {factor:.6f})" \
+                for ticker, start, end, factor in zip(normalizations_df['ticker'],
+                normalizations_df['start_date'], normalizations_df['end_date'],
+                normalizations_df['normalization_factor']))
+            query = f'UPDATE daily_candles dc\nSET\n'
+            query += f"  open_price = dc.open_price/n.factor,\n"
+            query += f"  max_price = dc.max_price/n.factor,\n"
+            query += f"  min_price = dc.min_price/n.factor,\n"
+            query += f"  close_price = dc.close_price/n.factor\n"
+            query += f"FROM (VALUES\n{values}\n) AS n (ticker, start_date, end_date, factor)\n"
+            query += f"WHERE\n  dc.ticker = n.ticker\n"
+            query += f"  AND dc.day >= n.start_date\n"
+            query += f"  AND dc.day <= n.end_date"
+            queries.append(query)
+
+        if not queries:
+            return
+
+        # Same formatting of insert_daily_candles()
+        candles_buffer = io.StringIO()
+        candles_df.assign(Volume=candles_df['Volume'].map('{:.0f}'.format)).to_csv(
+            candles_buffer, columns=['ticker', 'day', 'Open', 'High', 'Low', 'Close',
+            'Volume', 'ordinary'], header=False, index=False, date_format='%Y-%m-%d',
+            float_format='%.6f')
+        candles_buffer.seek(0)
+
+        query = None
+        try:
+            for n, query in enumerate(queries):
+                self._cursor.execute(query)
+                if n == 0 and not candles_df.empty:
+                    query = "COPY daily_candles_load FROM STDIN WITH (FORMAT csv)"
+                    self._cursor.copy_expert(query, candles_buffer)
+            self._connection.commit()
+        except Exception as error:
+            logger.error('Error executing query "{}", error:\n{}'.format(query, error))
+            self._connection.rollback()
+            self._connection.close()
+            self._cursor.close()
+            # sys.exit(c.QUERY_ERR)
+            raise error
+
     def delete_weekly_candles(self, ticker):
         """
         Delete all weekly candlesticks of ticker.
@@ -321,6 +428,52 @@ class DBTickerModel:
         """
         Update/Insert features.
         """
+        self._insert_update(self._get_upsert_features_query(df, interval=interval))
+
+    def replace_features(self, tickers, daily_features_df, weekly_features_df):
+        """
+        Replace all features of many tickers in a single transaction.
+
+        Same result of `delete_features()` and `upsert_features()` of each
+        ticker and interval, with a single statement per table. Nothing is
+        written if any statement fails.
+
+        Args
+        ----------
+        tickers : `list` of str
+            Tickers names. All their features are deleted.
+        daily_features_df : `pandas.DataFrame`
+            New daily features, same columns of `upsert_features()`.
+        weekly_features_df : `pandas.DataFrame`
+            New weekly features, same columns of `upsert_features()`.
+        """
+        if not tickers:
+            return
+
+        tickers_list = ", ".join(f"\'{ticker}\'" for ticker in tickers)
+        queries = [f"DELETE FROM daily_features\nWHERE\n  ticker IN ({tickers_list});",
+            f"DELETE FROM weekly_features\nWHERE\n  ticker IN ({tickers_list});"]
+
+        if not daily_features_df.empty:
+            queries.append(self._get_upsert_features_query(daily_features_df, interval='1d'))
+        if not weekly_features_df.empty:
+            queries.append(self._get_upsert_features_query(weekly_features_df, interval='1wk'))
+
+        query = None
+        try:
+            for query in queries:
+                self._cursor.execute(query)
+            self._connection.commit()
+        except Exception as error:
+            logger.error('Error executing query "{}", error:\n{}'.format(query, error))
+            self._connection.rollback()
+            self._connection.close()
+            self._cursor.close()
+            # sys.exit(c.QUERY_ERR)
+            raise error
+
+    def _get_upsert_features_query(self, df, interval='1d'):
+
         table = 'daily_features'
         time_column = 'day'
         if interval == '1wk':
@@ -375,7 +528,7 @@ class DBTickerModel:
         #     f"peak = EXCLUDED.peak, ema_17 = EXCLUDED.ema_17, ema_72 = EXCLUDED.ema_72, " \
         #     f"up_down_trend_status = EXCLUDED.up_down_trend_status;"
 
-        self._insert_update(query)
+        return query
 
 class DBGenericModel:
     """Database connection class that handles generic queries."""
@@ -579,6 +732,12 @@ class DBGenericModel:
 
 class DBStrategyModel:
 
+    # Optional strategy_statistics columns of Monte Carlo confidence intervals
+    confidence_intervals = ('profit_ci_low', 'profit_ci_high', 'max_drawdown_ci_low',
+        'max_drawdown_ci_high', 'shuffled_max_drawdown_ci_low', 'shuffled_max_drawdown_ci_high',
+        'sharpe_ratio_ci_low', 'sharpe_ratio_ci_high', 'daily_max_drawdown_ci_low',
+        'daily_max_drawdown_ci_high')
+
     def __init__(self, name, tickers, start_dates, end_dates, total_capital, alias=None,
         comment=None, risk_capital_product=None, min_order_volume=1, min_risk= None, max_risk=None,
         max_days_per_operation=None, partial_sale=None, min_days_after_successful_operation=None,
@@ -894,6 +1053,28 @@ class DBStrategyModel:
 
         return df
 
+    def get_last_updates(self, tickers):
+        """
+        Get last update of daily candles in symbol_status table.
+
+        Args
+        ----------
+        tickers : `list` of str
+            Tickers names.
+
+        Returns
+        ----------
+        `dict`
+            Ticker and its last update, only for tickers in symbol_status table.
+        """
+        query = f"SELECT ticker, last_update_daily_candles\n"
+        query += f"FROM symbol_status\n"
+        query += f"WHERE ticker in {str(list(tickers)).replace('[', '(').replace(']', ')')};"
+
+        df = pd.read_sql_query(query, self._connection)
+
+        return dict(zip(df['ticker'], df['last_update_daily_candles']))
+
     def insert_strategy_results(self, result_parameters, operations, performance_dataframe):
         strategy_id = self._insert_strategy()
         self._insert_strategy_tickers(strategy_id)
@@ -953,6 +1134,8 @@ class DBStrategyModel:
 
     def _insert_operations(self, strategy_id, operations):
 
+        operation_ids = []
+
         for operation in operations:
             query = f"INSERT INTO operation (strategy_id, ticker, start_date, end_date, " \
                 f"state, target_purchase_price, target_sale_price, stop_loss, profit, yield)\nVALUES\n"
@@ -975,53 +1158,52 @@ class DBStrategyModel:
 
             query += f"RETURNING id;"
 
-            operation_id = self._insert_update_with_returning(query)
+            operation_ids.append(self._insert_update_with_returning(query))
 
-            self._insert_negotiations(operation_id, operation)
+        self._insert_negotiations(operation_ids, Operation.get_negotiations_log(operations))
 
-    def _insert_negotiations(self, operation_id, operation):
+    def _insert_negotiations(self, operation_ids, negotiations_log):
+        """
+        Insert negotiations of all operations in a single query.
 
-        number_of_negotiations = operation.number_of_orders
-        current_negotiation = 0
+        Args
+        ----------
+        operation_ids : `list` of int
+            Database id of each operation.
+        negotiations_log : `np.ndarray`
+            Structured array from `Operation.get_negotiations_log()`.
+        """
+        if len(negotiations_log) == 0:
+            return
 
         query = f"INSERT INTO negotiation (operation_id, day, buy_sell_flag, price, " \
             f"volume, stop_flag, partial_sale_flag, timeout_flag)\nVALUES\n"
 
-        for index in range(len(operation.purchase_price)):
-            query += f"({operation_id}, \'{operation.purchase_datetime[index].strftime('%Y-%m-%d')}\', " \
-                f"'B', {operation.purchase_price[index]:.2f}, {operation.purchase_volume[index]:.0f}, " \
-                f"False, False, False)"
+        query += ',\n'.join(f"({operation_ids[op_idx]}, \'{day}\', '{buy_sell_flag}', " \
+            f"{price:.2f}, {volume:.0f}, {stop_flag}, {partial_sale_flag}, {timeout_flag})" \
+            for op_idx, day, buy_sell_flag, price, volume, stop_flag, partial_sale_flag, \
+            timeout_flag in negotiations_log.tolist())
 
-            current_negotiation += 1
-
-            if current_negotiation != number_of_negotiations:
-                query += ',\n'
-            else:
-                query += ';'
-
-        for index in range(len(operation.sale_price)):
-            query += f"({operation_id}, \'{operation._sale_datetime[index].strftime('%Y-%m-%d')}\', " \
-                f"'S', {operation.sale_price[index]:.2f}, {operation.sale_volume[index]:.0f}, " \
-                f"{operation.stop_loss_flag[index]}, {operation.partial_sale_flag[index]}, " \
-                f"{operation.timeout_flag[index]})"
-
-            current_negotiation += 1
-
-            if current_negotiation != number_of_negotiations:
-                query += ',\n'
-            else:
-                query += ';'
+        query += ';'
 
         self._insert_update(query)
 
     def _insert_strategy_statistics(self, strategy_id, result_parameters):
+        # Monte Carlo confidence intervals are optional: only computed ones are listed, so
+        # databases without their columns (see database/migrations) still accept strategies
+        ci_names = [name for name in DBStrategyModel.confidence_intervals \
+            if name in result_parameters]
+        ci_columns = ''.join(f", {name}" for name in ci_names)
+        ci_values = ''.join(f", {result_parameters[name]}" \
+            if math.isfinite(result_parameters[name]) else ", NULL" for name in ci_names)
+
         query = f"INSERT INTO strategy_statistics (strategy_id, total_volatility, " \
             f"volatility_ann, baseline_total_volatility, baseline_volatility_ann, sharpe_ratio, " \
             f"baseline_sharpe_ratio, sortino_ratio, baseline_sortino_ratio, ibov_pearson_corr, " \
             f"ibov_spearman_corr, baseline_pearson_corr, " \
             f"baseline_spearman_corr, profit, max_used_capital, avg_used_capital, total_yield, " \
             f"total_yield_ann, total_ibov_yield, total_ibov_yield_ann, total_baseline_yield, " \
-            f"total_baseline_yield_ann)\nVALUES\n"
+            f"total_baseline_yield_ann{ci_columns})\nVALUES\n"
 
         query += f"  ({strategy_id}, {result_parameters['total_volatility']}, " \
             f"{result_parameters['volatility_ann']}, {result_parameters['baseline_total_volatility']}, " \
@@ -1034,7 +1216,7 @@ class DBStrategyModel:
             f"{result_parameters['avg_used_capital']}, {result_parameters['total_yield']}, " \
             f"{result_parameters['total_yield_ann']}, {result_parameters['total_ibov_yield']}, " \
             f"{result_parameters['total_ibov_yield_ann']}, {result_parameters['total_baseline_yield']}, " \
-            f"{result_parameters['total_baseline_yield_ann']});"
+            f"{result_parameters['total_baseline_yield_ann']}{ci_values});"
 
         self._insert_update(query)
 
@@ -0,0 +1,165 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+import constants as c
+from utils import RunTime
+from market_cube import MarketCube
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+class LockstepEngine:
+    """
+    Run several `MLDerivationStrategy` variants over the same data in lockstep.
+
+    Variants must only differ on portfolio parameters (capital, risk capital
+    coefficient, dynamic RCC, operation risk, halts, etc.). Market data, models,
+    indicators and performance records are computed once per day and shared,
+    while each variant keeps its own `TickerState` list, capital and operations.
+    Predictions of the same ticker and risk are also shared in a day.
+
+    Results are the same as running each variant alone.
+
+    Args
+    ----------
+    strategies : `list` of `MLDerivationStrategy`
+        Strategy variants. First one leads data, models and indicators update.
+
+    Properties
+    ----------
+    strategies : `list` of `MLDerivationStrategy`
+        Strategy variants.
+
+    Methods
+    ----------
+    process_operations()
+        Process each ticker and day of all variants.
+    calculate_statistics()
+        Calculate statistics of all variants.
+    save()
+        Save all variants.
+    """
+    # Parameters that change parsed data and must be equal among variants
+    _shared_parameters = ('tickers_and_dates', 'purchase_margin', 'stop_margin',
+        'min_risk', 'max_risk')
+
+    def __init__(self, strategies):
+
+        if len(strategies) == 0:
+            logger.error(f"Lockstep engine needs at least one strategy.")
+            raise Exception
+
+        lead = strategies[0]
+
+        for strategy in strategies[1:]:
+            if type(strategy) is not type(lead):
+                logger.error(f"Lockstep strategies must be of the same type.")
+                raise Exception
+
+            for parameter in LockstepEngine._shared_parameters:
+                if getattr(strategy, parameter) != getattr(lead, parameter):
+                    logger.error(f"Lockstep strategies must have the same "
+                        f"\'{parameter}\'.")
+                    raise Exception
+
+        self._strategies = list(strategies)
+
+    @property
+    def strategies(self):
+        return self._strategies
+
+    @RunTime('lockstep_process_operations')
+    def process_operations(self, days_before_start=120):
+        """
+        Process each ticker and day of all variants.
+
+        Args
+        ----------
+        days_before_start : int, default 120
+            Days of data before first ticker start date.
+        """
+        try:
+            lead = self._strategies[0]
+
+            data_gen = lead.DataGen(lead.tickers_and_dates, lead._db_strategy_model,
+                days_batch=30, days_before_start=days_before_start)
+            market_cube = MarketCube(lead.tickers_and_dates, data_gen)
+
+            shared_predictions = {}
+            variants_state = []
+
+            for strategy in self._strategies:
+                tcks_priority, ref_data = strategy._start_operations(market_cube,
+                    days_before_start)
+                variants_state.append([tcks_priority, ref_data])
+
+                strategy._lockstep = True
+                strategy._shared_predictions = shared_predictions
+                strategy.last_data = lead.last_data
+                strategy._performance_recorder = lead._performance_recorder
+
+            for day_idx in range(len(market_cube)):
+                self._load_models(market_cube.days[day_idx])
+                self._update_indicators(market_cube, day_idx)
+                shared_predictions.clear()
+
+                for strategy, state in zip(self._strategies, variants_state):
+                    state[0] = strategy._process_day(state[0], market_cube, day_idx, state[1])
+
+                lead._record_performance(market_cube, day_idx)
+
+            for strategy, state in zip(self._strategies, variants_state):
+                strategy._finish_operations(state[0])
+                strategy._lockstep = False
+                strategy._shared_predictions = None
+
+        except Exception as error:
+            logger.exception(f"Error processing lockstep operations, error:\n{error}")
+            # sys.exit(c.PROCESSING_OPERATIONS_ERR)
+            raise error
+
+    def _load_models(self, day):
+        """Load models once and share them with all variants."""
+        lead = self._strategies[0]
+
+        # Models loaded on demand by any variant are loaded for all
+        if lead._current_model_tag in [strategy._models_tag for strategy in self._strategies]:
+            lead._models_tag = lead._current_model_tag
+
+        lead._load_models(day, wfo=True)
+
+        for strategy in self._strategies[1:]:
+            strategy._current_model_tag = lead._current_model_tag
+            strategy._models = lead._models
+            strategy._models_tag = lead._models_tag
+            strategy._signal_table = lead._signal_table
+
+    def _update_indicators(self, market_cube, day_idx):
+        """Update indicators of every ticker with valid data, shared by all variants."""
+        lead = self._strategies[0]
+
+        for ticker, dates in lead.tickers_and_dates.items():
+            business_data = lead._get_empty_business_data()
+
+            if lead._parse_data(ticker, dates['start_date'], dates['end_date'],
+                market_cube, day_idx, business_data):
+                lead._update_mid_prices(lead.last_data[ticker], business_data)
+
+    def calculate_statistics(self):
+        """Calculate statistics of all variants."""
+        for strategy in self._strategies:
+            strategy.calculate_statistics()
+
+    def save(self):
+        """Save all variants."""
+        for strategy in self._strategies:
+            strategy.save()
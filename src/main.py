@@ -12,6 +12,8 @@ import constants as c
 import config_reader as cr
 from ticker_manager import TickerManager
 from strategy import MLDerivationStrategy
+from lockstep_engine import LockstepEngine
+from model_cache import ModelCache
 
 # Configure Logging
 logger = logging.getLogger(__name__)
@@ -26,7 +28,8 @@ logger.setLevel(logging.DEBUG)
 accepted_strategies = ('ML')
 pbar = None
 
-def update_tickers_and_get_strategies():
+def update_tickers_and_get_strategies(max_requests=None, panel=False, processes=None,
+    replay_cache=False):
     logger.info('Program started.')
 
     # Read Config File
@@ -43,60 +46,184 @@ def update_tickers_and_get_strategies():
     ticker_managers.append(TickerManager('BRL=X', config.min_start_date,
         config.max_end_date, ordinary_ticker=False)) # USD/BRL
 
-    # Update and generate features
     for tm in ticker_managers:
         tm.holidays = config.holidays
         tm.min_risk = config.min_risk_features
         tm.max_risk = config.max_risk_features
 
-        update_ok = tm.update()
-        if update_ok:
-            features_ok = tm.generate_features()
-            # Remove inconsistent tickers from all strategies
-            if features_ok is False:
-                for index in range(len(config.strategies)):
-                    if tm.ticker in list(config.strategies[index]['tickers'].keys()):
-                        config.strategies[index]['tickers'].pop(tm.ticker)
+    if max_requests is not None:
+        TickerManager.yahoo_fetcher.max_workers = max_requests
+
+    TickerManager.yahoo_fetcher.replay = replay_cache
+
+    if panel is True:
+        # Request missing candles of all tickers at once, load them in one transaction
+        updates = TickerManager.update_panel(ticker_managers)
+    else:
+        # Request missing candles concurrently, then update database one ticker at a time
+        TickerManager.prefetch_candles(ticker_managers)
+        updates = None
+
+    # Update, then generate features of updated tickers in parallel
+    updated_tms = [tm for tm in ticker_managers \
+        if (updates[tm] if updates is not None else tm.update())]
+    features = TickerManager.generate_features_batch(updated_tms, processes=processes)
+
+    for tm, features_ok in features.items():
+        # Remove inconsistent tickers from all strategies
+        if features_ok is False:
+            for index in range(len(config.strategies)):
+                if tm.ticker in list(config.strategies[index]['tickers'].keys()):
+                    config.strategies[index]['tickers'].pop(tm.ticker)
 
     return config.strategies
 
-def run_strategy(strategy, strategy_number, total_strategies, stdout_prints=False):
+def create_strategy(strategy, strategy_number=1, total_strategies=1, stdout_prints=False,
+    monte_carlo_resamples=0, use_signal_table=False):
+
+    if strategy['name'] == 'ML':
+        ml_strategy = MLDerivationStrategy(
+            strategy['tickers'],
+            alias=strategy['alias'],
+            comment = strategy['comment'],
+            risk_capital_product=strategy['risk_capital_coefficient'],
+            total_capital=strategy['capital'],
+            min_order_volume=strategy['min_order_volume'],
+            partial_sale=strategy['partial_sale'],
+            min_risk=strategy['min_risk'],
+            max_risk=strategy['max_risk'],
+            purchase_margin=strategy['purchase_margin'],
+            stop_margin=strategy['stop_margin'],
+            stop_type=strategy['stop_type'],
+            min_days_after_successful_operation=strategy['min_days_after_successful_operation'],
+            min_days_after_failure_operation=strategy['min_days_after_failure_operation'],
+            gain_loss_ratio=strategy['gain_loss_ratio'],
+            max_days_per_operation=strategy['max_days_per_operation'],
+            tickers_bag=strategy['tickers_bag'],
+            tickers_number=strategy['tickers_number'],
+            strategy_number=strategy_number,
+            total_strategies=total_strategies,
+            stdout_prints=stdout_prints,
+            enable_frequency_normalization=strategy['enable_frequency_normalization'],
+            enable_profit_compensation=strategy['enable_profit_compensation'],
+            enable_crisis_halt=strategy['enable_crisis_halt'],
+            enable_downtrend_halt=strategy['enable_downtrend_halt'],
+            enable_dynamic_rcc=strategy['enable_dynamic_rcc'],
+            dynamic_rcc_reference=strategy['dynamic_rcc_reference'],
+            dynamic_rcc_k=strategy['dynamic_rcc_k'],
+            operation_risk=strategy['operation_risk'],
+            use_signal_table=use_signal_table
+        )
+        ml_strategy.monte_carlo_resamples = monte_carlo_resamples
+
+        return ml_strategy
+
+    return None
+
+def get_data_groups(strategies):
+    """
+    Group strategies sharing the same data.
+
+    Strategies with the same tickers, margins and risk limits only differ on
+    capital parameters, so features and predictions are the same for them.
+    Random tickers bags are not grouped.
+
+    Returns
+    ----------
+    `list` of `list` of int
+        Indexes in `strategies` of each group, one group per ungrouped strategy.
+    """
+    groups = {}
+
+    for idx, strategy in enumerate(strategies):
+        if strategy['name'] != 'ML' or strategy['tickers_bag'] == 'random':
+            groups[idx] = [idx]
+            continue
+
+        key = (tuple((ticker, str(dates['start_date']), str(dates['end_date'])) \
+            for ticker, dates in strategy['tickers'].items()), strategy['tickers_bag'],
+            strategy['tickers_number'], strategy['min_risk'], strategy['max_risk'],
+            strategy['purchase_margin'], strategy['stop_margin'])
+
+        groups.setdefault(key, []).append(idx)
+
+    return list(groups.values())
+
+def precompute_signals(strategies, processes=None):
+    """
+    Precompute model signals once for all strategies sharing the same data.
+
+    Only groups of more than one strategy are precomputed, one group per worker
+    process. Other strategies predict while processing their operations, in
+    their own worker process.
+
+    Returns
+    ----------
+    `set` of int
+        Indexes in `strategies` of strategies with precomputed signals.
+    """
+    groups = [group for group in get_data_groups(strategies) if len(group) > 1]
+
+    if not groups:
+        return set()
+
+    groups_args = [(strategies[group[0]], list(dict.fromkeys(strategies[idx]['operation_risk'] \
+        for idx in group))) for group in groups]
+
+    with Pool(min(processes or psutil.cpu_count(logical=False) or 1, len(groups))) as pool:
+        pool.starmap(precompute_group_signals, groups_args)
+
+    return {idx for group in groups for idx in group}
+
+def precompute_group_signals(strategy, operation_risks):
+
+    try:
+        ml_strategy = create_strategy(strategy)
+        ml_strategy.precompute_signals(operation_risks=operation_risks)
+    except Exception as e:
+        print('Caught exception in worker process')
+        traceback.print_exc()
+        raise e
+
+def preload_models(strategies, signal_strategies):
+    """
+    Load models once, before worker processes are created.
+
+    Only strategies without precomputed signals load models while processing
+    operations, see `precompute_signals()`.
+
+    Args
+    ----------
+    strategies : `list` of `dict`
+        Strategies configurations.
+    signal_strategies : `set` of int
+        Indexes in `strategies` of strategies with precomputed signals.
+    """
+
+    tickers_and_tags = {}
+
+    for idx, strategy in enumerate(strategies):
+        if strategy['name'] != 'ML' or idx in signal_strategies:
+            continue
+
+        for ticker, dates in strategy['tickers'].items():
+            model_tags = tickers_and_tags.setdefault(ticker, [])
+
+            for model_tag in ModelCache.get_model_tags(dates['start_date'], dates['end_date']):
+                if model_tag not in model_tags:
+                    model_tags.append(model_tag)
+
+    ModelCache.preload(tickers_and_tags)
+
+def run_strategy(strategy, strategy_number, total_strategies, stdout_prints=False,
+    checkpoint=False, monte_carlo_resamples=0, use_signal_table=False):
 
     try:
-        if strategy['name'] == 'ML':
-            ml_strategy = MLDerivationStrategy(
-                strategy['tickers'],
-                alias=strategy['alias'],
-                comment = strategy['comment'],
-                risk_capital_product=strategy['risk_capital_coefficient'],
-                total_capital=strategy['capital'],
-                min_order_volume=strategy['min_order_volume'],
-                partial_sale=strategy['partial_sale'],
-                min_risk=strategy['min_risk'],
-                max_risk=strategy['max_risk'],
-                purchase_margin=strategy['purchase_margin'],
-                stop_margin=strategy['stop_margin'],
-                stop_type=strategy['stop_type'],
-                min_days_after_successful_operation=strategy['min_days_after_successful_operation'],
-                min_days_after_failure_operation=strategy['min_days_after_failure_operation'],
-                gain_loss_ratio=strategy['gain_loss_ratio'],
-                max_days_per_operation=strategy['max_days_per_operation'],
-                tickers_bag=strategy['tickers_bag'],
-                tickers_number=strategy['tickers_number'],
-                strategy_number=strategy_number,
-                total_strategies=total_strategies,
-                stdout_prints=stdout_prints,
-                enable_frequency_normalization=strategy['enable_frequency_normalization'],
-                enable_profit_compensation=strategy['enable_profit_compensation'],
-                enable_crisis_halt=strategy['enable_crisis_halt'],
-                enable_downtrend_halt=strategy['enable_downtrend_halt'],
-                enable_dynamic_rcc=strategy['enable_dynamic_rcc'],
-                dynamic_rcc_reference=strategy['dynamic_rcc_reference'],
-                dynamic_rcc_k=strategy['dynamic_rcc_k'],
-                operation_risk=strategy['operation_risk']
-            )
-
-            ml_strategy.process_operations()
+        ml_strategy = create_strategy(strategy, strategy_number, total_strategies,
+            stdout_prints, monte_carlo_resamples, use_signal_table)
+
+        if ml_strategy is not None:
+            ml_strategy.process_operations(checkpoint=checkpoint)
             ml_strategy.calculate_statistics()
             ml_strategy.save()
     except Exception as e:
@@ -104,12 +231,48 @@ def run_strategy(strategy, strategy_number, total_strategies, stdout_prints=Fals
         traceback.print_exc()
         raise e
 
+def run_lockstep(strategies, strategy_numbers, total_strategies, stdout_prints=False,
+    monte_carlo_resamples=0, use_signal_table=False):
+
+    try:
+        ml_strategies = [create_strategy(strategy, strategy_number, total_strategies,
+            stdout_prints, monte_carlo_resamples, use_signal_table) \
+            for strategy, strategy_number in zip(strategies, strategy_numbers)]
+
+        engine = LockstepEngine(ml_strategies)
+        engine.process_operations()
+        engine.calculate_statistics()
+        engine.save()
+    except Exception as e:
+        print('Caught exception in worker process')
+        traceback.print_exc()
+        raise e
+
 if __name__ == '__main__':
 
     # Parse args
     parser = argparse.ArgumentParser()
     parser.add_argument("-p", "--pools", type=int,
         help="number of worker processes to run code in parallel")
+    parser.add_argument("-l", "--lockstep", action="store_true",
+        help="run strategies sharing the same data together in one process")
+    parser.add_argument("-c", "--checkpoint", action="store_true",
+        help="resume strategies from their last checkpoint, processing only new days")
+    parser.add_argument("-r", "--requests", type=int,
+        help="maximum number of concurrent Yahoo Finance requests")
+    parser.add_argument("--replay-cache", action="store_true",
+        help="use cached Yahoo Finance responses without requesting them again "
+        "(fast offline runs, candles may miss recent splits and dividends)")
+    parser.add_argument("--panel", action="store_true",
+        help="download missing candles of all tickers at once and load them in a "
+        "single transaction")
+    parser.add_argument("--preload", action="store_true",
+        help="load models of strategies without precomputed signals before creating "
+        "worker processes (shared by workers, more memory in the main process)")
+    parser.add_argument("-m", "--monte-carlo", type=int, nargs="?", default=0,
+        const=c.MONTE_CARLO_RESAMPLES, metavar="RESAMPLES",
+        help="compute Monte Carlo confidence intervals of strategies statistics "
+        f"(default of {c.MONTE_CARLO_RESAMPLES} resamples)")
     args = parser.parse_args()
 
     max_pools = psutil.cpu_count(logical=False)
@@ -118,21 +281,38 @@ if __name__ == '__main__':
         max_pools = args.pools
 
     # Update tickers if candles and features not present in database
-    strategies = update_tickers_and_get_strategies()
+    strategies = update_tickers_and_get_strategies(max_requests=args.requests,
+        panel=args.panel, processes=max_pools, replay_cache=args.replay_cache)
 
     # Filter valid strategy names
     strategies = [strategy for strategy in strategies if strategy['name'] in accepted_strategies]
 
     total = len(strategies)
 
+    # Features and predictions shared by strategies, computed only once
+    signal_strategies = precompute_signals(strategies, processes=max_pools)
+
+    # Models shared by all worker processes
+    if args.preload:
+        preload_models(strategies, signal_strategies)
+
     print("Strategies execution started.")
     print(f"Using maximum of {max_pools} worker processes.")
     pbar = tqdm(total=total)
     start = time.perf_counter()
 
     with Pool(max_pools) as pool:
-        for idx, strat in enumerate(strategies):
-            pool.apply_async(run_strategy, (strat, idx+1, total), callback=lambda x: pbar.update())
+        if args.lockstep:
+            for group in get_data_groups(strategies):
+                pool.apply_async(run_lockstep, ([strategies[idx] for idx in group],
+                    [idx+1 for idx in group], total, False, args.monte_carlo,
+                    group[0] in signal_strategies),
+                    callback=lambda x, n=len(group): pbar.update(n))
+        else:
+            for idx, strat in enumerate(strategies):
+                pool.apply_async(run_strategy, (strat, idx+1, total, False, args.checkpoint,
+                    args.monte_carlo, idx in signal_strategies),
+                    callback=lambda x: pbar.update())
 
         pool.close()
         pool.join()
@@ -0,0 +1,266 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import numpy as np
+
+import constants as c
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+class MarketCube:
+    """
+    Columnar day x ticker market data preloaded from a `DataGen`.
+
+    Consumes the whole generator once and stores every numeric column in NumPy
+    arrays indexed by (day index, ticker index, field), so the backtest loop can
+    read a ticker's data for a day in O(1) instead of filtering dataframes.
+
+    Only days with at least one daily candle are kept, exactly the days the
+    backtest loop used to process.
+
+    Each (day, ticker) cell also has a row counter. A counter of 1 means valid
+    data, 0 means missing data and greater than 1 means duplicated rows (the
+    old `pd.Series` case after `squeeze()`).
+
+    Args
+    ----------
+    tickers : `list` or `dict`
+        Tickers, in the order of the ticker axis.
+    data_gen : `AdaptedAndreMoraesStrategy.DataGen`
+        Data generator. Consumed until `StopIteration`.
+
+    Properties
+    ----------
+    days : `list` of `pd.Timestamp`
+        Days of the day axis.
+    tickers : `list` of str
+        Tickers of the ticker axis.
+    ticker_index : `dict`
+        Ticker name to ticker axis index.
+    daily_fields : `dict`
+        Daily column name to field axis index.
+    weekly_fields : `dict`
+        Weekly column name to field axis index. Empty if `data_gen.week` is False.
+    daily : `np.ndarray`
+        Daily values, shape (days, tickers, daily fields). NaN where missing.
+    daily_count : `np.ndarray`
+        Daily rows found per (day, ticker).
+    weekly : `np.ndarray`
+        Last week values for each day, shape (days, tickers, weekly fields).
+    weekly_count : `np.ndarray`
+        Last week rows found per (day, ticker).
+    weekly_empty : `np.ndarray` of bool
+        True if no weekly data at all was available for the day.
+
+    Methods
+    ----------
+    daily_mask()
+        Boolean mask of (day, ticker) cells with exactly one daily row.
+    weekly_mask()
+        Boolean mask of (day, ticker) cells with exactly one weekly row.
+    get_daily_column(field)
+        2D (days, tickers) view of a daily field.
+    from_frames(tickers, days_info, weeks_info=None)
+        Build a cube from already loaded daily (and weekly) data.
+    """
+    _key_columns = ('ticker', 'day', 'week')
+
+    def __init__(self, tickers, data_gen):
+        self._tickers = list(tickers)
+        self._ticker_index = {ticker: idx for idx, ticker in enumerate(self._tickers)}
+        self._days = []
+
+        self._daily_fields = {}
+        self._weekly_fields = {}
+
+        max_days = data_gen.dates_length
+        n_tickers = len(self._tickers)
+
+        daily = None
+        weekly = None
+        daily_count = np.zeros((max_days, n_tickers), dtype=np.int16)
+        weekly_count = np.zeros((max_days, n_tickers), dtype=np.int16)
+        weekly_empty = np.zeros(max_days, dtype=bool)
+
+        day_idx = 0
+        while True:
+            try:
+                if data_gen.week:
+                    day_info, week_info = next(data_gen)
+                else:
+                    day_info, week_info = next(data_gen), None
+
+                if day_info.empty:
+                    continue
+
+                if daily is None:
+                    self._daily_fields = {field: idx for idx, field in enumerate(
+                        [col for col in day_info.columns if col not in self._key_columns])}
+                    daily = np.full((max_days, n_tickers, len(self._daily_fields)), np.nan)
+
+                self._days.append(day_info.head(1)['day'].squeeze())
+                MarketCube._fill(day_info, self._ticker_index, self._daily_fields,
+                    daily[day_idx], daily_count[day_idx])
+
+                if week_info is not None:
+                    if week_info.empty:
+                        weekly_empty[day_idx] = True
+                    else:
+                        if weekly is None:
+                            self._weekly_fields = {field: idx for idx, field in enumerate(
+                                [col for col in week_info.columns if col not in self._key_columns])}
+                            weekly = np.full((max_days, n_tickers, len(self._weekly_fields)), np.nan)
+
+                        MarketCube._fill(week_info, self._ticker_index, self._weekly_fields,
+                            weekly[day_idx], weekly_count[day_idx])
+
+                day_idx += 1
+            except StopIteration:
+                break
+
+        if daily is None:
+            daily = np.full((max_days, n_tickers, 0), np.nan)
+        if weekly is None:
+            weekly = np.full((max_days, n_tickers, 0), np.nan)
+
+        # Trim to days actually found
+        self._daily = daily[:day_idx]
+        self._daily_count = daily_count[:day_idx]
+        self._weekly = weekly[:day_idx]
+        self._weekly_count = weekly_count[:day_idx]
+        self._weekly_empty = weekly_empty[:day_idx] if data_gen.week \
+            else np.ones(day_idx, dtype=bool)
+
+        logger.debug(f"Market cube loaded: {day_idx} days, {n_tickers} tickers, "
+            f"{len(self._daily_fields)} daily fields, {len(self._weekly_fields)} weekly fields.")
+
+    @staticmethod
+    def from_frames(tickers, days_info, weeks_info=None):
+        """
+        Build a cube from already loaded daily (and weekly) data.
+
+        Args
+        ----------
+        tickers : `list` or `dict`
+            Tickers, in the order of the ticker axis.
+        days_info : `list` of `pd.DataFrame`
+            Daily rows of each day, same columns `DataGen` yields.
+        weeks_info : `list` of `pd.DataFrame`, optional
+            Last week rows of each day. If None, no weekly data.
+
+        Returns
+        ----------
+        `MarketCube`
+        """
+        return MarketCube(tickers, MarketCube._FramesGen(days_info, weeks_info))
+
+    class _FramesGen:
+        # Minimal `DataGen` interface over already loaded frames
+        def __init__(self, days_info, weeks_info):
+            self.week = weeks_info is not None
+            self.dates_length = len(days_info)
+            self._frames = iter(zip(days_info, weeks_info) if self.week else days_info)
+
+        def __next__(self):
+            return next(self._frames)
+
+    @staticmethod
+    def _fill(df, ticker_index, fields, values, count):
+        """
+        Write one day of rows into the (tickers, fields) slice of the cube.
+
+        Args
+        ----------
+        df : `pd.DataFrame`
+            Rows of a single day (or week), with a 'ticker' column.
+        ticker_index : `dict`
+            Ticker name to ticker axis index.
+        fields : `dict`
+            Column name to field axis index.
+        values : `np.ndarray`
+            (tickers, fields) slice to be written.
+        count : `np.ndarray`
+            (tickers,) slice of row counters to be incremented.
+        """
+        tck_idx = df['ticker'].map(ticker_index).to_numpy()
+        known = ~np.isnan(tck_idx.astype(float))
+        tck_idx = tck_idx[known].astype(int)
+
+        np.add.at(count, tck_idx, 1)
+        values[tck_idx] = df.loc[known, list(fields)].to_numpy(dtype=float)
+
+    def __len__(self):
+        return len(self._days)
+
+    @property
+    def days(self):
+        return self._days
+
+    @property
+    def tickers(self):
+        return self._tickers
+
+    @property
+    def ticker_index(self):
+        return self._ticker_index
+
+    @property
+    def daily_fields(self):
+        return self._daily_fields
+
+    @property
+    def weekly_fields(self):
+        return self._weekly_fields
+
+    @property
+    def daily(self):
+        return self._daily
+
+    @property
+    def daily_count(self):
+        return self._daily_count
+
+    @property
+    def weekly(self):
+        return self._weekly
+
+    @property
+    def weekly_count(self):
+        return self._weekly_count
+
+    @property
+    def weekly_empty(self):
+        return self._weekly_empty
+
+    def daily_mask(self):
+        """`np.ndarray` of bool : (day, ticker) cells with exactly one daily row."""
+        return self._daily_count == 1
+
+    def weekly_mask(self):
+        """`np.ndarray` of bool : (day, ticker) cells with exactly one weekly row."""
+        return self._weekly_count == 1
+
+    def get_daily_column(self, field):
+        """
+        Get a (days, tickers) view of a daily field.
+
+        Args
+        ----------
+        field : str
+            Daily column name.
+
+        Returns
+        ----------
+        `np.ndarray`
+            Field values. NaN where data is missing.
+        """
+        return self._daily[:, :, self._daily_fields[field]]
@@ -0,0 +1,177 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import gc
+import pandas as pd
+import joblib
+
+import constants as c
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+class ModelCache:
+    """
+    Process-wide cache of ticker models, one entry per (ticker, model tag).
+
+    Models are loaded once per process and shared by all strategies of the
+    process. Models preloaded by the main process with `preload()` before the
+    worker pool is created are shared by all workers through fork copy-on-write
+    pages, so each model file is unpickled once per host. These entries are
+    pinned and never evicted.
+
+    Models loaded on demand are kept only for the last `max_tags` model tags
+    used, older tags are evicted. Models are memory mapped (`mmap_mode`), so
+    NumPy arrays kept by the model are read from the page cache instead of
+    being copied in each process.
+
+    Methods
+    ----------
+    get(ticker, model_tag)
+        Get model, loading it if needed.
+    preload(tickers_and_tags)
+        Load models to be shared by worker processes.
+    get_model_tags(start_date, end_date)
+        Get model tags used in a date range.
+    clear()
+        Remove all models.
+    """
+    mmap_mode = 'r'
+    max_tags = 2
+
+    _models = {}
+    _pinned = set()
+    # Model tags loaded on demand, least recently used first
+    _tags = []
+
+    @staticmethod
+    def get(ticker, model_tag):
+        """
+        Get model, loading it if needed.
+
+        Args
+        ----------
+        ticker : str
+            Ticker name.
+        model_tag : str
+            Model tag, key of `c.WFO_MODEL_TAGS`.
+
+        Returns
+        ----------
+        Model object.
+        """
+        key = (ticker, model_tag)
+
+        if key not in ModelCache._models:
+            ModelCache._models[key] = ModelCache._load(ticker, model_tag)
+
+        if key not in ModelCache._pinned:
+            ModelCache._use_tag(model_tag)
+
+        return ModelCache._models[key]
+
+    @staticmethod
+    def preload(tickers_and_tags):
+        """
+        Load models to be shared by worker processes.
+
+        Must be called before worker processes are created. Preloaded models
+        are moved to the permanent generation of the garbage collector, so
+        collections in workers do not touch (and copy) their pages.
+
+        Args
+        ----------
+        tickers_and_tags : `dict`
+            Ticker names. Value must be a `list` of model tags.
+        """
+        for ticker, model_tags in tickers_and_tags.items():
+            for model_tag in model_tags:
+                key = (ticker, model_tag)
+
+                if key not in ModelCache._models:
+                    ModelCache._models[key] = ModelCache._load(ticker, model_tag)
+
+                ModelCache._pinned.add(key)
+
+        gc.collect()
+        gc.freeze()
+
+        logger.info(f"Preloaded {len(ModelCache._pinned)} model(s) of "
+            f"{len(tickers_and_tags)} ticker(s).")
+
+    @staticmethod
+    def get_model_tags(start_date, end_date):
+        """
+        Get model tags used in a date range.
+
+        Args
+        ----------
+        start_date : `datetime.date`
+            Start date.
+        end_date : `datetime.date`
+            End date.
+
+        Returns
+        ----------
+        `list` of str
+            Model tags, in `c.WFO_MODEL_TAGS` order.
+        """
+        model_tags = []
+        tag_start = pd.Timestamp(c.WFO_START_DATE)
+
+        for model_tag, value in c.WFO_MODEL_TAGS.items():
+            tag_end = pd.Timestamp(year=value['end_year'], month=value['end_month'],
+                day=value['end_day'])
+
+            if tag_start <= pd.Timestamp(end_date) and tag_end >= pd.Timestamp(start_date):
+                model_tags.append(model_tag)
+
+            tag_start = tag_end + pd.Timedelta(days=1)
+
+        return model_tags
+
+    @staticmethod
+    def clear():
+        """Remove all models."""
+        ModelCache._models.clear()
+        ModelCache._pinned.clear()
+        ModelCache._tags.clear()
+
+    @staticmethod
+    def _load(ticker, model_tag):
+        path = Path(__file__).parent.parent / c.MODELS_PATH / \
+            (ticker + '_' + model_tag + c.MODEL_SUFFIX)
+
+        return joblib.load(path, mmap_mode=ModelCache.mmap_mode)
+
+    @staticmethod
+    def _use_tag(model_tag):
+
+        if ModelCache._tags and ModelCache._tags[-1] == model_tag:
+            return
+
+        if model_tag in ModelCache._tags:
+            ModelCache._tags.remove(model_tag)
+        ModelCache._tags.append(model_tag)
+
+        while len(ModelCache._tags) > ModelCache.max_tags:
+            ModelCache._evict(ModelCache._tags.pop(0))
+
+    @staticmethod
+    def _evict(model_tag):
+
+        keys = [key for key in ModelCache._models if key[1] == model_tag \
+            and key not in ModelCache._pinned]
+
+        for key in keys:
+            ModelCache._models.pop(key)
+
+        logger.debug(f"Evicted {len(keys)} model(s) of model tag \'{model_tag}\'.")
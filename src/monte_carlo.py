@@ -0,0 +1,213 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from multiprocessing import Pool, current_process
+import math
+import numpy as np
+import psutil
+
+import constants as c
+from utils import State
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+class MonteCarlo:
+    """
+    Robustness estimates of a finished strategy by Monte Carlo resampling.
+
+    Resamples are taken from the closed operations profits and from the daily
+    capital returns of the performance frame, without processing operations
+    again:
+      - operations bootstrap: profit and maximum drawdown of the operations
+        drawn with replacement;
+      - operations shuffle: maximum drawdown of the same operations in random
+        order (profit does not change);
+      - daily returns bootstrap: Sharpe ratio (same formula as
+        `AdaptedAndreMoraesStrategy.sharpe_ratio()`) and maximum drawdown.
+
+    Resamples are evaluated in chunks of NumPy arrays (one row per resample),
+    in parallel processes if not called from a daemonic process (pool worker).
+    Chunks have their own random generator spawned from `seed`, so results only
+    depend on `seed`, not on the number of processes.
+
+    Args
+    ----------
+    operations : `list` of `Operation`
+        Strategy operations, only closed ones are resampled (in list order).
+    performance : `pd.DataFrame`
+        Performance frame of `calculate_statistics()`, with 'capital' column.
+    total_capital : float
+        Initial capital.
+    rf : `pd.Series`, optional
+        Risk-free index (CDI) daily values. No risk-free yield if not given.
+    resamples : int, default 10000
+        Number of resamples of each kind.
+    seed : int, optional
+        Random generator seed.
+    processes : int, optional
+        Maximum number of processes, number of physical cores if not given.
+
+    Properties
+    ----------
+    resamples : int
+        Number of resamples of each kind.
+
+    Methods
+    ----------
+    get_distributions()
+        Get resampled statistics.
+    get_confidence_intervals(confidence=0.95)
+        Get confidence intervals of the resampled statistics.
+    """
+    # Maximum number of array elements of a chunk of resamples
+    chunk_elements = 2 ** 21
+
+    def __init__(self, operations, performance, total_capital, rf=None, resamples=10000,
+        seed=None, processes=None):
+
+        if resamples < 1:
+            logger.error(f"Error argument \'resamples\' must be at least 1, got {resamples}.")
+            # sys.exit(c.INVALID_ARGUMENT_ERR)
+            raise Exception
+
+        self._profits = np.array([operation.profit for operation in operations \
+            if operation.state == State.CLOSE], dtype=float)
+
+        returns = performance['capital'].pct_change()
+        returns.fillna(value=0.0, inplace=True)
+        self._returns = returns.to_numpy(dtype=float)
+
+        self._total_capital = total_capital
+        self._rf_mean = rf.mean() - 1 if rf is not None else 0.0
+        self._rf_std = rf.std() if rf is not None else 0.0
+
+        self._resamples = resamples
+        self._seed = seed
+        self._processes = processes
+        self._distributions = None
+
+    @property
+    def resamples(self):
+        return self._resamples
+
+    def get_distributions(self):
+        """
+        Get resampled statistics.
+
+        Returns
+        ----------
+        `dict` of `np.ndarray`
+            Statistic of each resample. Keys: 'profit', 'max_drawdown'
+            (operations bootstrap), 'shuffled_max_drawdown' (operations shuffle),
+            'sharpe_ratio', 'daily_max_drawdown' (daily returns bootstrap).
+        """
+        if self._distributions is None:
+            self._distributions = self._evaluate()
+
+        return self._distributions
+
+    def get_confidence_intervals(self, confidence=0.95):
+        """
+        Get confidence intervals of the resampled statistics, by percentiles.
+
+        Args
+        ----------
+        confidence : float, default 0.95
+            Confidence level.
+
+        Returns
+        ----------
+        `dict` of `tuple` of float
+            Lower and upper bounds, same keys of `get_distributions()`.
+        """
+        if not 0.0 < confidence < 1.0:
+            logger.error(f"Error argument \'confidence\' must be between 0 and 1, "
+                f"got {confidence}.")
+            # sys.exit(c.INVALID_ARGUMENT_ERR)
+            raise Exception
+
+        percentiles = [50 * (1 - confidence), 50 * (1 + confidence)]
+
+        return {name: tuple(np.percentile(values, percentiles).tolist()) \
+            for name, values in self.get_distributions().items()}
+
+    def _evaluate(self):
+
+        # Chunk size only depends on data, so results do not depend on processes
+        chunk_size = max(1, MonteCarlo.chunk_elements // max(len(self._profits),
+            len(self._returns), 1))
+        chunk_sizes = [min(chunk_size, self._resamples - start) \
+            for start in range(0, self._resamples, chunk_size)]
+        seeds = np.random.SeedSequence(self._seed).spawn(len(chunk_sizes))
+
+        chunks_args = [(self._profits, self._returns, self._total_capital, self._rf_mean,
+            self._rf_std, size, seed) for size, seed in zip(chunk_sizes, seeds)]
+
+        processes = self._processes or psutil.cpu_count(logical=False) or 1
+
+        if len(chunks_args) > 1 and processes > 1 and not current_process().daemon:
+            with Pool(min(len(chunks_args), processes)) as pool:
+                chunks = pool.starmap(_evaluate_chunk, chunks_args)
+        else:
+            chunks = [_evaluate_chunk(*args) for args in chunks_args]
+
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) \
+            for name in chunks[0]}
+
+
+def _get_max_drawdowns(equity):
+    """Maximum drawdown (fraction of the peak) of each row of equity curves."""
+    peaks = np.maximum.accumulate(equity, axis=1)
+
+    return np.max((peaks - equity) / peaks, axis=1)
+
+
+def _evaluate_chunk(profits, returns, total_capital, rf_mean, rf_std, size, seed):
+    """Evaluate `size` resamples of each kind."""
+    rng = np.random.default_rng(seed)
+    chunk = {}
+
+    # Operations bootstrap and shuffle
+    if len(profits) > 0:
+        start = np.full((size, 1), float(total_capital))
+
+        resampled = profits[rng.integers(0, len(profits), size=(size, len(profits)))]
+        chunk['profit'] = resampled.sum(axis=1)
+        chunk['max_drawdown'] = _get_max_drawdowns(np.hstack(
+            (start, total_capital + np.cumsum(resampled, axis=1))))
+
+        shuffled = rng.permuted(np.broadcast_to(profits, (size, len(profits))), axis=1)
+        chunk['shuffled_max_drawdown'] = _get_max_drawdowns(np.hstack(
+            (start, total_capital + np.cumsum(shuffled, axis=1))))
+    else:
+        chunk['profit'] = np.zeros(size)
+        chunk['max_drawdown'] = np.zeros(size)
+        chunk['shuffled_max_drawdown'] = np.zeros(size)
+
+    # Daily returns bootstrap
+    if len(returns) > 1:
+        resampled = returns[rng.integers(0, len(returns), size=(size, len(returns)))]
+
+        std = resampled.std(axis=1, ddof=1)
+        sharpe_ratio = np.zeros(size)
+        valid = std > 1e-5
+        sharpe_ratio[valid] = (resampled[valid].mean(axis=1) - rf_mean) / \
+            (std[valid] - rf_std) * math.sqrt(252)
+
+        chunk['sharpe_ratio'] = sharpe_ratio
+        chunk['daily_max_drawdown'] = _get_max_drawdowns(np.hstack(
+            (np.ones((size, 1)), np.cumprod(1 + resampled, axis=1))))
+    else:
+        chunk['sharpe_ratio'] = np.zeros(size)
+        chunk['daily_max_drawdown'] = np.zeros(size)
+
+    return chunk
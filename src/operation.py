@@ -2,6 +2,8 @@ from pathlib import Path
 import logging
 from logging.handlers import RotatingFileHandler
 import sys
+import numpy as np
+import pandas as pd
 
 import constants as c
 from utils import State
@@ -88,7 +90,21 @@ class Operation:
         Add purchase execution.
     add_sale(sale_price, sale_volume, sale_datetime, stop_loss_flag=False)
         Add sale execution.
+    get_negotiations_log(operations)
+        Get purchases and sales of operations as a structured array.
     """
+    __slots__ = ('_ticker', '_state', '_start_date', '_end_date', '_number_of_orders',
+        '_target_purchase_price', '_purchase_price', '_purchase_volume',
+        '_purchase_datetime', '_target_sale_price', '_sale_price', '_sale_volume',
+        '_sale_datetime', '_stop_loss_flag', '_partial_sale_flag', '_timeout_flag',
+        '_stop_loss', '_partial_sale_price', '_profit', '_yield', '_purchase_capital',
+        '_total_purchase_volume', '_sale_capital', '_total_sale_volume')
+
+    # Structured array fields of `get_negotiations_log()`
+    negotiations_log_dtype = np.dtype([('operation', np.int64), ('day', 'datetime64[D]'),
+        ('buy_sell_flag', 'U1'), ('price', np.float64), ('volume', np.int64),
+        ('stop_flag', np.bool_), ('partial_sale_flag', np.bool_), ('timeout_flag', np.bool_)])
+
     def __init__(self, ticker):
         self._ticker = ticker
         self._state = State.NOT_STARTED
@@ -111,6 +127,12 @@ class Operation:
         self._profit = None
         self._yield = None
 
+        # Running totals, same sums (and order) as adding each execution on access
+        self._purchase_capital = 0.0
+        self._total_purchase_volume = 0.0
+        self._sale_capital = 0.0
+        self._total_sale_volume = 0.0
+
     # General properties
     @property
     def ticker(self):
@@ -176,18 +198,12 @@ class Operation:
     @property
     def total_purchase_capital(self):
         """float : Total purchase capital."""
-        capital = 0.0
-        for (purchase, volume) in zip(self._purchase_price, self._purchase_volume):
-            capital += purchase * volume
-        return round(capital, 2)
+        return round(self._purchase_capital, 2)
 
     @property
     def total_purchase_volume(self):
         """int : Total purchase volume."""
-        total_volume = 0.0
-        for volume in self._purchase_volume:
-            total_volume += volume
-        return total_volume
+        return self._total_purchase_volume
 
     # Sale properties
     @property
@@ -253,18 +269,12 @@ class Operation:
     @property
     def total_sale_capital(self):
         """float : Total sale capital."""
-        capital = 0.0
-        for (sale, volume) in zip(self._sale_price, self._sale_volume):
-            capital += + sale * volume
-        return round(capital, 2)
+        return round(self._sale_capital, 2)
 
     @property
     def total_sale_volume(self):
         """int : Total sale volume."""
-        total_volume = 0.0
-        for volume in self._sale_volume:
-            total_volume += + volume
-        return total_volume
+        return self._total_sale_volume
 
     def add_purchase(self, purchase_price, purchase_volume, purchase_datetime):
         """
@@ -286,6 +296,8 @@ class Operation:
             self._purchase_price.append(purchase_price)
             self._purchase_volume.append(purchase_volume)
             self._purchase_datetime.append(purchase_datetime)
+            self._purchase_capital += purchase_price * purchase_volume
+            self._total_purchase_volume += purchase_volume
             self._number_of_orders += 1
 
             if self.state == State.NOT_STARTED:
@@ -332,6 +344,8 @@ class Operation:
             self._stop_loss_flag.append(stop_loss_flag)
             self._partial_sale_flag.append(partial_sale_flag)
             self._timeout_flag.append(timeout_flag)
+            self._sale_capital += sale_price * sale_volume
+            self._total_sale_volume += sale_volume
             self._number_of_orders += 1
 
             if self.total_purchase_volume == self.total_sale_volume:
@@ -341,4 +355,55 @@ class Operation:
                 self._state = State.CLOSE
 
             return True
-        return False
\ No newline at end of file
+        return False
+
+    @staticmethod
+    def get_negotiations_log(operations):
+        """
+        Get purchases and sales of operations as a structured array.
+
+        One row per execution, purchases of each operation before its sales,
+        operations in the given order.
+
+        Args
+        ----------
+        operations : `list` of `Operation`
+            Operations.
+
+        Returns
+        ----------
+        `np.ndarray`
+            Structured array of `negotiations_log_dtype`. Field 'operation' is
+            the index in `operations`.
+        """
+        n_rows = sum(len(operation._purchase_price) + len(operation._sale_price) \
+            for operation in operations)
+
+        log = np.zeros(n_rows, dtype=Operation.negotiations_log_dtype)
+        days = [None] * n_rows
+
+        row = 0
+        for op_idx, operation in enumerate(operations):
+            n_purchases = len(operation._purchase_price)
+            n_sales = len(operation._sale_price)
+
+            log['operation'][row:row + n_purchases + n_sales] = op_idx
+            log['buy_sell_flag'][row:row + n_purchases] = 'B'
+            log['price'][row:row + n_purchases] = operation._purchase_price
+            log['volume'][row:row + n_purchases] = operation._purchase_volume
+            days[row:row + n_purchases] = operation._purchase_datetime
+            row += n_purchases
+
+            log['buy_sell_flag'][row:row + n_sales] = 'S'
+            log['price'][row:row + n_sales] = operation._sale_price
+            log['volume'][row:row + n_sales] = operation._sale_volume
+            log['stop_flag'][row:row + n_sales] = operation._stop_loss_flag
+            log['partial_sale_flag'][row:row + n_sales] = operation._partial_sale_flag
+            log['timeout_flag'][row:row + n_sales] = operation._timeout_flag
+            days[row:row + n_sales] = operation._sale_datetime
+            row += n_sales
+
+        if n_rows > 0:
+            log['day'] = pd.to_datetime(days).to_numpy().astype('datetime64[D]')
+
+        return log
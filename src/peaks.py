@@ -0,0 +1,456 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import constants as c
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+def find_candles_peaks(max_prices, min_prices, window_size=17):
+    """
+    Find candles peaks.
+
+    Each window of `window_size` candles votes for the position of its maximum
+    price and against the position of its minimum price, if not in the window
+    border (last candle is not in any window). Positions with at least half a
+    window of votes are peaks, post processed by `analyze_peaks()`.
+
+    Windows argmax and argmin are reduced at once over sliding window views,
+    votes counted by `np.bincount()`.
+
+    Args
+    ----------
+    max_prices : `list` of float
+        Candles maximum prices.
+    min_prices : `list` of float
+        Candles minimum prices.
+    window_size : int, default 17
+        Number of candles of the voting windows.
+
+    Returns
+    ----------
+    `list` of `dict`
+        Peaks from `analyze_peaks()`. None if prices lengths differ or there
+        are not enough candles or peaks.
+    """
+    if len(max_prices) != len(min_prices) or len(max_prices) <= window_size:
+        return None
+
+    max_argmax, min_argmin = get_windows_extrema(max_prices, min_prices, window_size)
+
+    return find_window_peaks(max_prices, min_prices, max_argmax, min_argmin, 0,
+        len(max_prices), window_size)
+
+def get_windows_extrema(max_prices, min_prices, window_size):
+    """
+    Get argmax of maximum prices and argmin of minimum prices of every window.
+
+    Computed once for a whole history, `find_window_peaks()` finds the peaks
+    of any slice of it.
+
+    Args
+    ----------
+    max_prices : `list` of float
+        Candles maximum prices.
+    min_prices : `list` of float
+        Candles minimum prices.
+    window_size : int
+        Number of candles of the voting windows.
+
+    Returns
+    ----------
+    `np.ndarray` of int
+        Argmax of each window, relative to the window start.
+    `np.ndarray` of int
+        Argmin of each window, relative to the window start.
+    """
+    if len(max_prices) < window_size:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    max_argmax = sliding_window_view(np.asarray(max_prices), window_size).argmax(axis=1)
+    min_argmin = sliding_window_view(np.asarray(min_prices), window_size).argmin(axis=1)
+
+    return max_argmax, min_argmin
+
+def find_window_peaks(max_prices, min_prices, max_argmax, min_argmin, start, end,
+    window_size):
+    """
+    Find candles peaks of candles `start:end`, same as `find_candles_peaks()`
+    of the slice.
+
+    Args
+    ----------
+    max_prices : `list` of float
+        Candles maximum prices.
+    min_prices : `list` of float
+        Candles minimum prices.
+    max_argmax : `np.ndarray` of int
+        Argmax of each window, from `get_windows_extrema()`.
+    min_argmin : `np.ndarray` of int
+        Argmin of each window, from `get_windows_extrema()`.
+    start : int
+        First candle.
+    end : int
+        Candle after the last one.
+    window_size : int
+        Number of candles of the voting windows.
+
+    Returns
+    ----------
+    `list` of `dict`
+        Peaks from `analyze_peaks()`, indexes relative to `start`. None if
+        there are not enough candles or peaks.
+    """
+    if end - start <= window_size:
+        return None
+
+    # Vote only if value is not in the window border
+    windows = np.arange(start, end - window_size)
+    max_position = max_argmax[start:end - window_size]
+    min_position = min_argmin[start:end - window_size]
+    max_voted = (max_position != 0) & (max_position != window_size - 1)
+    min_voted = (min_position != 0) & (min_position != window_size - 1)
+
+    votes = np.bincount(windows[max_voted] + max_position[max_voted] - start,
+        minlength=end - start) - np.bincount(windows[min_voted] \
+        + min_position[min_voted] - start, minlength=end - start)
+
+    min_votes = max(window_size // 2, 1)
+    max_peaks_index = np.flatnonzero(votes >= min_votes).tolist()
+    min_peaks_index = np.flatnonzero(votes <= -min_votes).tolist()
+
+    max_peaks_values = [max_prices[start + max_peak] for max_peak in max_peaks_index]
+    min_peaks_values = [min_prices[start + min_peak] for min_peak in min_peaks_index]
+
+    return analyze_peaks(max_peaks_index, min_peaks_index,
+        max_peaks_values, min_peaks_values)
+
+def analyze_peaks(max_peaks_index, min_peaks_index, max_peaks_values, min_peaks_values):
+
+    if (max_peaks_index is None or len(max_peaks_index) < 2) or \
+        (min_peaks_index is None or len(min_peaks_index) < 2):
+        return None
+
+    # ordered_peaks = sorted(max_peaks_index + min_peaks_index)
+    ordered_peaks = [{'type': 'max', 'index': p_index, 'value':
+        max_peaks_values[max_peaks_index.index(p_index)]}
+        if p_index in max_peaks_index
+        else {'type': 'min', 'index': p_index, 'value':
+        min_peaks_values[min_peaks_index.index(p_index)]}
+        for p_index in sorted(max_peaks_index + min_peaks_index)]
+    peaks_number = len(ordered_peaks)
+
+    # print('Ordered Peaks:')
+    # for peak in ordered_peaks:
+    #     print(peak)
+    # print()
+
+    # Create sequences of max and min peaks
+    first_peak = 'max' if max_peaks_index[0] < min_peaks_index[0] else 'min'
+    sequences = []
+    current_sequence = {'type': first_peak, 'index': [], 'magnitude': ordered_peaks[0]['value']}
+    current_type = first_peak
+
+    for i, peak in enumerate(ordered_peaks):
+        if peak['type'] == current_type:
+            current_sequence['index'].append(peak['index'])
+            current_sequence['magnitude'] = max(current_sequence['magnitude'], peak['value']) \
+                if current_type == 'max' else min(current_sequence['magnitude'], peak['value'])
+        else:
+            sequences.append(current_sequence.copy())
+            current_type = peak['type']
+            current_sequence['type'] = peak['type']
+            current_sequence['index'] = [peak['index']]
+            current_sequence['magnitude'] = peak['value']
+
+        if i == peaks_number - 1:
+            sequences.append(current_sequence.copy())
+
+    # print('Ordered Sequences:')
+    # for sequence in sequences:
+    #     print(sequence)
+    # print()
+
+    # Remove invalid peak sequences
+    ok = False
+    while not ok:
+        last_sequence = {}
+        for i, sequence in enumerate(sequences):
+            if i != 0:
+                if sequence['type'] == 'min' and last_sequence['type'] == 'max':
+                    if sequence['magnitude'] >= last_sequence['magnitude']:
+                        del sequences[i]
+                        break
+                elif sequence['type'] == 'max' and last_sequence['type'] == 'min':
+                    if sequence['magnitude'] <= last_sequence['magnitude']:
+                        del sequences[i]
+                        break
+                # Last and current of same type
+                else:
+                    sequences[i]['magnitude'] = max(sequence['magnitude'], last_sequence['magnitude']) \
+                        if sequence['type'] == 'max' else \
+                        min(sequence['magnitude'], last_sequence['magnitude'])
+                    sequences[i]['index'].extend(last_sequence['index'])
+                    del sequences[i-1]
+                    break
+            last_sequence = sequence
+            if i == len(sequences) - 1:
+                ok = True
+
+    # print('Filtered and Ordered Sequences:')
+    # for sequence in sequences:
+    #     print(sequence)
+    # print()
+
+    # Choose peak representative of each sequence
+    for i in range(len(sequences)):
+        if len(sequences[i]['index']) > 1:
+            if sequences[i]['type'] == 'max':
+                selected_index = max_peaks_index[max_peaks_values.index(sequences[i]['magnitude'])]
+            else:
+                selected_index = min_peaks_index[min_peaks_values.index(sequences[i]['magnitude'])]
+            sequences[i]['index'] = selected_index
+        else:
+            sequences[i]['index'] = sequences[i]['index'][0]
+
+    # print('Final Sequence:')
+    # for sequence in sequences:
+    #     print(sequence)
+    # print()
+
+    return sequences
+
+
+class StreamingPeakDetector:
+    """
+    Candles peaks of a growing price history, one candle at a time.
+
+    Same peaks as `find_candles_peaks()` over the whole history, without processing the history again for each new candle.
+
+    Each window of `window_size` candles votes for the position of its maximum
+    (and against the position of its minimum) when it is not in the window
+    border. The last window ends one candle before the last one, and a window
+    only votes for positions after its first one, so each new candle finishes
+    the votes of exactly one position. Positions with finished votes are
+    confirmed peaks: their sequences are grouped and filtered once, by a stack
+    (merge of same type sequences and removal of sequences that do not exceed
+    the previous one, same as `analyze_peaks()`). The last positions, still
+    voted by next windows, are processed at each query over a view of the stack
+    that is not changed.
+
+    Each new candle costs O(`window_size`), each query O(`window_size`) plus
+    the number of requested peaks.
+
+    Args
+    ----------
+    window_size : int, default 17
+        Number of candles of the voting windows.
+
+    Methods
+    ----------
+    add(max_price, min_price)
+        Add candle.
+    get_peaks(last=None)
+        Get peaks of the candles added so far.
+    """
+    def __init__(self, window_size=17):
+
+        if window_size < 3:
+            logger.error(f"Error argument \'window_size\' must be at least 3, "
+                f"got {window_size}.")
+            # sys.exit(c.INVALID_ARGUMENT_ERR)
+            raise Exception
+
+        self._window_size = window_size
+        self._min_votes = window_size // 2
+
+        self._max_prices = []
+        self._min_prices = []
+        # Votes of positions after the last confirmed one
+        self._votes = {}
+
+        # Confirmed peaks: counts, first index of each value and last open sequence
+        self._peaks_count = {'max': 0, 'min': 0}
+        self._first_index = {'max': {}, 'min': {}}
+        self._open_sequence = None
+        # Filtered closed sequences: [type, magnitude, number of peaks, index]
+        self._stack = []
+
+    def __len__(self):
+        return len(self._max_prices)
+
+    def add(self, max_price, min_price):
+        """
+        Add candle.
+
+        Args
+        ----------
+        max_price : float
+            Candle maximum price.
+        min_price : float
+            Candle minimum price.
+        """
+        self._max_prices.append(max_price)
+        self._min_prices.append(min_price)
+
+        start = len(self._max_prices) - self._window_size - 1
+
+        if start < 0:
+            return
+
+        # Vote only if value is not in the window border
+        argmax = np.argmax(self._max_prices[start:start + self._window_size])
+        if argmax not in [0, self._window_size - 1]:
+            self._votes[start + argmax] = self._votes.get(start + argmax, 0) + 1
+
+        argmin = np.argmin(self._min_prices[start:start + self._window_size])
+        if argmin not in [0, self._window_size - 1]:
+            self._votes[start + argmin] = self._votes.get(start + argmin, 0) - 1
+
+        # No more windows vote for the position after the window start
+        vote = self._votes.pop(start + 1, 0)
+
+        if abs(vote) >= self._min_votes and vote != 0:
+            peak = self._get_peak(start + 1, vote)
+
+            self._peaks_count[peak[0]] += 1
+            self._first_index[peak[0]].setdefault(peak[1], start + 1)
+
+            closed_sequences, self._open_sequence = self._group_peaks(
+                self._open_sequence, [peak])
+
+            stack_length, new_sequences = self._filter_sequences(closed_sequences,
+                len(self._stack))
+            del self._stack[stack_length:]
+            self._stack.extend(new_sequences)
+
+    def get_peaks(self, last=None):
+        """
+        Get peaks of the candles added so far.
+
+        Args
+        ----------
+        last : int, optional
+            Number of last peaks to get, all peaks if not given.
+
+        Returns
+        ----------
+        `list` of `dict`
+            Peaks with 'type' ('max' or 'min'), 'index' (candle position) and
+            'magnitude' keys, same as `analyze_peaks()`. None if it returns None.
+        """
+        if len(self._max_prices) <= self._window_size:
+            return None
+
+        pending_peaks = [self._get_peak(index, vote) for index, vote \
+            in sorted(self._votes.items()) if abs(vote) >= self._min_votes and vote != 0]
+
+        peaks_count = dict(self._peaks_count)
+        for peak in pending_peaks:
+            peaks_count[peak[0]] += 1
+
+        if peaks_count['max'] < 2 or peaks_count['min'] < 2:
+            return None
+
+        closed_sequences, open_sequence = self._group_peaks(self._open_sequence,
+            pending_peaks)
+
+        stack_length, new_sequences = self._filter_sequences(closed_sequences \
+            + [open_sequence], len(self._stack))
+
+        if last is None:
+            sequences = self._stack[:stack_length] + new_sequences
+        else:
+            sequences = self._stack[max(0, stack_length - max(0, last - len(new_sequences))):
+                stack_length] + new_sequences
+            sequences = sequences[max(0, len(sequences) - last):]
+
+        return [{'type': sequence[0], 'index': self._get_sequence_index(sequence,
+            pending_peaks), 'magnitude': sequence[1]} for sequence in sequences]
+
+    def _get_peak(self, index, vote):
+        if vote > 0:
+            return ('max', self._max_prices[index], index)
+
+        return ('min', self._min_prices[index], index)
+
+    @staticmethod
+    def _group_peaks(open_sequence, peaks):
+        """Group consecutive peaks of the same type in sequences."""
+        closed_sequences = []
+
+        for peak_type, value, index in peaks:
+            if open_sequence is None:
+                open_sequence = [peak_type, value, 1, index]
+            elif open_sequence[0] == peak_type:
+                open_sequence = [peak_type, max(open_sequence[1], value) if peak_type == 'max' \
+                    else min(open_sequence[1], value), open_sequence[2] + 1, open_sequence[3]]
+            else:
+                closed_sequences.append(open_sequence)
+                open_sequence = [peak_type, value, 1, index]
+
+        return closed_sequences, open_sequence
+
+    def _filter_sequences(self, sequences, stack_length):
+        """
+        Filter sequences after the first `stack_length` ones of the stack.
+
+        Sequences of the stack are not changed: it returns the number of them
+        still valid and the new ones.
+        """
+        new_sequences = []
+
+        for sequence in sequences:
+            while True:
+                if new_sequences:
+                    last_sequence = new_sequences[-1]
+                elif stack_length > 0:
+                    last_sequence = self._stack[stack_length - 1]
+                else:
+                    new_sequences.append(sequence)
+                    break
+
+                # Last and current of same type
+                if sequence[0] == last_sequence[0]:
+                    sequence = [sequence[0], max(sequence[1], last_sequence[1]) \
+                        if sequence[0] == 'max' else min(sequence[1], last_sequence[1]),
+                        sequence[2] + last_sequence[2], sequence[3]]
+
+                    if new_sequences:
+                        new_sequences.pop()
+                    else:
+                        stack_length -= 1
+                    continue
+
+                if (sequence[0] == 'min' and sequence[1] >= last_sequence[1]) or \
+                    (sequence[0] == 'max' and sequence[1] <= last_sequence[1]):
+                    break
+
+                new_sequences.append(sequence)
+                break
+
+        return stack_length, new_sequences
+
+    def _get_sequence_index(self, sequence, pending_peaks):
+        """Index of the sequence peak, first peak of its magnitude if more than one."""
+        if sequence[2] == 1:
+            return sequence[3]
+
+        index = self._first_index[sequence[0]].get(sequence[1])
+
+        if index is None:
+            index = next(peak_index for peak_type, value, peak_index in pending_peaks \
+                if peak_type == sequence[0] and value == sequence[1])
+
+        return index
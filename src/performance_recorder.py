@@ -0,0 +1,142 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import numpy as np
+
+import constants as c
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+class PerformanceRecorder:
+    """
+    Per day data needed by statistics, captured while operations are processed.
+
+    Stores the close price of each ticker for each day from the first ticker
+    start date on, in preallocated arrays. Days out of a ticker date range are
+    NaN. Days without a valid close price repeat the last valid close price
+    recorded, whatever the ticker (tickers order, then days order).
+
+    Args
+    ----------
+    tickers_and_dates : `dict`
+        Tickers. Value must be another `dict` with `start_date` and `end_date` keys.
+    max_days : int
+        Maximum number of days to be recorded.
+
+    Properties
+    ----------
+    days : `list` of `pd.Timestamp`
+        Recorded days.
+    tickers : `list` of str
+        Tickers, same order as `tickers_and_dates`.
+
+    Methods
+    ----------
+    record(day, close_prices, valid)
+        Record a day.
+    get_close_prices()
+        Get recorded close prices per ticker.
+    extend(tickers_and_dates, max_days)
+        Update tickers end dates and make room for more days.
+    """
+    def __init__(self, tickers_and_dates, max_days):
+        self._tickers = list(tickers_and_dates)
+        self._start_dates = [dates['start_date'] for dates in tickers_and_dates.values()]
+        self._end_dates = [dates['end_date'] for dates in tickers_and_dates.values()]
+        self._first_date = min(self._start_dates)
+
+        self._days = []
+        self._close_prices = np.full((max_days, len(self._tickers)), np.nan)
+        self._last_price = 0.0
+
+    @property
+    def days(self):
+        return self._days
+
+    @property
+    def tickers(self):
+        return self._tickers
+
+    def __len__(self):
+        return len(self._days)
+
+    def record(self, day, close_prices, valid):
+        """
+        Record a day. Days before the first ticker start date are ignored.
+
+        Args
+        ----------
+        day : `pd.Timestamp`
+            Day.
+        close_prices : `np.ndarray` of float
+            Close price of each ticker, same order as `tickers`.
+        valid : `np.ndarray` of bool
+            True where close price is valid.
+        """
+        if day.date() < self._first_date:
+            return
+
+        in_range = np.array([day.date() >= start_date and day.date() <= end_date \
+            for start_date, end_date in zip(self._start_dates, self._end_dates)], dtype=bool)
+        valid = valid & in_range
+
+        # Index of the last valid ticker up to each ticker, -1 if none
+        last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(valid)), -1)) \
+            if len(valid) > 0 else np.zeros(0, dtype=int)
+
+        filled = np.where(last_valid >= 0, close_prices[np.maximum(last_valid, 0)],
+            self._last_price)
+
+        self._close_prices[len(self._days)] = np.where(in_range, filled, np.nan)
+        self._days.append(day)
+
+        if len(last_valid) > 0 and last_valid[-1] >= 0:
+            self._last_price = close_prices[last_valid[-1]]
+
+    def extend(self, tickers_and_dates, max_days):
+        """
+        Update tickers end dates and make room for more days.
+
+        Used to continue recording after a checkpoint or in streaming mode.
+        Room is at least doubled when needed, so extending day by day is
+        amortized O(1).
+
+        Args
+        ----------
+        tickers_and_dates : `dict`
+            Same tickers of construction, end dates may be later.
+        max_days : int
+            Maximum number of new days to be recorded.
+        """
+        if list(tickers_and_dates) != self._tickers:
+            logger.error(f"Performance recorder can only be extended with the same tickers.")
+            raise Exception
+
+        self._end_dates = [dates['end_date'] for dates in tickers_and_dates.values()]
+
+        if len(self._days) + max_days > len(self._close_prices):
+            close_prices = np.full((max(len(self._days) + max_days,
+                2 * len(self._close_prices)), len(self._tickers)), np.nan)
+            close_prices[:len(self._days)] = self._close_prices[:len(self._days)]
+            self._close_prices = close_prices
+
+    def get_close_prices(self):
+        """
+        Get recorded close prices per ticker.
+
+        Returns
+        ----------
+        `dict` of `np.ndarray`
+            Close prices of each ticker, same length as `days`.
+        """
+        return {ticker: self._close_prices[:len(self._days), tck_idx] \
+            for tck_idx, ticker in enumerate(self._tickers)}
@@ -0,0 +1,146 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import math
+import numpy as np
+
+import constants as c
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+class PortfolioStatistics:
+    """
+    Portfolio statistics updated in O(1) while operations are processed.
+
+    Profit variance across tickers is kept as running sums of the tickers
+    profits in cents (profits are always rounded to 2 decimals), as integers,
+    so updates do not accumulate rounding errors and the result does not depend
+    on tickers order. It is the exact population variance (same as `np.var`
+    up to the last float digits).
+
+    Capital in use moving average keeps the last values in a ring buffer written
+    twice, so the values of the window are always contiguous and in insertion
+    order: the average is the same as `np.mean` of the values list.
+
+    Args
+    ----------
+    tickers : `list` of str
+        Tickers names.
+    window : int
+        Number of values of the capital in use moving average.
+
+    Properties
+    ----------
+    profit_variance : float
+        Population variance of the tickers profits.
+    profit_std : float
+        Population standard deviation of the tickers profits.
+    capital_in_use_mavg : float
+        Moving average of the last capital in use values.
+
+    Methods
+    ----------
+    update_profit(ticker, profit)
+        Update ticker accumulated profit.
+    set_profits(profits)
+        Set accumulated profit of every ticker.
+    add_capital_in_use(capital_in_use)
+        Add capital in use value of a closed day.
+    """
+    def __init__(self, tickers, window):
+
+        if window < 1:
+            logger.error(f"Error argument \'window\' must be at least 1, got {window}.")
+            # sys.exit(c.INVALID_ARGUMENT_ERR)
+            raise Exception
+
+        self._profits = {ticker: 0 for ticker in tickers}
+        self._profits_sum = 0
+        self._profits_square_sum = 0
+
+        self._window = window
+        self._capital_in_use = np.zeros(2 * window)
+        self._capital_in_use_count = 0
+        self._capital_in_use_idx = 0
+
+    @property
+    def profit_variance(self):
+        n = len(self._profits)
+
+        if n == 0:
+            return 0.0
+
+        return (n * self._profits_square_sum - self._profits_sum ** 2) / (n * n) / 1e4
+
+    @property
+    def profit_std(self):
+        n = len(self._profits)
+
+        if n == 0:
+            return 0.0
+
+        return math.sqrt(n * self._profits_square_sum - self._profits_sum ** 2) / (100 * n)
+
+    @property
+    def capital_in_use_mavg(self):
+        if self._capital_in_use_count < self._window:
+            return np.mean(self._capital_in_use[:self._capital_in_use_count])
+
+        return np.mean(self._capital_in_use[self._capital_in_use_idx:
+            self._capital_in_use_idx + self._window])
+
+    def update_profit(self, ticker, profit):
+        """
+        Update ticker accumulated profit.
+
+        Args
+        ----------
+        ticker : str
+            Ticker name.
+        profit : float
+            Ticker accumulated profit, rounded to 2 decimals.
+        """
+        cents = round(profit * 100)
+        last_cents = self._profits[ticker]
+
+        self._profits[ticker] = cents
+        self._profits_sum += cents - last_cents
+        self._profits_square_sum += cents * cents - last_cents * last_cents
+
+    def set_profits(self, profits):
+        """
+        Set accumulated profit of every ticker.
+
+        Args
+        ----------
+        profits : `dict`
+            Tickers accumulated profits. Key must be the ticker name.
+        """
+        self._profits = {ticker: round(profit * 100) for ticker, profit in profits.items()}
+        self._profits_sum = sum(self._profits.values())
+        self._profits_square_sum = sum(cents * cents for cents in self._profits.values())
+
+    def add_capital_in_use(self, capital_in_use):
+        """
+        Add capital in use value of a closed day, dropping the oldest value of
+        a full window.
+
+        Args
+        ----------
+        capital_in_use : float
+            Fraction of the capital in use.
+        """
+        self._capital_in_use[self._capital_in_use_idx] = capital_in_use
+        self._capital_in_use[self._capital_in_use_idx + self._window] = capital_in_use
+
+        self._capital_in_use_idx = (self._capital_in_use_idx + 1) % self._window
+        self._capital_in_use_count = min(self._capital_in_use_count + 1, self._window)
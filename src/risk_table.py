@@ -0,0 +1,219 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import pandas as pd
+import numpy as np
+
+import constants as c
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+class RiskTable:
+    """
+    Indexed (ticker, day) lookup table for ticker risks and trends.
+
+    Built once from the risks and trends dataframe. Each column is stored in a
+    contiguous array indexed by (day offset, ticker id), where the day offset is
+    the number of calendar days since the oldest day in the table. Lookups are
+    O(1) regardless of the number of tickers and days.
+
+    Args
+    ----------
+    ticker_day_risks : `pd.DataFrame`
+        Risks and trends. Must have 'ticker' and 'day' columns, 'day' as
+        'YYYY-MM-DD' string or datetime.
+    columns : `list` of str, optional
+        Columns to index. If None, all but 'ticker' and 'day'.
+
+    Properties
+    ----------
+    tickers : `list` of str
+        Indexed tickers.
+    columns : `list` of str
+        Indexed columns.
+
+    Methods
+    ----------
+    get(ticker, day, column=None)
+        Get the value of a column (or all of them) for a ticker and day.
+    get_grid(tickers, days, column)
+        Get the values of a column for all tickers and days at once.
+    add(ticker, day, values)
+        Add (or replace) the row of a ticker and day.
+    """
+    _epoch_ordinal = 719163
+
+    def __init__(self, ticker_day_risks, columns=None):
+
+        if columns is None:
+            columns = [col for col in ticker_day_risks.columns if col not in ('ticker', 'day')]
+
+        self._columns = list(columns)
+        self._tickers = list(pd.unique(ticker_day_risks['ticker']))
+        self._ticker_ids = {ticker: idx for idx, ticker in enumerate(self._tickers)}
+
+        # Proleptic Gregorian ordinals, same as `date.toordinal()`
+        ordinals = pd.to_datetime(ticker_day_risks['day']).to_numpy().\
+            astype('datetime64[D]').astype(np.int64) + RiskTable._epoch_ordinal
+
+        self._first_ordinal = int(ordinals.min()) if len(ordinals) > 0 else 0
+        n_days = int(ordinals.max()) - self._first_ordinal + 1 if len(ordinals) > 0 else 0
+        self._n_days = n_days
+
+        day_offsets = ordinals - self._first_ordinal
+        ticker_ids = ticker_day_risks['ticker'].map(self._ticker_ids).to_numpy(dtype=np.int64)
+
+        # Rows per (day, ticker). Only cells with exactly one row are valid.
+        self._count = np.zeros((n_days, len(self._tickers)), dtype=np.int16)
+        np.add.at(self._count, (day_offsets, ticker_ids), 1)
+
+        self._values = {}
+        for column in self._columns:
+            column_values = ticker_day_risks[column].to_numpy()
+            self._values[column] = np.zeros((n_days, len(self._tickers)),
+                dtype=column_values.dtype)
+            self._values[column][day_offsets, ticker_ids] = column_values
+
+        logger.debug(f"Risk table indexed: {len(self._tickers)} tickers, {n_days} days.")
+
+    @property
+    def tickers(self):
+        return self._tickers
+
+    @property
+    def columns(self):
+        return self._columns
+
+    def get(self, ticker, day, column=None):
+        """
+        Get the value of a column for a ticker and day.
+
+        Args
+        ----------
+        ticker : str
+            Ticker name.
+        day : `pd.Timestamp` or `datetime.date`
+            Day.
+        column : str, optional
+            Column name. If None, all columns are returned in a `dict`.
+
+        Returns
+        ----------
+        Column value, `dict` of all column values or None if the ticker or day
+        is not in the table or has more than one row.
+        """
+        ticker_id = self._ticker_ids.get(ticker)
+        if ticker_id is None:
+            return None
+
+        day_offset = day.toordinal() - self._first_ordinal
+        if day_offset < 0 or day_offset >= self._n_days:
+            return None
+
+        if self._count[day_offset, ticker_id] != 1:
+            return None
+
+        if column is None:
+            return {col: self._values[col][day_offset, ticker_id] for col in self._columns}
+
+        return self._values[column][day_offset, ticker_id]
+
+    def get_grid(self, tickers, days, column):
+        """
+        Get the values of a column for all tickers and days at once.
+
+        Args
+        ----------
+        tickers : `list` of str
+            Tickers names.
+        days : `list` of `pd.Timestamp`
+            Days.
+        column : str
+            Column name.
+
+        Returns
+        ----------
+        `np.ndarray`
+            (days, tickers) values, zero where not valid.
+        `np.ndarray` of bool
+            (days, tickers) cells with a value, same as `get()` not returning None.
+        """
+        values = np.zeros((len(days), len(tickers)), dtype=self._values[column].dtype)
+        valid = np.zeros((len(days), len(tickers)), dtype=bool)
+
+        day_offsets = np.array([day.toordinal() for day in days], dtype=np.int64) \
+            - self._first_ordinal
+        in_table = (day_offsets >= 0) & (day_offsets < self._n_days)
+        day_offsets = day_offsets[in_table]
+
+        for tck_idx, ticker in enumerate(tickers):
+            ticker_id = self._ticker_ids.get(ticker)
+            if ticker_id is None:
+                continue
+
+            valid[in_table, tck_idx] = self._count[day_offsets, ticker_id] == 1
+            values[in_table, tck_idx] = self._values[column][day_offsets, ticker_id]
+
+        values[~valid] = 0
+
+        return values, valid
+
+    def add(self, ticker, day, values):
+        """
+        Add (or replace) the row of a ticker and day.
+
+        Days must not be older than the oldest day in the table. Arrays grow
+        by doubling, so adding days one by one is amortized O(1).
+
+        Args
+        ----------
+        ticker : str
+            Ticker name.
+        day : `pd.Timestamp` or `datetime.date`
+            Day.
+        values : `dict`
+            Value of each column.
+        """
+        if self._n_days == 0:
+            self._first_ordinal = day.toordinal()
+
+        day_offset = day.toordinal() - self._first_ordinal
+        if day_offset < 0:
+            logger.error(f"Risk table can not add days older than its first day.")
+            raise Exception
+
+        if ticker not in self._ticker_ids:
+            self._ticker_ids[ticker] = len(self._tickers)
+            self._tickers.append(ticker)
+
+        n_days = max(self._n_days, day_offset + 1)
+        if n_days > self._count.shape[0] or len(self._tickers) > self._count.shape[1]:
+            self._resize(max(n_days, 2 * self._count.shape[0]), len(self._tickers))
+
+        ticker_id = self._ticker_ids[ticker]
+        self._n_days = n_days
+        self._count[day_offset, ticker_id] = 1
+
+        for column in self._columns:
+            self._values[column][day_offset, ticker_id] = values[column]
+
+    def _resize(self, n_days, n_tickers):
+
+        count = np.zeros((n_days, n_tickers), dtype=np.int16)
+        count[:self._count.shape[0], :self._count.shape[1]] = self._count
+        self._count = count
+
+        for column in self._columns:
+            column_values = np.zeros((n_days, n_tickers), dtype=self._values[column].dtype)
+            column_values[:self._values[column].shape[0], :self._values[column].shape[1]] = \
+                self._values[column]
+            self._values[column] = column_values
@@ -0,0 +1,254 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import constants as c
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+class RollingSpearman:
+    """
+    Rolling Spearman correlation of the last values against a ramp (0, 1, 2, ...).
+
+    Equivalent to `stats.spearmanr(range(n), values[-n:]).correlation` for each
+    window length n, bit for bit, including NaN for constant windows or windows
+    with NaN values.
+
+    For each window, every value keeps how many values of the window are lower
+    and how many are equal to it. When a value arrives (and the oldest leaves)
+    these counters are updated with a single comparison against each value, so
+    no window is ever sorted or ranked again. Average ranks are then
+    `lower + (equal + 1) / 2`. All arithmetic is done on doubled ranks, which
+    are integers, so sums are exact and the final division follows the same
+    floating point steps as `np.corrcoef`.
+
+    Args
+    ----------
+    windows : `tuple` of int
+        Window lengths. Each must be at least 2.
+
+    Properties
+    ----------
+    windows : `tuple` of int
+        Window lengths.
+    max_length : int
+        Number of last values kept (largest window).
+
+    Methods
+    ----------
+    push(value)
+        Add a new value.
+    correlation(window)
+        Get correlation of a window length.
+    correlations()
+        Get correlations of all window lengths.
+    get_window_correlations(values, window)
+        Get correlations of every window of a whole series.
+    """
+    def __init__(self, windows):
+
+        if min(windows) < 2:
+            logger.error(f"Spearman correlation window lengths must be at least 2.")
+            raise Exception
+
+        self._windows = tuple(windows)
+        self._window_index = {window: idx for idx, window in enumerate(self._windows)}
+        self._max_length = max(self._windows)
+
+        n_windows = len(self._windows)
+        sizes = np.array(self._windows, dtype=np.int64)
+        positions = np.arange(self._max_length, dtype=np.int64)
+
+        # Values are right aligned: last value always at `max_length - 1`
+        self._values = np.zeros(self._max_length)
+        self._length = 0
+        self._pushes_since_nan = self._max_length
+
+        # (window, position) counters of lower and equal values inside the window
+        self._lower = np.zeros((n_windows, self._max_length), dtype=np.int64)
+        self._equal = np.zeros((n_windows, self._max_length), dtype=np.int64)
+
+        # Position belongs to the window when full
+        self._first_position = (self._max_length - sizes)[:, None]
+        self._member = positions[None, :] >= self._first_position
+
+        # Doubled ramp rank deviations: 2 * (rank - mean rank)
+        self._ramp_dev = np.where(self._member,
+            2 * (positions[None, :] - self._first_position) + 1 - sizes[:, None], 0)
+        self._ramp_dev_sq = (self._ramp_dev ** 2).sum(axis=1)
+
+        self._fact_inv = np.true_divide(1, sizes - 1)
+        self._sizes = sizes
+
+        self._correlations = None
+
+    @property
+    def windows(self):
+        return self._windows
+
+    @property
+    def max_length(self):
+        return self._max_length
+
+    def __len__(self):
+        return self._length
+
+    def push(self, value):
+        """
+        Add a new value, removing the oldest one of each full window.
+
+        Args
+        ----------
+        value : float
+            New value.
+        """
+        self._correlations = None
+
+        # Values leaving each window (only meaningful for full windows)
+        full = self._length >= self._sizes
+        old_values = self._values[self._first_position[:, 0]]
+
+        self._values[:-1] = self._values[1:]
+        self._values[-1] = value
+        self._lower[:, :-1] = self._lower[:, 1:]
+        self._equal[:, :-1] = self._equal[:, 1:]
+
+        self._length = min(self._length + 1, self._max_length)
+        self._pushes_since_nan = 0 if np.isnan(value) else self._pushes_since_nan + 1
+
+        previous = self._values[None, :-1]
+        inside = self._member[:, :-1] & (np.arange(self._max_length - 1)[None, :] \
+            >= self._max_length - 1 - self._length + 1)
+
+        # Remove oldest value from counters
+        leaving = full[:, None] & inside
+        self._lower[:, :-1] -= leaving & (old_values[:, None] < previous)
+        self._equal[:, :-1] -= leaving & (old_values[:, None] == previous)
+
+        # Add new value to counters
+        self._lower[:, :-1] += inside & (value < previous)
+        self._equal[:, :-1] += inside & (value == previous)
+
+        self._lower[:, -1] = (inside & (previous < value)).sum(axis=1)
+        self._equal[:, -1] = (inside & (previous == value)).sum(axis=1) + 1
+
+    def correlations(self):
+        """
+        Get correlations of all window lengths.
+
+        Returns
+        ----------
+        `np.ndarray` of float
+            Correlation of each window, in `windows` order. NaN if the window
+            is not complete yet, constant or has NaN values.
+        """
+        if self._correlations is not None:
+            return self._correlations
+
+        # Doubled average rank deviations: 2 * (rank - mean rank)
+        rank_dev = np.where(self._member,
+            2 * self._lower + self._equal + 1 - (self._sizes[:, None] + 1), 0)
+
+        # Sums of the deviation products, x4 (exact integers)
+        cross = (self._ramp_dev * rank_dev).sum(axis=1)
+        rank_dev_sq = (rank_dev ** 2).sum(axis=1)
+
+        # Same operations order as `np.corrcoef`
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = (cross / 4) * self._fact_inv
+            std_values = np.sqrt((rank_dev_sq / 4) * self._fact_inv)
+            std_ramp = np.sqrt((self._ramp_dev_sq / 4) * self._fact_inv)
+            correlations = np.clip(cov / std_values / std_ramp, -1, 1)
+
+        invalid = (self._length < self._sizes) | (self._pushes_since_nan < self._sizes)
+        correlations[invalid] = np.nan
+
+        self._correlations = correlations
+
+        return correlations
+
+    def correlation(self, window):
+        """
+        Get correlation of a window length.
+
+        Args
+        ----------
+        window : int
+            Window length. Must be one of `windows`.
+
+        Returns
+        ----------
+        float
+            Correlation. NaN if the window is not complete yet, constant or has
+            NaN values.
+        """
+        return self.correlations()[self._window_index[window]]
+
+    @staticmethod
+    def get_window_correlations(values, window):
+        """
+        Get correlations of every window of a whole series.
+
+        Same results as pushing each value and getting `correlation(window)`
+        when the window is complete, but counting lower and equal values of all
+        windows at once.
+
+        Args
+        ----------
+        values : `list` of float
+            Series values.
+        window : int
+            Window length. Must be at least 2.
+
+        Returns
+        ----------
+        `np.ndarray` of float
+            Correlation of `values[i:i+window]` for each i, `len(values) - window + 1`
+            values (empty if the series is shorter than the window). NaN if the
+            window is constant or has NaN values.
+        """
+        if window < 2:
+            logger.error(f"Spearman correlation window lengths must be at least 2.")
+            raise Exception
+
+        values = np.asarray(values, dtype=np.float64)
+
+        if len(values) < window:
+            return np.zeros(0)
+
+        windows = sliding_window_view(values, window)
+
+        # (window, position) counters of lower and equal values inside the window
+        lower = (windows[:, None, :] < windows[:, :, None]).sum(axis=2)
+        equal = (windows[:, None, :] == windows[:, :, None]).sum(axis=2)
+
+        # Doubled rank deviations: 2 * (rank - mean rank)
+        ramp_dev = 2 * np.arange(window, dtype=np.int64) + 1 - window
+        rank_dev = 2 * lower + equal + 1 - (window + 1)
+
+        cross = (ramp_dev[None, :] * rank_dev).sum(axis=1)
+        rank_dev_sq = (rank_dev ** 2).sum(axis=1)
+        ramp_dev_sq = (ramp_dev ** 2).sum()
+        fact_inv = np.true_divide(1, window - 1)
+
+        # Same operations order as `np.corrcoef`
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = (cross / 4) * fact_inv
+            std_values = np.sqrt((rank_dev_sq / 4) * fact_inv)
+            std_ramp = np.sqrt((ramp_dev_sq / 4) * fact_inv)
+            correlations = np.clip(cov / std_values / std_ramp, -1, 1)
+
+        correlations[np.isnan(windows).any(axis=1)] = np.nan
+
+        return correlations
@@ -0,0 +1,143 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import numpy as np
+
+import constants as c
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+class SignalTable:
+    """
+    Precomputed model signals of a single model tag.
+
+    Columnar table with one row per (ticker, day, operation risk) holding the
+    operation risk, the model input features and the model prediction. Stored
+    on disk as a NumPy `.npz` file, one file per model tag.
+
+    Args
+    ----------
+    tickers : `np.ndarray` of str
+        Ticker of each row.
+    days : `np.ndarray` of `datetime64[D]`
+        Day of each row.
+    operation_risks : `np.ndarray` of float
+        Strategy operation risk parameter of each row.
+    risks : `np.ndarray` of float
+        Operation risk (model input) of each row.
+    features : `np.ndarray` of float
+        Model input features, shape (rows, features).
+    predictions : `np.ndarray`
+        Model prediction of each row.
+
+    Properties
+    ----------
+    operation_risks : `np.ndarray` of float
+        Operation risks available in table.
+
+    Methods
+    ----------
+    get(ticker, day, operation_risk)
+        Get operation risk and prediction.
+    save(path)
+        Save table to `.npz` file.
+    load(path)
+        Load table from `.npz` file.
+    """
+    _epoch_ordinal = 719163
+
+    def __init__(self, tickers, days, operation_risks, risks, features, predictions):
+        self._tickers = np.asarray(tickers, dtype=str)
+        self._days = np.asarray(days, dtype='datetime64[D]')
+        self._operation_risks = np.asarray(operation_risks, dtype=float)
+        self._risks = np.asarray(risks, dtype=float)
+        self._features = np.asarray(features, dtype=float)
+        self._predictions = np.asarray(predictions)
+
+        ordinals = self._days.astype(np.int64) + SignalTable._epoch_ordinal
+
+        self._index = {(ticker, ordinal, operation_risk): row for row, (ticker, ordinal,
+            operation_risk) in enumerate(zip(self._tickers.tolist(), ordinals.tolist(),
+            self._operation_risks.tolist()))}
+
+    def __len__(self):
+        return len(self._tickers)
+
+    @property
+    def operation_risks(self):
+        return np.unique(self._operation_risks)
+
+    def get(self, ticker, day, operation_risk):
+        """
+        Get operation risk and prediction.
+
+        Args
+        ----------
+        ticker : str
+            Ticker name.
+        day : `pd.Timestamp` or `datetime.date`
+            Day.
+        operation_risk : float
+            Strategy operation risk parameter.
+
+        Returns
+        ----------
+        `tuple`
+            Operation risk (model input) and model prediction, or None if not
+            in table.
+        """
+        row = self._index.get((ticker, day.toordinal(), operation_risk))
+
+        if row is None:
+            return None
+
+        return self._risks[row], self._predictions[row]
+
+    def save(self, path):
+        """
+        Save table to `.npz` file.
+
+        Args
+        ----------
+        path : `Path`
+            File path.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(path, 'wb') as file:
+            np.savez(file, tickers=self._tickers, days=self._days,
+                operation_risks=self._operation_risks, risks=self._risks,
+                features=self._features, predictions=self._predictions)
+
+        logger.debug(f"Signal table saved: \'{path}\' ({len(self)} rows).")
+
+    @staticmethod
+    def load(path):
+        """
+        Load table from `.npz` file.
+
+        Args
+        ----------
+        path : `Path`
+            File path.
+
+        Returns
+        ----------
+        `SignalTable`
+            Loaded table, or None if file does not exist.
+        """
+        if not path.exists():
+            return None
+
+        with np.load(path, allow_pickle=False) as data:
+            return SignalTable(data['tickers'], data['days'], data['operation_risks'],
+                data['risks'], data['features'], data['predictions'])
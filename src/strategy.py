@@ -8,16 +8,30 @@ from abc import ABC, abstractmethod
 import sys
 import numpy as np
 import math
-import joblib
+import hashlib
+import glob
+import pickle
+from collections import OrderedDict
+from multiprocessing import Pool, current_process
+import psutil
 from scipy import stats
 import statsmodels.api as sm
 from statsmodels.tools.eval_measures import rmse
 
 import constants as c
 from utils import RunTime, calculate_maximum_volume, calculate_yield_annualized, \
-    get_capital_per_risk, State, Trend, find_candles_peaks
+    get_capital_per_risk, State, Trend, count_active_intervals
 from db_model import DBStrategyModel, DBGenericModel
 from operation import Operation
+from market_cube import MarketCube
+from risk_table import RiskTable
+from performance_recorder import PerformanceRecorder
+from signal_table import SignalTable
+from model_cache import ModelCache
+from rolling_spearman import RollingSpearman
+from ticker_risk_state import TickerRiskState
+from portfolio_stats import PortfolioStatistics
+from monte_carlo import MonteCarlo
 
 # Configure Logging
 logger = logging.getLogger(__name__)
@@ -171,7 +185,7 @@ class PseudoStrategy(ABC):
     # ********* Auxiliary methods for 'process_operations' modularity *********
 
     @abstractmethod
-    def _parse_data(self, ticker_name, initial_date, final_date, day_info, week_info,
+    def _parse_data(self, ticker_name, initial_date, final_date, market_cube, day_idx,
         business_data):
         pass
 
@@ -222,6 +236,22 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
     """
 
     total_strategies = 0
+    # (cache key, precision): baseline yield, least recently used first
+    _tickers_yield_cache = OrderedDict()
+    _tickers_yield_cache_size = 32
+
+    # Parameters that identify a checkpoint (end dates excluded, so it can be extended)
+    _checkpoint_parameters = ('_name', '_risk_capital_product', '_total_capital',
+        '_min_order_volume', '_partial_sale', '_ema_tolerance', '_min_risk', '_max_risk',
+        '_purchase_margin', '_stop_margin', '_stop_type',
+        '_min_days_after_successful_operation', '_min_days_after_failure_operation',
+        '_gain_loss_ratio', '_max_days_per_operation', '_enable_frequency_normalization',
+        '_enable_profit_compensation', '_enable_crisis_halt', '_enable_downtrend_halt',
+        '_enable_dynamic_rcc', '_dynamic_rcc_reference', '_dynamic_rcc_k',
+        '_operation_risk', '_profit_comp_start_std', '_profit_comp_end_std',
+        '_profit_comp_gain_loss')
+    # Attributes changed while operations are processed
+    _checkpoint_attributes = ('_available_capital', '_operations', '_performance_recorder')
 
     def __init__(self, tickers, alias=None, comment=None, risk_capital_product=0.10,
         total_capital=100000, min_order_volume=1, partial_sale=False, ema_tolerance=0.01,
@@ -337,6 +367,14 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
 
         self._statistics_graph = None
         self._statistics_parameters = {}
+        self._performance_recorder = None
+        # Monte Carlo resamples of robustness statistics, disabled by default
+        self.monte_carlo_resamples = 0
+
+        # Resident state of streaming mode
+        self._stream = None
+        # Market cube and its purchase eligibility mask
+        self._eligibility = None
 
         AdaptedAndreMoraesStrategy.total_strategies = total_strategies
         self.strategy_number = 1
@@ -597,139 +635,185 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
         return filteres_tickers_and_dates
 
     @RunTime('process_operations')
-    def process_operations(self, days_before_start=120):
-        try:
-            tcks_priority = [self.TickerState(ticker, dates['start_date'], dates['end_date'],
-                min_days_after_suc_oper=self.min_days_after_successful_operation,
-                min_days_after_fail_oper=self.min_days_after_failure_operation) \
-                for ticker, dates in self.tickers_and_dates.items()]
-
-            self._initialize_tcks_priority(tcks_priority)
-
-            data_gen = self.DataGen(self.tickers_and_dates, self._db_strategy_model,
-                days_batch=30, days_before_start=days_before_start)
-            self.available_capital = self.total_capital
-
-            ref_data = self._get_empty_ref_data()
-
-            if self.stdout_prints:
-                self._start_progress_bar(update_step=0.10)
-
-            while True:
-                try:
-                    day_info, week_info = next(data_gen)
-
-                    if day_info.empty:
-                        continue
-
-                    self._load_models(day_info.head(1)['day'].squeeze(), wfo=True)
-
-                        # DEBUG
-                        # if day_info.head(1)['day'].squeeze() >= pd.Timestamp('2020-06-26'):
-                        #     print()
+    def process_operations(self, days_before_start=120, checkpoint=False):
+        """
+        Process each ticker and day.
 
-                    for index in range(len(tcks_priority)):
+        Args
+        ----------
+        days_before_start : int, default 120
+            Days of data before first ticker start date.
+        checkpoint : bool, default False
+            Resume from the checkpoint of this strategy, if any, processing only
+            days after it. A new checkpoint is saved after the last day, so
+            later runs with later end dates only process the new days.
+        """
+        try:
+            tcks_priority, ref_data, last_day, new_days = self._run_operations(
+                days_before_start, checkpoint)
 
-                        ticker_name = tcks_priority[index].ticker
+            if checkpoint and new_days > 0:
+                self.save_checkpoint(self._get_checkpoint_path(days_before_start),
+                    tcks_priority, ref_data, last_day)
 
-                        business_data = self._get_empty_business_data()
-                        data_validation_flag = False
+            self._finish_operations(tcks_priority)
 
-                        data_validation_flag = self._parse_data(ticker_name,
-                            tcks_priority[index].initial_date,
-                            tcks_priority[index].final_date, day_info,
-                            week_info, business_data)
-                        if data_validation_flag is False:
-                            tcks_priority[index].last_business_data = {}
-                            continue
+        except Exception as error:
+            logger.exception(f"Error processing operations, error:\n{error}")
+            # sys.exit(c.PROCESSING_OPERATIONS_ERR)
+            raise error
 
-                        if self.stdout_prints:
-                            self._update_progress_bar(business_data["day"])
+    def _run_operations(self, days_before_start, checkpoint):
+        """
+        Process all days from start (or from checkpoint) until the last one.
 
-                        data_validation_flag = self._process_auxiliary_data(ticker_name,
-                            tcks_priority, index, business_data, ref_data)
-                        if data_validation_flag is False:
-                            tcks_priority[index].last_business_data = business_data.copy()
-                            continue
+        Returns
+        ----------
+        `list` of `TickerState`
+            Tickers in priority order for the next day.
+        `dict`
+            Reference data.
+        `pd.Timestamp`
+            Last processed day, None if no day was ever processed.
+        int
+            Number of days processed in this run.
+        """
+        checkpoint_data = self._load_checkpoint(self._get_checkpoint_path(
+            days_before_start)) if checkpoint else None
 
-                        if business_data["day"].date() < tcks_priority[index].initial_date \
-                            or business_data["day"].date() > tcks_priority[index].final_date:
-                            tcks_priority[index].last_business_data = business_data.copy()
-                            continue
+        start_date = checkpoint_data['day'] + pd.Timedelta(days=1) \
+            if checkpoint_data is not None else None
 
-                        if not self._check_operation_freezetime(tcks_priority, index):
-                            tcks_priority[index].last_business_data = business_data.copy()
-                            continue
+        data_gen = self.DataGen(self.tickers_and_dates, self._db_strategy_model,
+            days_batch=30, days_before_start=days_before_start, start_date=start_date)
+        market_cube = MarketCube(self.tickers_and_dates, data_gen)
 
-                        if (tcks_priority[index].ongoing_operation_flag is False):
+        if checkpoint_data is None:
+            tcks_priority, ref_data = self._start_operations(market_cube,
+                days_before_start)
+        else:
+            tcks_priority, ref_data = self._resume_operations(market_cube,
+                checkpoint_data)
 
-                            purchase_price = self._get_purchase_price(business_data)
+        for day_idx in range(len(market_cube)):
+            tcks_priority = self._process_day(tcks_priority, market_cube, day_idx,
+                ref_data)
+            self._record_performance(market_cube, day_idx)
 
-                            # Strategy business rules
-                            if self._check_business_rules(business_data, tcks_priority,
-                                index, purchase_price):
+        last_day = market_cube.days[-1] if len(market_cube) > 0 \
+            else (checkpoint_data['day'] if checkpoint_data is not None else None)
 
-                                stop_price = self._get_stop_price(ticker_name, purchase_price,
-                                    business_data)
+        return tcks_priority, ref_data, last_day, len(market_cube)
 
-                                capital_multiplier = self._get_capital_multiplier(tcks_priority,
-                                    index, business_data)
+    def start_streaming(self, days_before_start=120, checkpoint=False):
+        """
+        Start streaming (paper trading) mode.
 
-                                purchase_amount = self._set_operation_purchase(ticker_name,
-                                    purchase_price, stop_price, self.available_capital,
-                                    self.risk_capital_product, tcks_priority, index,
-                                    business_data, capital_multiplier)
-                                self.available_capital = round(self.available_capital - purchase_amount, 2)
+        Processes all available days (or only the ones after the checkpoint)
+        and keeps the state resident, so new days are given one at a time to
+        `process_day()`. Tickers end dates must cover the streamed days.
 
-                                if purchase_amount >= 0.01 and self.stop_type == "staircase":
-                                    self._set_staircase_stop(tcks_priority, index)
-                        else:
-                            if tcks_priority[index].operation.state == State.OPEN:
+        Args
+        ----------
+        days_before_start : int, default 120
+            Same as in `process_operations()`.
+        checkpoint : bool, default False
+            Same as in `process_operations()`.
+        """
+        tcks_priority, ref_data, last_day, _ = self._run_operations(days_before_start,
+            checkpoint)
 
-                                # If hits the stop loss, the operation is automatically closed
-                                sale_amount = self._sell_on_stop_hit(tcks_priority,
-                                    index, business_data)
-                                self.available_capital = round(self.available_capital + sale_amount, 2)
+        self._stream = {'tcks_priority': tcks_priority, 'ref_data': ref_data,
+            'day': last_day, 'days_before_start': days_before_start}
 
-                                if tcks_priority[index].operation.state == State.OPEN:
+        self._start_streaming_indicators(last_day)
 
-                                    if self.partial_sale is True:
-                                        sale_amount = self._sell_on_partial_hit(tcks_priority,
-                                            index, business_data)
-                                        self.available_capital = round(self.available_capital + sale_amount, 2)
+    def process_day(self, day_info, week_info, checkpoint=False):
+        """
+        Process a new day in streaming mode.
 
-                                    sale_amount = self._sell_on_target_hit(tcks_priority,
-                                        index, business_data)
-                                    self.available_capital = round(self.available_capital + sale_amount, 2)
+        Args
+        ----------
+        day_info : `pd.DataFrame`
+            Daily candles and features of the day, one row per ticker. Same
+            columns `DataGen` yields.
+        week_info : `pd.DataFrame`
+            Last week candles and features, one row per ticker.
+        checkpoint : bool, default False
+            Save a checkpoint after the day.
 
-                                    sale_amount = self._sell_on_timeout_hit(tcks_priority,
-                                        index, business_data)
-                                    self.available_capital = round(self.available_capital + sale_amount, 2)
+        Returns
+        ----------
+        `list` of `dict`
+            Purchases and sales of the day, with keys 'ticker', 'day', 'action'
+            ('buy' or 'sell'), 'price', 'volume', 'stop_loss_flag',
+            'partial_sale_flag' and 'timeout_flag'.
+        """
+        if self._stream is None:
+            logger.error(f"Streaming mode not started, call \'start_streaming()\' first.")
+            raise Exception
 
-                            # Update stop loss threshold
-                            if tcks_priority[index].operation.state == State.OPEN \
-                                and self.stop_type == "staircase":
-                                self._update_staircase_stop(tcks_priority, index, business_data)
+        market_cube = MarketCube.from_frames(self.tickers_and_dates, [day_info], [week_info])
 
-                            if tcks_priority[index].operation.state == State.CLOSE:
-                                self._save_and_reset_closed_operation(tcks_priority, index)
+        if len(market_cube) == 0:
+            return []
 
-                        tcks_priority[index].last_business_data = business_data.copy()
+        day = market_cube.days[0]
 
-                    tcks_priority = self._order_by_priority(tcks_priority, business_data['day'])
-                    self._update_global_stats(business_data['day'])
-                except StopIteration:
-                    break
+        if self._stream['day'] is not None and day <= self._stream['day']:
+            logger.error(f"Day \'{day.strftime('%Y-%m-%d')}\' already processed.")
+            raise Exception
 
-            # Insert remaining open operations
-            for ts in tcks_priority:
-                if ts.operation is not None and ts.operation.state == State.OPEN:
-                    self.operations.append(ts.operation)
+        self._update_streaming_indicators(market_cube)
+        self._performance_recorder.extend(self.tickers_and_dates, 1)
+
+        n_operations = len(self.operations)
+
+        self._stream['tcks_priority'] = self._process_day(self._stream['tcks_priority'],
+            market_cube, 0, self._stream['ref_data'])
+        self._record_performance(market_cube, 0)
+        self._stream['day'] = day
+
+        if checkpoint:
+            self.save_checkpoint(self._get_checkpoint_path(self._stream['days_before_start']),
+                self._stream['tcks_priority'], self._stream['ref_data'], day)
+
+        # Operations closed on the day, then ongoing ones
+        operations = self.operations[n_operations:] + [ts.operation \
+            for ts in self._stream['tcks_priority'] if ts.operation is not None]
+
+        decisions = []
+        for operation in operations:
+            for price, volume, op_day in zip(operation.purchase_price,
+                operation.purchase_volume, operation.purchase_datetime):
+                if op_day == day:
+                    decisions.append({'ticker': operation.ticker, 'day': day,
+                        'action': 'buy', 'price': price, 'volume': volume,
+                        'stop_loss_flag': False, 'partial_sale_flag': False,
+                        'timeout_flag': False})
+
+            for sale_idx, op_day in enumerate(operation.sale_datetime):
+                if op_day == day:
+                    decisions.append({'ticker': operation.ticker, 'day': day,
+                        'action': 'sell', 'price': operation.sale_price[sale_idx],
+                        'volume': operation.sale_volume[sale_idx],
+                        'stop_loss_flag': operation.stop_loss_flag[sale_idx],
+                        'partial_sale_flag': operation.partial_sale_flag[sale_idx],
+                        'timeout_flag': operation.timeout_flag[sale_idx]})
+
+        return decisions
+
+    def stop_streaming(self):
+        """Stop streaming mode, adding ongoing operations to `operations`."""
+        if self._stream is not None:
+            self._finish_operations(self._stream['tcks_priority'])
+            self._stream = None
+
+    def _start_streaming_indicators(self, last_day):
+        pass
 
-        except Exception as error:
-            logger.exception(f"Error processing operations, error:\n{error}")
-            # sys.exit(c.PROCESSING_OPERATIONS_ERR)
-            raise error
+    def _update_streaming_indicators(self, market_cube):
+        pass
 
     @RunTime('calculate_statistics')
     def calculate_statistics(self):
@@ -754,7 +838,7 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
         Annualized Average Tickers Yield.
         """
         try:
-            self._calc_performance(days_batch=30)
+            self._calc_performance()
             self._calc_statistics_params()
         except Exception as error:
             logger.exception(f"Error calculating statistics, error:\n{error}")
@@ -765,7 +849,7 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
         self._db_strategy_model.insert_strategy_results(self._statistics_parameters,
             self.operations, self._statistics_graph)
 
-    def _calc_performance(self, days_batch=30):
+    def _calc_performance(self):
         """
         Calculate time domain performance indicators.
 
@@ -774,54 +858,31 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
         Set _statistics_graph dataframe with columns 'day', 'capital', 'capital_in_use',
         'baseline', 'ibov'.
 
-        Args
-        ----------
-        days_batch : int, default 30
-            Data chunk size when requesting to database.
+        Close prices are the ones recorded during `process_operations()`.
         """
+        if self._performance_recorder is None:
+            logger.error(f"No performance data recorded, \'process_operations()\' "
+                f"must be called first.")
+            # sys.exit(c.PROCESSING_OPERATIONS_ERR)
+            raise Exception
+
         statistics = pd.DataFrame(columns=['day', 'capital', 'capital_in_use',
             'baseline', 'ibov'])
 
-        data_gen = self.DataGen(self.tickers_and_dates, self._db_strategy_model,
-            days_batch=days_batch, days_before_start=0)
-        close_prices = {key: [] for key in self.tickers_and_dates}
-        last_price = 0.0
-        dates = []
-        while True:
-            try:
-                day_info, _ = next(data_gen)
-
-                if not day_info.empty:
-                    day = day_info.head(1)['day'].squeeze()
-                    dates.append(day)
-
-                    for ticker, tck_dates in self.tickers_and_dates.items():
-                        if day.date() >= tck_dates['start_date'] and day.date() <= tck_dates['end_date']:
-
-                            close_price = day_info[(day_info['ticker'] == ticker)] \
-                                ['close_price'].squeeze()
-
-                            if (not isinstance(close_price, pd.Series)) and \
-                                (close_price is not None):
-                                close_prices[ticker].append(close_price)
-                                last_price = close_price
-                            else:
-                                close_prices[ticker].append(last_price)
-                                # logger.debug(f"Ticker \'{ticker}\' has no close_price for "
-                                #     f"day \'{day.strftime('%d/%m/%Y')}\'.")
-                        else:
-                            close_prices[ticker].append(np.nan)
-
-            except StopIteration:
-                break
+        dates = self._performance_recorder.days
+        close_prices = self._performance_recorder.get_close_prices()
 
         ibov_data = self._db_strategy_model.get_ticker_price('^BVSP', \
             pd.to_datetime(self.first_date), pd.to_datetime(self.last_date))
 
         statistics['day'] = dates
         statistics['ibov'] = ibov_data['close_price']
+        # Candles last update in the key, so updated data is never served from cache
+        last_updates = self._db_strategy_model.get_last_updates(list(self.tickers_and_dates))
         statistics['baseline'] = AdaptedAndreMoraesStrategy.get_tickers_yield(
-            close_prices, precision=4)
+            close_prices, precision=4, cache_key=tuple((ticker, tck_dates['start_date'],
+            tck_dates['end_date'], last_updates.get(ticker)) \
+            for ticker, tck_dates in self.tickers_and_dates.items()))
         statistics['capital'], statistics['capital_in_use'] = self._calc_capital_usage(
             dates, close_prices)
         statistics['active_operations'] = self._get_number_of_operation_per_day(dates)
@@ -931,6 +992,36 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
             get_correlation(self._statistics_graph['capital'],
             self._statistics_graph['baseline'], method='spearman', precision=real_precision)
 
+        # Robustness confidence intervals
+        if self.monte_carlo_resamples > 0:
+            self._calc_robustness_params(cdi_df['value'], money_precision, real_precision)
+
+    def _calc_robustness_params(self, rf, money_precision, real_precision):
+        """
+        Calculate confidence intervals of profit, maximum drawdown and Sharpe
+        ratio by Monte Carlo resampling of operations and daily returns.
+
+        Set `_statistics_parameters` keys '<statistic>_ci_low' and
+        '<statistic>_ci_high' for the statistics of `MonteCarlo.get_distributions()`.
+        They are logged and saved in strategy_statistics.
+        """
+        monte_carlo = MonteCarlo(self._operations, self._statistics_graph,
+            self._total_capital, rf=rf, resamples=self.monte_carlo_resamples,
+            seed=c.MONTE_CARLO_SEED)
+
+        intervals = monte_carlo.get_confidence_intervals(confidence=c.MONTE_CARLO_CONFIDENCE)
+
+        for name, (low, high) in intervals.items():
+            precision = money_precision if name == 'profit' else real_precision
+
+            self._statistics_parameters[name + '_ci_low'] = round(low, precision)
+            self._statistics_parameters[name + '_ci_high'] = round(high, precision)
+
+        logger.info(f"Strategy \'{self._alias}\' {c.MONTE_CARLO_CONFIDENCE:.0%} confidence "
+            f"intervals ({monte_carlo.resamples} resamples): " + ', '.join(
+            f"{name} [{self._statistics_parameters[name + '_ci_low']}, "
+            f"{self._statistics_parameters[name + '_ci_high']}]" for name in intervals))
+
     @staticmethod
     def sharpe_ratio(target, rf, precision=4):
         if target.std() <= 1e-5:
@@ -975,7 +1066,7 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
 
         return round(corr, precision)
 
-    def _get_number_of_operation_per_day(self, dates):
+    def _get_number_of_operation_per_day(self, dates, per_ticker=False):
         """
         Calculate number of operations per day.
 
@@ -983,26 +1074,28 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
         ----------
         dates: `list` of `pd.Timestamp`
             Dates.
+        per_ticker : bool, default False
+            Count operations of each ticker separately.
 
         Returns
         ----------
         `list` of int
             Operations per day.
+        `dict` of `list` of int
+            Operations per day of each ticker with operations, if `per_ticker`.
         """
-        active_operations = [0] * len(dates)
+        opers = [oper for oper in self._operations \
+            if oper.state in (State.OPEN, State.CLOSE)]
 
-        for oper in self._operations:
+        active_operations = count_active_intervals(dates,
+            [oper.start_date for oper in opers],
+            [oper.end_date if oper.state == State.CLOSE else None for oper in opers],
+            groups=[oper.ticker for oper in opers] if per_ticker else None)
 
-            if oper.state == State.CLOSE:
-                for d_index in [index for index, date in enumerate(dates) \
-                    if date >= oper.start_date and date <= oper.end_date]:
-                    active_operations[d_index] += 1
-            elif (oper.state == State.OPEN):
-                for d_index in [index for index, date in enumerate(dates) \
-                    if date >= oper.start_date]:
-                    active_operations[d_index] += 1
+        if per_ticker:
+            return {ticker: counts.tolist() for ticker, counts in active_operations.items()}
 
-        return active_operations
+        return active_operations.tolist()
 
     def _calc_capital_usage(self, dates, close_prices):
         """
@@ -1011,6 +1104,11 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
         Capital: total non-using money plus money in stocks.
         Capital in use: total ongoing purchase money.
 
+        Event driven: purchases and sales are mapped to their days once, then
+        a single sweep over the days applies cash events (same order and
+        rounding as negotiated) and values the papers in hands of the active
+        operations with vectorized close price lookups.
+
         Args
         ----------
         dates: `list` of `pd.Timestamp`
@@ -1028,50 +1126,111 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
         capital = [None] * len(dates)
         capital_in_use = [None] * len(dates)
 
+        n_days = len(dates)
+        n_opers = len(self._operations)
+
+        day_indexes = {day: day_index for day_index, day in enumerate(dates)}
+        dates_array = np.array(dates, dtype='datetime64[ns]')
+
+        ticker_indexes = {ticker: idx for idx, ticker in enumerate(close_prices)}
+        prices = np.array([close_prices[ticker] for ticker in close_prices], dtype=float) \
+            if close_prices else np.zeros((0, n_days))
+
+        # Cash events of each day, in operation order, purchases before sales
+        cash_events = [[] for _ in range(n_days)]
+
+        # Papers in hands changes: (operation index, volume, day)
+        papers_opers, papers_volumes, papers_days = [], [], []
+
+        oper_tickers = np.zeros(n_opers, dtype=np.int64)
+        start_days, end_days, open_flags = [], [], []
+
+        for oper_idx, oper in enumerate(self._operations):
+            oper_tickers[oper_idx] = ticker_indexes[oper.ticker]
+
+            for p_price, p_volume, p_day in zip(oper.purchase_price, oper.purchase_volume, \
+                oper.purchase_datetime):
+                if p_day in day_indexes:
+                    cash_events[day_indexes[p_day]].append((oper, True, p_price, p_volume))
+
+                papers_opers.append(oper_idx)
+                papers_volumes.append(p_volume)
+                papers_days.append(p_day)
+
+            for s_price, s_volume, s_day in zip(oper.sale_price, oper.sale_volume, \
+                oper.sale_datetime):
+                if s_day in day_indexes:
+                    cash_events[day_indexes[s_day]].append((oper, False, s_price, s_volume))
+
+                papers_opers.append(oper_idx)
+                papers_volumes.append(-s_volume)
+                papers_days.append(s_day)
+
+            start_days.append(oper.start_date if oper.state in (State.OPEN, State.CLOSE) \
+                else None)
+            end_days.append(oper.end_date if oper.state == State.CLOSE else None)
+            open_flags.append(oper.state == State.OPEN)
+
+        # First day index where each change applies (change day <= day)
+        papers_day_indexes = np.searchsorted(dates_array,
+            pd.to_datetime(papers_days).to_numpy(), side='left')
+        papers_changes = [[] for _ in range(n_days)]
+        for oper_idx, volume, day_index in zip(papers_opers, papers_volumes,
+            papers_day_indexes.tolist()):
+            if day_index < n_days:
+                papers_changes[day_index].append((oper_idx, volume))
+
+        # Active operations: OPEN from start on, CLOSE from start until before end
+        start_days = pd.to_datetime(start_days).to_numpy()
+        start_indexes = np.searchsorted(dates_array, start_days, side='left')
+        end_indexes = np.searchsorted(dates_array, pd.to_datetime(end_days).to_numpy(),
+            side='left')
+        start_indexes[np.isnat(start_days)] = n_days
+        end_indexes[np.array(open_flags, dtype=bool)] = n_days
+
+        activations = [[] for _ in range(n_days + 1)]
+        deactivations = [[] for _ in range(n_days + 1)]
+        for oper_idx, (start_index, end_index) in enumerate(zip(start_indexes.tolist(),
+            end_indexes.tolist())):
+            if start_index < end_index:
+                activations[start_index].append(oper_idx)
+                deactivations[end_index].append(oper_idx)
+
+        papers_in_hands = np.zeros(n_opers)
+        active = np.zeros(n_opers, dtype=bool)
+
         current_capital = self.total_capital
         current_capital_in_use = 0.0
 
-        # Iterate over each day chronologically
-        # for day_index, day in statistics['day'].iteritems():
-        for day_index, day in enumerate(dates):
-
-            # if day >= pd.Timestamp("2020-01-30T00"):
-            #     print()
-
-            holding_papers_capital = 0.0
-
-            for oper in self._operations:
-                # Compute purchase debts
-                for p_price, p_volume, p_day in zip(oper.purchase_price, oper.purchase_volume, \
-                    oper.purchase_datetime):
-                    if day == p_day:
-                        amount = round(p_price * p_volume, 2)
-
-                        current_capital = round(current_capital - amount, 2)
-                        current_capital_in_use = round(current_capital_in_use + amount, 2)
-
-                # Compute sale credits
-                for s_price, s_volume, s_day in zip(oper.sale_price, oper.sale_volume, \
-                    oper.sale_datetime):
-                    if day == s_day:
-                        amount = round(s_price * s_volume, 2)
-
-                        current_capital = round(current_capital + amount, 2)
-                        current_capital_in_use = round(current_capital_in_use - \
-                            oper.purchase_price[0] * s_volume, 2)
-
-                # Compute holding papers prices
-                if (oper.state == State.OPEN and day >= oper.start_date) or \
-                    (oper.state == State.CLOSE and day >= oper.start_date and day < oper.end_date):
-
-                    bought_volume = sum([p_volume for p_date, p_volume in \
-                        zip(oper.purchase_datetime, oper.purchase_volume) if p_date <= day])
-                    sold_volume = sum([s_volume for s_date, s_volume in \
-                        zip(oper.sale_datetime, oper.sale_volume) if s_date <= day])
-                    papers_in_hands = bought_volume - sold_volume
-
-                    price = close_prices[oper.ticker][day_index]
-                    holding_papers_capital += round(price * papers_in_hands, 2)
+        for day_index in range(n_days):
+
+            for oper, purchase_flag, price, volume in cash_events[day_index]:
+                amount = round(price * volume, 2)
+
+                if purchase_flag:
+                    current_capital = round(current_capital - amount, 2)
+                    current_capital_in_use = round(current_capital_in_use + amount, 2)
+                else:
+                    current_capital = round(current_capital + amount, 2)
+                    current_capital_in_use = round(current_capital_in_use - \
+                        oper.purchase_price[0] * volume, 2)
+
+            for oper_idx, volume in papers_changes[day_index]:
+                papers_in_hands[oper_idx] += volume
+
+            for oper_idx in activations[day_index]:
+                active[oper_idx] = True
+            for oper_idx in deactivations[day_index]:
+                active[oper_idx] = False
+
+            # Holding papers prices, summed sequentially in operation order
+            active_indexes = np.flatnonzero(active)
+            if len(active_indexes) > 0:
+                holding_papers_capital = np.cumsum(np.round(
+                    prices[oper_tickers[active_indexes], day_index] \
+                    * papers_in_hands[active_indexes], 2))[-1]
+            else:
+                holding_papers_capital = 0.0
 
             capital[day_index] = round(current_capital + holding_papers_capital, 2)
             capital_in_use[day_index] = \
@@ -1099,22 +1258,59 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
             Ordered list.
         """
         if day.date() >= self.first_date:
-            new_list = sorted(tcks_priority, key=lambda ticker_state: \
-                str(int(ticker_state.operation.state == State.OPEN
-                if ticker_state.operation is not None else 0)) \
-                + str(int(ticker_state.operation.state == State.NOT_STARTED
-                if ticker_state.operation is not None else 0)), reverse=True)
+            buckets = [2] * len(tcks_priority)
 
-            return new_list
+            for idx, ticker_state in enumerate(tcks_priority):
+                if ticker_state.operation is not None:
+                    if ticker_state.operation.state == State.OPEN:
+                        buckets[idx] = 0
+                    elif ticker_state.operation.state == State.NOT_STARTED:
+                        buckets[idx] = 1
+
+            return AdaptedAndreMoraesStrategy._partition_by_priority(tcks_priority,
+                buckets, 3)
 
         return tcks_priority
 
+    @staticmethod
+    def _partition_by_priority(tcks_priority, buckets, n_buckets):
+        """
+        Stable partition of a `list` of `TickerState` by priority bucket.
+
+        Same result as a stable sort by bucket, in linear time. If the list is
+        already ordered (no operation state changed since last ordering), the
+        same list is returned.
+
+        Args
+        ----------
+        tcks_priority : `list` of `TickerState`
+            Tickers in current priority order.
+        buckets : `list` of int
+            Bucket of each ticker, 0 is the highest priority.
+        n_buckets : int
+            Number of buckets.
+
+        Returns
+        ----------
+        `list` of `TickerState`
+            Ordered list.
+        """
+        if all(buckets[idx] <= buckets[idx + 1] for idx in range(len(buckets) - 1)):
+            return tcks_priority
+
+        partition = [[] for _ in range(n_buckets)]
+
+        for ticker_state, bucket in zip(tcks_priority, buckets):
+            partition[bucket].append(ticker_state)
+
+        return [ticker_state for bucket in partition for ticker_state in bucket]
+
     def _update_global_stats(self, day):
         pass
 
     # Assumption: all tickers have the same length of the first one.
     @staticmethod
-    def get_tickers_yield(close_prices, precision=4):
+    def get_tickers_yield(close_prices, precision=4, cache_key=None):
         """
         Calculate average tickers yield.
 
@@ -1124,91 +1320,116 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
 
         Handle late start tickers.
 
+        Computed over a (days, tickers) price matrix: capital is only rebalanced
+        on days the number of available tickers changes, all other days are
+        valued at once with the volumes of the last rebalance.
+
         Args
         ----------
         close_prices : `dict` of `list`
-            Tickers prices. Prices `list` must have the same length.
+            Tickers prices. Prices `list` must have the same length. NaN means
+            ticker not available.
         precision : int, default 4
             Output final precision.
+        cache_key : optional
+            Hashable identification of `close_prices` (e.g. tickers, dates and
+            candles last update). If set, result is cached, up to
+            `_tickers_yield_cache_size` results.
 
         Returns
         ----------
         `list` of float
             Average yield. Same length as prices.
         """
+        cache = AdaptedAndreMoraesStrategy._tickers_yield_cache
+        if cache_key is not None and (cache_key, precision) in cache:
+            cache.move_to_end((cache_key, precision))
+            return list(cache[(cache_key, precision)])
+
         initial_capital = 100000
         current_capital = initial_capital
-        number_of_days = len(close_prices[tuple(close_prices.keys())[0]])
-        volumes = {ticker: [np.nan]*len(prices) for ticker, prices in close_prices.items()}
-        capital = []
 
-        last_num_tickers = 0
-        for day_index in range(number_of_days):
+        tickers = list(close_prices.keys())
+        prices = np.array([close_prices[ticker] for ticker in tickers], dtype=float).T
+        available = ~np.isnan(prices)
+        number_of_days = prices.shape[0]
 
-            num_tickers = 0
+        num_tickers = available.sum(axis=1)
+        rebalance_days = [0] + (np.flatnonzero(np.diff(num_tickers)) + 1).tolist() \
+            if number_of_days > 0 else []
+
+        # Volumes and non-invested capital of each day, set on rebalance days
+        volumes = np.full(prices.shape, np.nan)
+        capital_per_day = np.zeros(number_of_days)
+
+        for reb_idx, day_index in enumerate(rebalance_days):
+            day_prices = prices[day_index]
+            day_available = available[day_index].tolist()
+
+            # Cheapest ticker (first one on ties)
             lesser_price = {"ticker": "", "price": initial_capital}
-            for ticker in close_prices:
-                num_tickers += 1 if close_prices[ticker][day_index] is not np.nan else 0
-                if close_prices[ticker][day_index] is not np.nan and \
-                    close_prices[ticker][day_index] < lesser_price["price"]:
-                    lesser_price["price"] = close_prices[ticker][day_index]
-                    lesser_price["ticker"] = ticker
-
-            if day_index == 0:
-                amount_per_stock = round(initial_capital / num_tickers, 2)
-
-                for ticker in close_prices:
-                    if close_prices[ticker][day_index] is not np.nan:
-                        volumes[ticker][day_index] = int(amount_per_stock // close_prices[ticker][day_index])
-                        current_capital = round(current_capital - close_prices[ticker][day_index] * volumes[ticker][day_index], 2)
-
-                if current_capital >= lesser_price["price"]:
-                    bonus_volume = int(current_capital // close_prices[lesser_price["ticker"]][day_index])
-                    volumes[lesser_price["ticker"]][day_index] += bonus_volume
-                    current_capital = round(current_capital - close_prices[lesser_price["ticker"]][day_index] * bonus_volume, 2)
-
-            elif num_tickers != last_num_tickers:
-                # Sell everything by current close day price
-                for ticker in close_prices:
-                    if close_prices[ticker][day_index] is not np.nan and \
-                        volumes[ticker][day_index-1] is not np.nan:
-                        current_capital = round(current_capital + close_prices[ticker][day_index] * volumes[ticker][day_index-1], 2)
-
-                # Now re-buy
-                amount_per_stock = round(current_capital / num_tickers, 2)
-                for ticker in close_prices:
-                    if close_prices[ticker][day_index] is not np.nan:
-                        volumes[ticker][day_index] = int(amount_per_stock // close_prices[ticker][day_index])
-                        current_capital = round(current_capital - close_prices[ticker][day_index] * volumes[ticker][day_index], 2)
-
-                if current_capital >= lesser_price["price"]:
-                    bonus_volume = int(current_capital // close_prices[lesser_price["ticker"]][day_index])
-                    volumes[lesser_price["ticker"]][day_index] += bonus_volume
-                    current_capital = round(current_capital - close_prices[lesser_price["ticker"]][day_index] * bonus_volume, 2)
-            else:
-                for ticker in close_prices:
-                    volumes[ticker][day_index] = volumes[ticker][day_index-1]
-
-            last_num_tickers = num_tickers
-
-            total_money = 0.0
-            for ticker in close_prices:
-                if close_prices[ticker][day_index] is not np.nan:
-                    total_money += close_prices[ticker][day_index] * volumes[ticker][day_index]
-            total_money += current_capital
-            if day_index == 0:
-                capital.append(1.0)
-            else:
-                capital.append(round(total_money/initial_capital, precision))
+            if any(day_available):
+                lesser_idx = int(np.argmin(np.where(available[day_index], day_prices, np.inf)))
+                if day_prices[lesser_idx] < lesser_price["price"]:
+                    lesser_price["price"] = day_prices[lesser_idx]
+                    lesser_price["ticker"] = tickers[lesser_idx]
 
-        return capital
+            if day_index != 0:
+                # Sell everything by current close day price
+                for tck_idx in range(len(tickers)):
+                    if day_available[tck_idx] and not np.isnan(volumes[day_index-1, tck_idx]):
+                        current_capital = round(current_capital + day_prices[tck_idx] \
+                            * int(volumes[day_index-1, tck_idx]), 2)
+
+            # Now (re-)buy
+            amount_per_stock = round(current_capital / int(num_tickers[day_index]), 2)
+            for tck_idx in range(len(tickers)):
+                if day_available[tck_idx]:
+                    volume = int(amount_per_stock // day_prices[tck_idx])
+                    volumes[day_index, tck_idx] = volume
+                    current_capital = round(current_capital - day_prices[tck_idx] * volume, 2)
+
+            if current_capital >= lesser_price["price"]:
+                lesser_idx = tickers.index(lesser_price["ticker"])
+                bonus_volume = int(current_capital // day_prices[lesser_idx])
+                volumes[day_index, lesser_idx] += bonus_volume
+                current_capital = round(current_capital - day_prices[lesser_idx] * bonus_volume, 2)
+
+            # Volumes are kept until next rebalance
+            next_day_index = rebalance_days[reb_idx+1] if reb_idx + 1 < len(rebalance_days) \
+                else number_of_days
+            volumes[day_index+1:next_day_index] = volumes[day_index]
+            capital_per_day[day_index:next_day_index] = current_capital
+
+        # Tickers money summed in tickers order, then non-invested capital
+        total_money = np.cumsum(np.where(available, prices * volumes, 0.0), axis=1)[:, -1] \
+            if len(tickers) > 0 else np.zeros(number_of_days)
+        total_money = total_money + capital_per_day
+
+        # Python round() of each value, np.round() differs on halves
+        capital = [round(value, precision) for value in \
+            (total_money / initial_capital).tolist()]
+        if number_of_days > 0:
+            capital[0] = 1.0
+
+        if cache_key is not None:
+            cache[(cache_key, precision)] = capital
+            if len(cache) > AdaptedAndreMoraesStrategy._tickers_yield_cache_size:
+                cache.popitem(last=False)
+
+        return list(capital)
 
     class DataGen:
         def __init__(self, tickers, db_connection, days_batch=30, days_before_start=120,
-            week=True, volume=False):
+            week=True, volume=False, start_date=None):
             self.tickers = tickers
             self.first_date = min(self.tickers.values(), key=lambda x: x['start_date'])['start_date']
             self.first_date = self.first_date - BDay(days_before_start)
+
+            # Continue from a given date (e.g. after a checkpoint)
+            if start_date is not None:
+                self.first_date = pd.Timestamp(start_date)
+
             self.last_date = max(self.tickers.values(), key=lambda x: x['end_date'])['end_date']
             self.db_connection = db_connection
             self.days_batch = days_batch
@@ -1268,28 +1489,37 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
             return daily_data
 
     class TickerState:
+        # Slots instead of per instance dict: one state per ticker is accessed
+        # many times per simulated day. Plain read/write state is kept in public
+        # slots, properties only where access has some logic.
+        __slots__ = ('_ticker', '_initial_date', '_final_date', 'ongoing_operation_flag',
+            'partial_sale_flag', 'operation', 'mark_1_stop_trigger', 'mark_1_stop_loss',
+            'mark_2_stop_trigger', 'mark_2_stop_loss', 'current_mark', 'days_on_operation',
+            'days_after_suc_oper', 'days_after_fail_oper', 'profit', 'loaned', 'op_count',
+            'op_suc_count', '_last_business_data', '_extra_vars')
+
         def __init__(self, ticker, initial_date, final_date, ongoing_operation_flag=False,
             partial_sale_flag=False, operation=None, min_days_after_suc_oper=0,
             min_days_after_fail_oper=0):
             self._ticker = ticker
             self._initial_date = initial_date
             self._final_date = final_date
-            self._ongoing_operation_flag = ongoing_operation_flag
-            self._partial_sale_flag = partial_sale_flag
-            self._operation = operation
-            self._mark_1_stop_trigger = None
-            self._mark_1_stop_loss = None
-            self._mark_2_stop_trigger = None
-            self._mark_2_stop_loss = None
-            self._current_mark = 0
-            self._days_on_operation = 0
-            self._days_after_suc_oper = min_days_after_suc_oper + 1
-            self._days_after_fail_oper = min_days_after_fail_oper + 1
-
-            self._profit = 0.0
-            self._loaned = 0.0
-            self._op_count = 0
-            self._op_suc_count = 0
+            self.ongoing_operation_flag = ongoing_operation_flag
+            self.partial_sale_flag = partial_sale_flag
+            self.operation = operation
+            self.mark_1_stop_trigger = None
+            self.mark_1_stop_loss = None
+            self.mark_2_stop_trigger = None
+            self.mark_2_stop_loss = None
+            self.current_mark = 0
+            self.days_on_operation = 0
+            self.days_after_suc_oper = min_days_after_suc_oper + 1
+            self.days_after_fail_oper = min_days_after_fail_oper + 1
+
+            self.profit = 0.0
+            self.loaned = 0.0
+            self.op_count = 0
+            self.op_suc_count = 0
 
             # Must be dict if used
             self._last_business_data = {}
@@ -1309,93 +1539,9 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
         def final_date(self):
             return self._final_date
 
-        @property
-        def ongoing_operation_flag(self):
-            return self._ongoing_operation_flag
-
-        @ongoing_operation_flag.setter
-        def ongoing_operation_flag(self, ongoing_operation_flag):
-            self._ongoing_operation_flag = ongoing_operation_flag
-
-        @property
-        def partial_sale_flag(self):
-            return self._partial_sale_flag
-
-        @partial_sale_flag.setter
-        def partial_sale_flag(self, partial_sale_flag):
-            self._partial_sale_flag = partial_sale_flag
-
-        @property
-        def operation(self):
-            return self._operation
-
-        @operation.setter
-        def operation(self, operation):
-            self._operation = operation
-
-        @property
-        def mark_1_stop_trigger(self):
-            return self._mark_1_stop_trigger
-
-        @mark_1_stop_trigger.setter
-        def mark_1_stop_trigger(self, mark_1_stop_trigger):
-            self._mark_1_stop_trigger = mark_1_stop_trigger
-
-        @property
-        def mark_1_stop_loss(self):
-            return self._mark_1_stop_loss
-
-        @mark_1_stop_loss.setter
-        def mark_1_stop_loss(self, mark_1_stop_loss):
-            self._mark_1_stop_loss = mark_1_stop_loss
-
-        @property
-        def mark_2_stop_trigger(self):
-            return self._mark_2_stop_trigger
-
-        @mark_2_stop_trigger.setter
-        def mark_2_stop_trigger(self, mark_2_stop_trigger):
-            self._mark_2_stop_trigger = mark_2_stop_trigger
-
-        @property
-        def mark_2_stop_loss(self):
-            return self._mark_2_stop_loss
-
-        @mark_2_stop_loss.setter
-        def mark_2_stop_loss(self, mark_2_stop_loss):
-            self._mark_2_stop_loss = mark_2_stop_loss
-
-        @property
-        def current_mark(self):
-            return self._current_mark
-
-        @current_mark.setter
-        def current_mark(self, current_mark):
-            self._current_mark = current_mark
-
-        @property
-        def days_on_operation(self):
-            return self._days_on_operation
-
-        @days_on_operation.setter
-        def days_on_operation(self, days_on_operation):
-            self._days_on_operation = days_on_operation
-
-        @property
-        def days_after_suc_oper(self):
-            return self._days_after_suc_oper
-
-        @days_after_suc_oper.setter
-        def days_after_suc_oper(self, days_after_suc_oper):
-            self._days_after_suc_oper = days_after_suc_oper
-
-        @property
-        def days_after_fail_oper(self):
-            return self._days_after_fail_oper
-
-        @days_after_fail_oper.setter
-        def days_after_fail_oper(self, days_after_fail_oper):
-            self._days_after_fail_oper = days_after_fail_oper
+        @final_date.setter
+        def final_date(self, final_date):
+            self._final_date = final_date
 
         @property
         def last_business_data(self):
@@ -1413,38 +1559,6 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
         def extra_vars(self, extra_vars):
             self._extra_vars = extra_vars.copy()
 
-        @property
-        def profit(self):
-            return self._profit
-
-        @profit.setter
-        def profit(self, profit):
-            self._profit = profit
-
-        @property
-        def loaned(self):
-            return self._loaned
-
-        @loaned.setter
-        def loaned(self, loaned):
-            self._loaned = loaned
-
-        @property
-        def op_count(self):
-            return self._op_count
-
-        @op_count.setter
-        def op_count(self, op_count):
-            self._op_count = op_count
-
-        @property
-        def op_suc_count(self):
-            return self._op_suc_count
-
-        @op_suc_count.setter
-        def op_suc_count(self, op_suc_count):
-            self._op_suc_count = op_suc_count
-
     def _start_progress_bar(self, update_step=0.05):
         self._update_step = update_step
         self._next_update_percent = update_step
@@ -1470,141 +1584,609 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
             sys.stdout.flush()
             self._next_update_percent += self._update_step
 
-    def _load_models(self, day, wfo=True):
-        pass
+    def _start_operations(self, market_cube, days_before_start):
+        """
+        Initialize operations processing state.
 
-    def _check_operation_freezetime(self, tcks_priority, tck_idx):
-        tcks_priority[tck_idx].days_after_suc_oper += 1
-        tcks_priority[tck_idx].days_after_fail_oper += 1
+        Args
+        ----------
+        market_cube : `MarketCube`
+            Market data.
+        days_before_start : int
+            Days of data before first ticker start date.
 
-        if tcks_priority[tck_idx].days_after_suc_oper > \
-                self.min_days_after_successful_operation \
-            and tcks_priority[tck_idx].days_after_fail_oper > \
-                self.min_days_after_failure_operation:
-                return True
+        Returns
+        ----------
+        `list` of `TickerState`
+            Tickers in priority order.
+        `dict`
+            Reference data from `_get_empty_ref_data()`.
+        """
+        tcks_priority = [self.TickerState(ticker, dates['start_date'], dates['end_date'],
+            min_days_after_suc_oper=self.min_days_after_successful_operation,
+            min_days_after_fail_oper=self.min_days_after_failure_operation) \
+            for ticker, dates in self.tickers_and_dates.items()]
 
-        return False
+        self._initialize_tcks_priority(tcks_priority)
 
-    def _initialize_tcks_priority(self, tcks_priority):
-        for index in range(len(tcks_priority)):
-            tcks_priority[index].days_on_operation = 0
+        self._performance_recorder = PerformanceRecorder(self.tickers_and_dates,
+            len(market_cube))
+        self.available_capital = self.total_capital
 
-    def _get_empty_ref_data(self):
-        return {}
+        ref_data = self._get_empty_ref_data()
 
-    def _process_auxiliary_data(self, ticker_name, tcks_priority,
-        tck_idx, business_data, ref_data):
+        if self.stdout_prints:
+            self._start_progress_bar(update_step=0.10)
 
-        if tcks_priority[tck_idx].ongoing_operation_flag and \
-            tcks_priority[tck_idx].operation.state == State.OPEN:
+        return tcks_priority, ref_data
 
-            tcks_priority[tck_idx].days_on_operation += 1
+    def _resume_operations(self, market_cube, checkpoint_data):
+        """
+        Restore operations processing state from a checkpoint.
 
-        return True
+        Args
+        ----------
+        market_cube : `MarketCube`
+            Market data of the days after the checkpoint.
+        checkpoint_data : `dict`
+            Data from `_load_checkpoint()`.
 
-    def _get_empty_business_data(self):
-        business_data = {"day": None, "open_price_day": None, "max_price_day": None,
-            "min_price_day": None, "close_price_day": None, "ema_17_day": None,
-            "ema_72_day": None, "target_buy_price_day": None, "stop_loss_day": None,
-            "up_down_trend_status_day": None, "peak_day": None, "ema_72_week": None}
+        Returns
+        ----------
+        `list` of `TickerState`
+            Tickers in priority order.
+        `dict`
+            Reference data.
+        """
+        self._set_checkpoint_state(checkpoint_data['state'])
 
-        return business_data
+        tcks_priority = checkpoint_data['tcks_priority']
 
-    def _parse_data(self, ticker_name, initial_date, final_date, day_info, week_info,
-        business_data):
+        # End dates may be later than the ones of the checkpoint run
+        for ticker_state in tcks_priority:
+            ticker_state.final_date = self.tickers_and_dates[ticker_state.ticker]['end_date']
 
-        if day_info.empty or week_info.empty:
-            return False
+        self._performance_recorder.extend(self.tickers_and_dates, len(market_cube))
 
-        day = day_info.head(1)['day'].squeeze()
+        if self.stdout_prints:
+            self._start_progress_bar(update_step=0.10)
 
-        if day_info[(day_info['ticker'] == ticker_name)].empty:
-            logger.info(f"Could not get day (\'{day.strftime('%Y-%m-%d')}\') " \
-                f"for ticker \'{ticker_name}\'.")
-            return False
+        return tcks_priority, checkpoint_data['ref_data']
 
-        if week_info[(week_info['ticker'] == ticker_name)].empty:
-            logger.info(f"Could not get last week for ticker \'{ticker_name}\' " \
-                f"(week before day \'{day.strftime('%Y-%m-%d')}\').")
-            return False
+    def save_checkpoint(self, path, tcks_priority, ref_data, day):
+        """
+        Save operations processing state at the end of a day.
 
-        open_price_day = day_info[(day_info['ticker'] == ticker_name)]['open_price'].squeeze()
-        max_price_day = day_info[(day_info['ticker'] == ticker_name)]['max_price'].squeeze()
-        min_price_day = day_info[(day_info['ticker'] == ticker_name)]['min_price'].squeeze()
-        close_price_day = day_info[(day_info['ticker'] == ticker_name)]['close_price'].squeeze()
-        ema_17_day = day_info[(day_info['ticker'] == ticker_name)]['ema_17'].squeeze()
-        ema_72_day = day_info[(day_info['ticker'] == ticker_name)]['ema_72'].squeeze()
-        target_buy_price_day = day_info[(day_info['ticker'] == ticker_name)]['target_buy_price'].squeeze()
-        stop_loss_day = day_info[(day_info['ticker'] == ticker_name)]['stop_loss'].squeeze()
-        up_down_trend_status_day = day_info[(day_info['ticker'] == ticker_name)]['up_down_trend_status'].squeeze()
-        peak_day = day_info[(day_info['ticker'] == ticker_name)]['peak'].squeeze()
-
-        ema_72_week = week_info[(week_info['ticker'] == ticker_name)]['ema_72'].squeeze()
-
-        if isinstance(open_price_day, pd.Series) or \
-            isinstance(max_price_day, pd.Series) or \
-            isinstance(min_price_day, pd.Series) or \
-            isinstance(close_price_day, pd.Series) or \
-            isinstance(ema_17_day, pd.Series) or \
-            isinstance(ema_72_day, pd.Series) or \
-            isinstance(target_buy_price_day, pd.Series) or \
-            isinstance(stop_loss_day, pd.Series) or \
-            isinstance(up_down_trend_status_day, pd.Series) or \
-            isinstance(peak_day, pd.Series) or \
-            isinstance(ema_72_week, pd.Series):
-            logger.warning(f"Ticker \'{ticker_name}\' has missing " \
-                f"data for day \'{day.strftime('%Y-%m-%d')}\'.")
-            return False
+        Args
+        ----------
+        path : `Path`
+            File path.
+        tcks_priority : `list` of `TickerState`
+            Tickers in priority order for the next day.
+        ref_data : `dict`
+            Reference data.
+        day : `pd.Timestamp`
+            Last processed day.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
 
-        target_buy_price_day = self._parse_target_buy_price(ticker_name, day, target_buy_price_day)
-        stop_loss_day = self._parse_stop_loss(ticker_name, day, target_buy_price_day, stop_loss_day)
+        checkpoint_data = {'day': day, 'tcks_priority': tcks_priority, 'ref_data': ref_data,
+            'state': self._get_checkpoint_state(), 'data_version': self._get_data_version(day)}
 
-        if target_buy_price_day == 0.0 or stop_loss_day == 0.0:
-            return False
+        with open(path, 'wb') as file:
+            pickle.dump(checkpoint_data, file, protocol=pickle.HIGHEST_PROTOCOL)
 
-        business_data["day"] = day
-        business_data["open_price_day"] = open_price_day
-        business_data["max_price_day"] = max_price_day
-        business_data["min_price_day"] = min_price_day
-        business_data["close_price_day"] = close_price_day
-        business_data["ema_17_day"] = ema_17_day
-        business_data["ema_72_day"] = ema_72_day
-        business_data["target_buy_price_day"] = target_buy_price_day
-        business_data["stop_loss_day"] = stop_loss_day
-        business_data["up_down_trend_status_day"] = up_down_trend_status_day
-        business_data["peak_day"] = peak_day
-        business_data["ema_72_week"] = ema_72_week
+        logger.debug(f"Checkpoint saved: \'{path}\' ({day.strftime('%Y-%m-%d')}).")
 
-        return True
+    def _load_checkpoint(self, path):
+        """
+        Load checkpoint.
 
-    def _parse_target_buy_price(self, ticker_name, day, default_target_price):
+        Returns
+        ----------
+        `dict`
+            Checkpoint data, None if file does not exist or is not usable
+            (last processed day after all tickers end date, or data of the last
+            processed day changed since the checkpoint).
+        """
+        if not path.exists():
+            return None
 
-        if default_target_price <= 0.0:
-            logger.warning(f"Ticker satisfies all purchase conditions, " \
-                f"but no target price or stop loss is set. (\'{ticker_name}\'" \
-                f", \'{day.strftime('%Y-%m-%d')}\')")
-            return 0.0
+        with open(path, 'rb') as file:
+            checkpoint_data = pickle.load(file)
 
-        target_buy_price_day = round(default_target_price * (1 + self.purchase_margin), 2)
+        if checkpoint_data['day'].date() > max(dates['end_date'] \
+            for dates in self.tickers_and_dates.values()):
+            logger.warning(f"Checkpoint \'{path}\' ignored: processed days after "
+                f"tickers end date.")
+            return None
 
-        return target_buy_price_day
+        # Splits and dividends re-normalize past candles (and their features)
+        if checkpoint_data.get('data_version') != self._get_data_version(checkpoint_data['day']):
+            logger.warning(f"Checkpoint \'{path}\' ignored: candles or features of "
+                f"\'{checkpoint_data['day'].strftime('%Y-%m-%d')}\' changed since it was saved.")
+            return None
 
-    def _parse_stop_loss(self, ticker_name, day, target_buy_price, default_stop_loss):
+        logger.info(f"Resuming from checkpoint \'{path}\' "
+            f"({checkpoint_data['day'].strftime('%Y-%m-%d')}).")
 
-        if default_stop_loss <= 0.0:
-            logger.warning(f"Ticker satisfies all purchase conditions, " \
-                f"but no target price or stop loss is set. (\'{ticker_name}\'" \
-                f", \'{day.strftime('%Y-%m-%d')}\')")
-            return 0.0
+        return checkpoint_data
 
-        # stop_risk = self._tickers_rcc_df.loc[
-        #     self._tickers_rcc_df['ticker'] == ticker_name, ['rcc']].squeeze()
-        stop_risk = None
+    def _get_data_version(self, day):
+        """
+        Get a hash of daily candles and features of all tickers on a day.
 
-        stop_loss_day = 0.0
+        Candles are back adjusted, so a new split or dividend after the day
+        changes its prices too.
+        """
+        data = self._db_strategy_model.get_data_chunk(self.tickers_and_dates, day, day)
 
-        if stop_risk is None or isinstance(stop_risk, pd.Series):
-            # print(f"Stop loss empty for ticker \'{ts.ticker}\'")
+        return hashlib.md5(data.to_csv(index=False).encode()).hexdigest()
+
+    def _get_checkpoint_path(self, days_before_start):
+        """
+        Get checkpoint file path.
+
+        File name has a hash of the strategy parameters and tickers start dates,
+        so the same strategy with later end dates finds its checkpoint.
+        """
+        key = (sorted((ticker, str(dates['start_date'])) \
+            for ticker, dates in self.tickers_and_dates.items()), days_before_start,
+            [getattr(self, parameter) for parameter in self._checkpoint_parameters])
+
+        key_hash = hashlib.md5(repr(key).encode()).hexdigest()[:16]
+
+        return Path(__file__).parent.parent / c.CHECKPOINTS_PATH / \
+            (key_hash + c.CHECKPOINT_SUFFIX)
+
+    def _get_checkpoint_state(self):
+        return {attribute: getattr(self, attribute) \
+            for attribute in self._checkpoint_attributes}
+
+    def _set_checkpoint_state(self, state):
+        for attribute, value in state.items():
+            setattr(self, attribute, value)
+
+    def _record_performance(self, market_cube, day_idx):
+        self._performance_recorder.record(market_cube.days[day_idx],
+            market_cube.daily[day_idx, :, market_cube.daily_fields['close_price']],
+            market_cube.daily_count[day_idx] == 1)
+
+    def _finish_operations(self, tcks_priority):
+        # Insert remaining open operations
+        for ts in tcks_priority:
+            if ts.operation is not None and ts.operation.state == State.OPEN:
+                self.operations.append(ts.operation)
+
+    def _process_day(self, tcks_priority, market_cube, day_idx, ref_data):
+        """
+        Process all tickers for a single day.
+
+        The day is processed in two steps:
+          1) Parse data and update auxiliary data of tickers that can act today
+             (open operations, or purchase candidates not rejected by the
+             eligibility mask, see `_get_eligibility_mask`). Tickers without
+             valid data are skipped, rejected tickers with valid data are not
+             parsed, their auxiliary data is updated at once from the market
+             cube (see `_update_rejected_tickers`);
+          2) Apply purchases and sales in priority order.
+
+        Step 1 only touches per ticker state, so the result is the same as
+        processing each ticker from start to end before the next one.
+
+        Args
+        ----------
+        tcks_priority : `list` of `TickerState`
+            Tickers in priority order.
+        market_cube : `MarketCube`
+            Market data.
+        day_idx : int
+            Day index in `market_cube`.
+        ref_data : `dict`
+            Reference data from `_get_empty_ref_data()`.
+
+        Returns
+        ----------
+        `list` of `TickerState`
+            Tickers in the priority order for the next day.
+        """
+        self._load_models(market_cube.days[day_idx], wfo=True)
+
+            # DEBUG
+            # if market_cube.days[day_idx] >= pd.Timestamp('2020-06-26'):
+            #     print()
+
+        day_business_data = [None] * len(tcks_priority)
+        active_indexes = []
+        rejected_indexes = []
+        eligible, parsable = self._get_eligible_tickers(market_cube, day_idx)
+
+        for index in range(len(tcks_priority)):
+            if tcks_priority[index].ongoing_operation_flag is False:
+                cube_idx = market_cube.ticker_index[tcks_priority[index].ticker]
+
+                # Same result of `_prepare_ticker_day()` when `_parse_data()` fails
+                if not parsable[cube_idx]:
+                    tcks_priority[index].last_business_data = {}
+                    continue
+
+                # Purchase would be rejected, only auxiliary data is updated
+                if not eligible[cube_idx]:
+                    rejected_indexes.append(index)
+                    continue
+
+            day_business_data[index] = self._get_empty_business_data()
+
+            if self._prepare_ticker_day(tcks_priority, index, market_cube, day_idx,
+                day_business_data[index], ref_data):
+                active_indexes.append(index)
+
+        self._update_rejected_tickers(tcks_priority, rejected_indexes, market_cube, day_idx)
+
+        for index in active_indexes:
+            self._execute_ticker_day(tcks_priority, index, day_business_data[index])
+
+        # Same as the last parsed ticker of the day (None if it has no valid data)
+        if rejected_indexes and rejected_indexes[-1] == len(tcks_priority) - 1:
+            last_day = market_cube.days[day_idx]
+        else:
+            last_day = day_business_data[-1]['day'] if day_business_data and \
+                day_business_data[-1] is not None else None
+
+        tcks_priority = self._order_by_priority(tcks_priority, last_day)
+        self._update_global_stats(last_day)
+
+        return tcks_priority
+
+    def _prepare_ticker_day(self, tcks_priority, index, market_cube, day_idx,
+        business_data, ref_data):
+        """
+        Parse data and check whether the ticker can purchase or sell today.
+
+        Args
+        ----------
+        tcks_priority : `list` of `TickerState`
+            Tickers in priority order.
+        index : int
+            Ticker index in `tcks_priority`.
+        market_cube : `MarketCube`
+            Market data.
+        day_idx : int
+            Day index in `market_cube`.
+        business_data : `dict`
+            Empty business data, filled with parsed data.
+        ref_data : `dict`
+            Reference data from `_get_empty_ref_data()`.
+
+        Returns
+        ----------
+        bool
+            True if ticker must go to `_execute_ticker_day`.
+        """
+        ticker_name = tcks_priority[index].ticker
+
+        data_validation_flag = self._parse_data(ticker_name,
+            tcks_priority[index].initial_date,
+            tcks_priority[index].final_date, market_cube,
+            day_idx, business_data)
+        if data_validation_flag is False:
+            tcks_priority[index].last_business_data = {}
+            return False
+
+        if self.stdout_prints:
+            self._update_progress_bar(business_data["day"])
+
+        data_validation_flag = self._process_auxiliary_data(ticker_name,
+            tcks_priority, index, business_data, ref_data)
+        if data_validation_flag is False:
+            tcks_priority[index].last_business_data = business_data.copy()
+            return False
+
+        if business_data["day"].date() < tcks_priority[index].initial_date \
+            or business_data["day"].date() > tcks_priority[index].final_date:
+            tcks_priority[index].last_business_data = business_data.copy()
+            return False
+
+        if not self._check_operation_freezetime(tcks_priority, index):
+            tcks_priority[index].last_business_data = business_data.copy()
+            return False
+
+        return True
+
+    def _update_rejected_tickers(self, tcks_priority, indexes, market_cube, day_idx):
+        """
+        Update tickers rejected by the eligibility mask, without parsing their data.
+
+        Same state of `_prepare_ticker_day()` for tickers with valid data and
+        no ongoing operation, except `last_business_data`, which is emptied
+        (only read by purchases, see `_get_eligibility_mask`).
+
+        Args
+        ----------
+        tcks_priority : `list` of `TickerState`
+            Tickers in priority order.
+        indexes : `list` of int
+            Indexes in `tcks_priority` of rejected tickers.
+        market_cube : `MarketCube`
+            Market data.
+        day_idx : int
+            Day index in `market_cube`.
+        """
+        if not indexes:
+            return
+
+        day = market_cube.days[day_idx].date()
+
+        if self.stdout_prints:
+            self._update_progress_bar(market_cube.days[day_idx])
+
+        for index in indexes:
+            tcks_priority[index].last_business_data = {}
+
+            # Operation freezetime only counts days in the ticker dates
+            if tcks_priority[index].initial_date <= day <= tcks_priority[index].final_date:
+                self._check_operation_freezetime(tcks_priority, index)
+
+    def _get_eligible_tickers(self, market_cube, day_idx):
+        """
+        Get purchase eligibility and data validity of each ticker on a day.
+
+        Masks are built once per market cube.
+
+        Args
+        ----------
+        market_cube : `MarketCube`
+            Market data.
+        day_idx : int
+            Day index in `market_cube`.
+
+        Returns
+        ----------
+        `np.ndarray` of bool
+            Eligibility of each ticker, in `market_cube.tickers` order.
+        `np.ndarray` of bool
+            False if `_parse_data` fails for the ticker, same order.
+        """
+        if self._eligibility is None or self._eligibility[0] is not market_cube:
+            self._eligibility = (market_cube, self._get_eligibility_mask(market_cube),
+                AdaptedAndreMoraesStrategy._get_eligibility_mask(self, market_cube))
+
+        return self._eligibility[1][day_idx], self._eligibility[2][day_idx]
+
+    def _get_eligibility_mask(self, market_cube):
+        """
+        Get (day, ticker) cells where a ticker without ongoing operation may purchase.
+
+        Built from whole market cube arrays. A cell must only be False if the
+        purchase is rejected for sure by `_parse_data` or business rules, so
+        skipping these tickers does not change results. This base mask is
+        False exactly where `_parse_data` fails.
+
+        Tickers rejected with valid data have an empty `last_business_data` on
+        the next day, so narrower masks are only for business rules that do not
+        read it.
+
+        Args
+        ----------
+        market_cube : `MarketCube`
+            Market data.
+
+        Returns
+        ----------
+        `np.ndarray` of bool
+            (days, tickers) mask, tickers in `market_cube.tickers` order.
+        """
+        mask = ~market_cube.weekly_empty[:, None] & market_cube.daily_mask() \
+            & market_cube.weekly_mask()
+
+        # No target buy price or stop loss (NaN is not rejected by `_parse_data`)
+        if 'target_buy_price' in market_cube.daily_fields:
+            mask &= ~(market_cube.get_daily_column('target_buy_price') <= 0.0)
+            mask &= ~(market_cube.get_daily_column('stop_loss') <= 0.0)
+
+        return mask
+
+    def _execute_ticker_day(self, tcks_priority, index, business_data):
+        """
+        Purchase or sell ticker according to strategy rules.
+
+        Args
+        ----------
+        tcks_priority : `list` of `TickerState`
+            Tickers in priority order.
+        index : int
+            Ticker index in `tcks_priority`.
+        business_data : `dict`
+            Parsed business data of the day.
+        """
+        ticker_name = tcks_priority[index].ticker
+
+        if (tcks_priority[index].ongoing_operation_flag is False):
+
+            purchase_price = self._get_purchase_price(business_data)
+
+            # Strategy business rules
+            if self._check_business_rules(business_data, tcks_priority,
+                index, purchase_price):
+
+                stop_price = self._get_stop_price(ticker_name, purchase_price,
+                    business_data)
+
+                capital_multiplier = self._get_capital_multiplier(tcks_priority,
+                    index, business_data)
+
+                purchase_amount = self._set_operation_purchase(ticker_name,
+                    purchase_price, stop_price, self.available_capital,
+                    self.risk_capital_product, tcks_priority, index,
+                    business_data, capital_multiplier)
+                self.available_capital = round(self.available_capital - purchase_amount, 2)
+
+                if purchase_amount >= 0.01 and self.stop_type == "staircase":
+                    self._set_staircase_stop(tcks_priority, index)
+        else:
+            if tcks_priority[index].operation.state == State.OPEN:
+
+                # If hits the stop loss, the operation is automatically closed
+                sale_amount = self._sell_on_stop_hit(tcks_priority,
+                    index, business_data)
+                self.available_capital = round(self.available_capital + sale_amount, 2)
+
+                if tcks_priority[index].operation.state == State.OPEN:
+
+                    if self.partial_sale is True:
+                        sale_amount = self._sell_on_partial_hit(tcks_priority,
+                            index, business_data)
+                        self.available_capital = round(self.available_capital + sale_amount, 2)
+
+                    sale_amount = self._sell_on_target_hit(tcks_priority,
+                        index, business_data)
+                    self.available_capital = round(self.available_capital + sale_amount, 2)
+
+                    sale_amount = self._sell_on_timeout_hit(tcks_priority,
+                        index, business_data)
+                    self.available_capital = round(self.available_capital + sale_amount, 2)
+
+            # Update stop loss threshold
+            if tcks_priority[index].operation.state == State.OPEN \
+                and self.stop_type == "staircase":
+                self._update_staircase_stop(tcks_priority, index, business_data)
+
+            if tcks_priority[index].operation.state == State.CLOSE:
+                self._save_and_reset_closed_operation(tcks_priority, index)
+
+        tcks_priority[index].last_business_data = business_data.copy()
+
+    def _load_models(self, day, wfo=True):
+        pass
+
+    def _check_operation_freezetime(self, tcks_priority, tck_idx):
+        tcks_priority[tck_idx].days_after_suc_oper += 1
+        tcks_priority[tck_idx].days_after_fail_oper += 1
+
+        if tcks_priority[tck_idx].days_after_suc_oper > \
+                self.min_days_after_successful_operation \
+            and tcks_priority[tck_idx].days_after_fail_oper > \
+                self.min_days_after_failure_operation:
+                return True
+
+        return False
+
+    def _initialize_tcks_priority(self, tcks_priority):
+        for index in range(len(tcks_priority)):
+            tcks_priority[index].days_on_operation = 0
+
+    def _get_empty_ref_data(self):
+        return {}
+
+    def _process_auxiliary_data(self, ticker_name, tcks_priority,
+        tck_idx, business_data, ref_data):
+
+        if tcks_priority[tck_idx].ongoing_operation_flag and \
+            tcks_priority[tck_idx].operation.state == State.OPEN:
+
+            tcks_priority[tck_idx].days_on_operation += 1
+
+        return True
+
+    def _get_empty_business_data(self):
+        business_data = {"day": None, "open_price_day": None, "max_price_day": None,
+            "min_price_day": None, "close_price_day": None, "ema_17_day": None,
+            "ema_72_day": None, "target_buy_price_day": None, "stop_loss_day": None,
+            "up_down_trend_status_day": None, "peak_day": None, "ema_72_week": None}
+
+        return business_data
+
+    def _parse_data(self, ticker_name, initial_date, final_date, market_cube, day_idx,
+        business_data):
+
+        if market_cube.weekly_empty[day_idx]:
+            return False
+
+        day = market_cube.days[day_idx]
+        tck_idx = market_cube.ticker_index[ticker_name]
+
+        if market_cube.daily_count[day_idx, tck_idx] == 0:
+            logger.info(f"Could not get day (\'{day.strftime('%Y-%m-%d')}\') " \
+                f"for ticker \'{ticker_name}\'.")
+            return False
+
+        if market_cube.weekly_count[day_idx, tck_idx] == 0:
+            logger.info(f"Could not get last week for ticker \'{ticker_name}\' " \
+                f"(week before day \'{day.strftime('%Y-%m-%d')}\').")
+            return False
+
+        # Duplicated rows
+        if market_cube.daily_count[day_idx, tck_idx] > 1 or \
+            market_cube.weekly_count[day_idx, tck_idx] > 1:
+            logger.warning(f"Ticker \'{ticker_name}\' has missing " \
+                f"data for day \'{day.strftime('%Y-%m-%d')}\'.")
+            return False
+
+        daily_fields = market_cube.daily_fields
+        day_values = market_cube.daily[day_idx, tck_idx]
+
+        open_price_day = day_values[daily_fields['open_price']]
+        max_price_day = day_values[daily_fields['max_price']]
+        min_price_day = day_values[daily_fields['min_price']]
+        close_price_day = day_values[daily_fields['close_price']]
+        ema_17_day = day_values[daily_fields['ema_17']]
+        ema_72_day = day_values[daily_fields['ema_72']]
+        target_buy_price_day = day_values[daily_fields['target_buy_price']]
+        stop_loss_day = day_values[daily_fields['stop_loss']]
+        up_down_trend_status_day = day_values[daily_fields['up_down_trend_status']]
+        peak_day = day_values[daily_fields['peak']]
+
+        ema_72_week = market_cube.weekly[day_idx, tck_idx, market_cube.weekly_fields['ema_72']]
+
+        target_buy_price_day = self._parse_target_buy_price(ticker_name, day, target_buy_price_day)
+        stop_loss_day = self._parse_stop_loss(ticker_name, day, target_buy_price_day, stop_loss_day)
+
+        if target_buy_price_day == 0.0 or stop_loss_day == 0.0:
+            return False
+
+        business_data["day"] = day
+        business_data["open_price_day"] = open_price_day
+        business_data["max_price_day"] = max_price_day
+        business_data["min_price_day"] = min_price_day
+        business_data["close_price_day"] = close_price_day
+        business_data["ema_17_day"] = ema_17_day
+        business_data["ema_72_day"] = ema_72_day
+        business_data["target_buy_price_day"] = target_buy_price_day
+        business_data["stop_loss_day"] = stop_loss_day
+        business_data["up_down_trend_status_day"] = up_down_trend_status_day
+        business_data["peak_day"] = peak_day
+        business_data["ema_72_week"] = ema_72_week
+
+        return True
+
+    def _parse_target_buy_price(self, ticker_name, day, default_target_price):
+
+        if default_target_price <= 0.0:
+            logger.warning(f"Ticker satisfies all purchase conditions, " \
+                f"but no target price or stop loss is set. (\'{ticker_name}\'" \
+                f", \'{day.strftime('%Y-%m-%d')}\')")
+            return 0.0
+
+        target_buy_price_day = round(default_target_price * (1 + self.purchase_margin), 2)
+
+        return target_buy_price_day
+
+    def _parse_stop_loss(self, ticker_name, day, target_buy_price, default_stop_loss):
+
+        if default_stop_loss <= 0.0:
+            logger.warning(f"Ticker satisfies all purchase conditions, " \
+                f"but no target price or stop loss is set. (\'{ticker_name}\'" \
+                f", \'{day.strftime('%Y-%m-%d')}\')")
+            return 0.0
+
+        # stop_risk = self._tickers_rcc_df.loc[
+        #     self._tickers_rcc_df['ticker'] == ticker_name, ['rcc']].squeeze()
+        stop_risk = None
+
+        stop_loss_day = 0.0
+
+        if stop_risk is None or isinstance(stop_risk, pd.Series):
+            # print(f"Stop loss empty for ticker \'{ts.ticker}\'")
             stop_loss_day = round(default_stop_loss * (1 + self.stop_margin), 2)
             if (target_buy_price - stop_loss_day) / target_buy_price > self.max_risk:
                 stop_loss_day = round(target_buy_price * (1 - self.max_risk), 2)
@@ -1869,6 +2451,12 @@ class AdaptedAndreMoraesStrategy(PseudoStrategy):
 
 class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
 
+    _checkpoint_attributes = AdaptedAndreMoraesStrategy._checkpoint_attributes + (
+        '_current_model_tag', '_max_capital', '_days_before_start', 'total_op_count',
+        'total_op_suc_count', 'total_profit', 'capital_in_use', 'portfolio_stats',
+        'capital_in_use_mavg', 'last_capital_in_use_mavg', 'capital_in_use_dot',
+        'first_update', 'dynamic_rcc_value', 'last_error', 'last_data')
+
     def __init__(self, tickers, alias=None, comment=None, risk_capital_product=0.10,
         total_capital=100000, min_order_volume=1, partial_sale=False, ema_tolerance=0.01,
         min_risk=0.01, max_risk=0.15, purchase_margin=0.0, stop_margin=0.0,
@@ -1879,7 +2467,8 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
         enable_profit_compensation=False, enable_crisis_halt=False,
         enable_downtrend_halt=False, enable_dynamic_rcc=False,
         dynamic_rcc_reference=0.80, dynamic_rcc_k=3, operation_risk=0.5,
-        profit_comp_start_std=0.2, profit_comp_end_std=2.0, profit_comp_gain_loss=0.6):
+        profit_comp_start_std=0.2, profit_comp_end_std=2.0, profit_comp_gain_loss=0.6,
+        use_signal_table=False):
 
         super().__init__(tickers, alias, comment, risk_capital_product, total_capital,
             min_order_volume, partial_sale, ema_tolerance, min_risk, max_risk,
@@ -1895,25 +2484,37 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
         self._db_strategy_model.name = self._name
         self._models = {}
         self._current_model_tag = None
+        self._models_tag = None
         self._max_capital = total_capital
 
-        self.tickers_info_path = Path(__file__).parent.parent / c.TICKERS_INFO_PATH
+        # Read predictions from `precompute_signals()` output when available
+        self.use_signal_table = use_signal_table
+        self._signal_table = None
+        self._days_before_start = 120
+
+        # Set by `LockstepEngine`: indicators are updated by the engine and
+        # predictions are shared among variants
+        self._lockstep = False
+        self._shared_predictions = None
+
         self.ticker_datasets_path = Path(__file__).parent.parent / c.DATASETS_PATH
         self.risks = None
         self.len_risks_in_datasets = None
 
         self._load_risks_and_trends_file()
+        self.risk_table = RiskTable(self.ticker_day_risks)
 
         self.total_op_count = 0
         self.total_op_suc_count = 0
         self.total_profit = 0
 
         self.capital_in_use = 0.0
-        self.capital_in_use_last_values = []
         self.der_lpf_alpha = 0.1
         self.capital_in_use_mavg = 0.0
         self.last_capital_in_use_mavg = 0.0
         self.n_avg = 10
+        # Profits dispersion and capital in use moving average, updated in O(1)
+        self.portfolio_stats = PortfolioStatistics(list(self.tickers_and_dates), self.n_avg)
         self.capital_in_use_dot = 0.0
         self.first_update = True
 
@@ -1924,13 +2525,14 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
         self.last_prices_max_length = max(self.spearman_correlations)
         self.spearman_reference = tuple([i for i in range(self.last_prices_max_length)])
 
-        self.last_data = {ticker: \
-            {'open': 0.0, 'close': 0.0, 'mid': [], 'mid_dot': 0.0,
-            'ols_slope': 0.0, 'min_slope': float('inf'), 'max_slope': -float('inf'),
-            'ols_rmse': 0.0, 'min_rmse': float('inf'), 'max_rmse': -float('inf')} \
+        self.last_data = {ticker: self._get_empty_last_data() \
             for ticker in self.tickers_and_dates}
         self.mid_prices_lpf_alpha = 0.1
 
+        # Streaming mode risks and trends, one `TickerRiskState` per ticker
+        self._risk_states = None
+        self._risk_warm_up_days = 150
+
 
     @property
     def models(self):
@@ -1952,456 +2554,466 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
     def max_capital(self, max_capital):
         self._max_capital = max_capital
 
+    def _start_operations(self, market_cube, days_before_start):
+        # Needed to find the signal table of the same data range
+        self._days_before_start = days_before_start
+
+        return super()._start_operations(market_cube, days_before_start)
+
+    def _start_streaming_indicators(self, last_day):
+        """
+        Warm up risks and trends of each ticker up to the last processed day.
+
+        Only the last `_risk_warm_up_days` are read: enough to fill every
+        window and for filters initial state to vanish.
+        """
+        self._risk_states = {ticker: TickerRiskState() for ticker in self.tickers_and_dates}
+
+        if last_day is None:
+            return
+
+        data_gen = self.DataGen(self.tickers_and_dates, self._db_strategy_model,
+            days_batch=30, week=False, volume=True,
+            start_date=last_day - BDay(self._risk_warm_up_days))
+
+        while True:
+            try:
+                day_info = next(data_gen)
+            except StopIteration:
+                break
+
+            if day_info.empty:
+                continue
+
+            if day_info['day'].iloc[0] > last_day:
+                break
+
+            self._push_risk_states(day_info.drop_duplicates(subset='ticker', keep=False))
+
+    def _update_streaming_indicators(self, market_cube):
+        """Add risks and trends of the streamed day, calculated from previous days."""
+        if 'volume' not in market_cube.daily_fields:
+            logger.error(f"Streamed daily data must have \'volume\' column.")
+            raise Exception
+
+        day = market_cube.days[0]
+        fields = market_cube.daily_fields
+
+        for ticker, tck_idx in market_cube.ticker_index.items():
+            if market_cube.daily_count[0, tck_idx] != 1:
+                continue
+
+            values = market_cube.daily[0, tck_idx]
+            row = self._risk_states[ticker].push(values[fields['open_price']],
+                values[fields['close_price']], values[fields['max_price']],
+                values[fields['min_price']], values[fields['volume']])
+
+            # Risks and trends file values are kept
+            if self.risk_table.get(ticker, day) is None:
+                self.risk_table.add(ticker, day, row)
+
+    def _push_risk_states(self, day_info):
+
+        for ticker, open_price, close_price, max_price, min_price, volume in zip(
+            day_info['ticker'], day_info['open_price'], day_info['close_price'],
+            day_info['max_price'], day_info['min_price'], day_info['volume']):
+
+            if ticker in self._risk_states:
+                self._risk_states[ticker].push(open_price, close_price, max_price,
+                    min_price, volume)
+
+    def _resume_operations(self, market_cube, checkpoint_data):
+
+        tcks_priority, ref_data = super()._resume_operations(market_cube, checkpoint_data)
+
+        # Tickers states hold the profits, same ones if the checkpoint has statistics
+        self.portfolio_stats.set_profits({ticker_state.ticker: ticker_state.profit \
+            for ticker_state in tcks_priority})
+
+        return tcks_priority, ref_data
+
+    def _set_checkpoint_state(self, state):
+
+        # Checkpoints saved before `portfolio_stats` keep the capital in use window as a list
+        if 'capital_in_use_last_values' in state:
+            state = dict(state)
+            for capital_in_use in state.pop('capital_in_use_last_values'):
+                self.portfolio_stats.add_capital_in_use(capital_in_use)
+
+        super()._set_checkpoint_state(state)
+
+        # Signal table or models of the checkpoint model tag
+        if self._current_model_tag is not None:
+            self._set_model_tag(self._current_model_tag)
+
+    @RunTime('precompute_signals')
+    def precompute_signals(self, operation_risks=None, days_before_start=120):
+        """
+        Precompute model features and predictions of every ticker and day.
+
+        Replays the market data once, updating the same indicators as
+        `process_operations()`, and predicts each (ticker, day, operation risk)
+        in one batch per ticker and model tag. Results are saved as one
+        `SignalTable` per model tag, read by strategies created with
+        `use_signal_table=True` and the same tickers, dates, margins and risk
+        limits. Model tags already saved with all `operation_risks` are skipped.
+
+        Crisis and downtrend halts are not applied here, they are checked
+        during the backtest.
+
+        Args
+        ----------
+        operation_risks : `list` of float, optional
+            Operation risk parameters. If None, only `operation_risk`.
+        days_before_start : int, default 120
+            Same as in `process_operations()`.
+        """
+        if operation_risks is None:
+            operation_risks = [self.operation_risk]
+
+        data_gen = self.DataGen(self.tickers_and_dates, self._db_strategy_model,
+            days_batch=30, days_before_start=days_before_start)
+        market_cube = MarketCube(self.tickers_and_dates, data_gen)
+
+        day_tags = []
+        model_tag = None
+        for day in market_cube.days:
+            model_tag = MLDerivationStrategy._get_model_tag(model_tag, day)
+            day_tags.append(model_tag)
+
+        pending_tags = []
+        for model_tag in dict.fromkeys(day_tags):
+            if model_tag is None:
+                continue
+
+            signal_table = SignalTable.load(self._get_signal_table_path(model_tag,
+                days_before_start))
+            if signal_table is None or \
+                not set(operation_risks).issubset(signal_table.operation_risks.tolist()):
+                pending_tags.append(model_tag)
+
+        if not pending_tags:
+            logger.info("Signal tables already available, nothing to precompute.")
+            return
+
+        last_data = {ticker: self._get_empty_last_data() for ticker in self.tickers_and_dates}
+
+        # Model tag: {ticker: (days, operation risks, risks, features)}
+        signals = {model_tag: {} for model_tag in pending_tags}
+
+        for day_idx, day in enumerate(market_cube.days):
+            for ticker, dates in self.tickers_and_dates.items():
+                business_data = self._get_empty_business_data()
+
+                if not self._parse_data(ticker, dates['start_date'], dates['end_date'],
+                    market_cube, day_idx, business_data):
+                    continue
+
+                self._update_mid_prices(last_data[ticker], business_data)
+
+                if day_tags[day_idx] not in signals or day.date() < dates['start_date'] \
+                    or day.date() > dates['end_date']:
+                    continue
+
+                for operation_risk in operation_risks:
+                    risk = self._get_risk(ticker, day, operation_risk=operation_risk)
+                    if risk is None:
+                        continue
+
+                    if ticker not in signals[day_tags[day_idx]]:
+                        signals[day_tags[day_idx]][ticker] = ([], [], [], [])
+
+                    ticker_signals = signals[day_tags[day_idx]][ticker]
+                    ticker_signals[0].append(day)
+                    ticker_signals[1].append(operation_risk)
+                    ticker_signals[2].append(risk)
+                    ticker_signals[3].append(self._get_ticker_features(last_data[ticker], risk))
+
+        for model_tag in pending_tags:
+            self._load_tag_models(model_tag)
+
+            tickers, days, table_operation_risks, risks, features, predictions = \
+                [], [], [], [], [], []
+
+            for ticker, (tck_days, tck_operation_risks, tck_risks, tck_features) \
+                in signals[model_tag].items():
+
+                tickers.extend([ticker] * len(tck_days))
+                days.extend(tck_days)
+                table_operation_risks.extend(tck_operation_risks)
+                risks.extend(tck_risks)
+                features.extend(tck_features)
+                predictions.extend(self._models[ticker].predict(tck_features))
+
+            signal_table = SignalTable(tickers, pd.to_datetime(days).to_numpy(),
+                table_operation_risks, risks, features, predictions)
+            signal_table_path = self._get_signal_table_path(model_tag, days_before_start)
+            signal_table.save(signal_table_path)
+
+            # Remove superseded versions of the same context
+            prefix = signal_table_path.name[:-len(c.SIGNALS_SUFFIX)].rsplit('_', 1)[0]
+            for path in signal_table_path.parent.glob(glob.escape(prefix) + '_*' + \
+                c.SIGNALS_SUFFIX):
+                if path != signal_table_path:
+                    path.unlink(missing_ok=True)
+
+        logger.info(f"Signals precomputed for model tags {pending_tags}.")
+
+    def _get_signal_table_path(self, model_tag, days_before_start):
+        """
+        Get signal table file path.
+
+        File name has the model tag, a hash of the context (tickers and dates,
+        data range, margins and risk limits) and a hash of the version (candles
+        last update and model files), so a new version replaces the table of the
+        same context.
+
+        Args
+        ----------
+        model_tag : str
+            Model tag.
+        days_before_start : int
+            Same as in `process_operations()`.
+
+        Returns
+        ----------
+        `Path`
+            Signal table file path.
+        """
+        models_path = Path(__file__).parent.parent / c.MODELS_PATH
+
+        models_mtime = []
+        for ticker in self.tickers_and_dates:
+            model_file = models_path / (ticker + '_' + model_tag + c.MODEL_SUFFIX)
+            models_mtime.append(model_file.stat().st_mtime_ns if model_file.exists() else None)
+
+        # Candles version, back-adjusted candles change after splits and dividends
+        last_updates = self._db_strategy_model.get_last_updates(list(self.tickers_and_dates))
+
+        context = (sorted((ticker, str(dates['start_date']), str(dates['end_date'])) \
+            for ticker, dates in self.tickers_and_dates.items()), days_before_start,
+            self.purchase_margin, self.stop_margin, self.min_risk, self.max_risk,
+            self.mid_prices_lpf_alpha, self.spearman_correlations)
+        version = ([str(last_updates.get(ticker)) for ticker in self.tickers_and_dates],
+            models_mtime)
+
+        context_hash = hashlib.md5(repr(context).encode()).hexdigest()[:16]
+        version_hash = hashlib.md5(repr(version).encode()).hexdigest()[:8]
+
+        return Path(__file__).parent.parent / c.SIGNALS_PATH / \
+            (model_tag + '_' + context_hash + '_' + version_hash + c.SIGNALS_SUFFIX)
+
+    def _get_empty_last_data(self):
+        return {'open': 0.0, 'close': 0.0, 'mid': [], 'mid_dot': 0.0,
+            'spearman': RollingSpearman(self.spearman_correlations),
+            'ols_slope': 0.0, 'min_slope': float('inf'), 'max_slope': -float('inf'),
+            'ols_rmse': 0.0, 'min_rmse': float('inf'), 'max_rmse': -float('inf')}
+
 
     def _load_risks_and_trends_file(self):
+        """
+        Load risks and trends of all tickers, calculating only outdated tickers.
+
+        Each ticker history is cached in its own `.npz` file, named after a hash
+        of its inputs: tickers date range, trend and risk parameters and candles
+        last update of the ticker and of the last ticker (the last ticker sets
+        the first rows without indicators).
+        """
+        columns = ['uptrend', 'downtrend', 'crisis', 'min_risk', 'max_risk', 'avg_climbs']
+
+        days_before_start = int(max(TickerRiskState.N_pri, TickerRiskState.N_vol,
+            TickerRiskState.N_dot) * 1.5)
+        paths = self._get_risks_and_trends_paths(days_before_start)
+
+        outdated_tickers = [ticker for ticker, path in paths.items() if not path.exists()]
+        if outdated_tickers:
+            logger.info(f"Calculating risks and trends of {len(outdated_tickers)} of "
+                f"{len(paths)} ticker(s).")
+            self._save_risks_and_trends(outdated_tickers, paths, days_before_start)
+
+        histories = {ticker: TickerRiskState.load_history(path, columns) \
+            for ticker, path in paths.items()}
+
+        # Rows from the first day with candles since tickers first start date
+        start_date = np.datetime64(min([dates['start_date'] for _, dates in \
+            self.tickers_and_dates.items()]), 'D')
+        start_date = min([history['day'][history['day'] >= start_date][0] \
+            for history in histories.values() if (history['day'] >= start_date).any()],
+            default=start_date)
+
+        ticker_day_risks = []
+        for ticker, history in histories.items():
+            start_idx = np.searchsorted(history['day'], start_date)
 
-        columns = ['ticker', 'day', 'uptrend', 'downtrend', 'crisis', 'min_risk',
-            'max_risk', 'avg_climbs']
+            ticker_day_risks.append(pd.DataFrame({'ticker': ticker,
+                'day': history['day'][start_idx:].astype('datetime64[ns]'),
+                **{column: history[column][start_idx:] for column in columns}}))
 
-        if self.tickers_info_path.exists():
-            self.ticker_day_risks = pd.read_csv(self.tickers_info_path, sep=',',
-                usecols=columns)
+        self.ticker_day_risks = pd.concat(ticker_day_risks, ignore_index=True)
+
+    def _get_risks_and_trends_paths(self, days_before_start):
+
+        min_start_date = min([dates['start_date'] for _, dates in self.tickers_and_dates.items()])
+        max_end_date = max([dates['end_date'] for _, dates in self.tickers_and_dates.items()])
+        last_ticker = list(self.tickers_and_dates)[-1]
+
+        # Candles version
+        last_updates = self._db_strategy_model.get_last_updates(list(self.tickers_and_dates))
+
+        # File name: ticker, then hashes of the context and of the candles version,
+        # so a new version replaces the files of the same context
+        paths = {}
+        for ticker in self.tickers_and_dates:
+            context = (ticker, str(min_start_date), str(max_end_date), days_before_start,
+                last_ticker, sorted(TickerRiskState.get_parameters().items()))
+            version = (str(last_updates.get(ticker)), str(last_updates.get(last_ticker)))
+
+            context_hash = hashlib.md5(repr(context).encode()).hexdigest()[:12]
+            version_hash = hashlib.md5(repr(version).encode()).hexdigest()[:8]
+
+            paths[ticker] = Path(__file__).parent.parent / c.TICKERS_INFO_PATH / \
+                (ticker + '_' + context_hash + '_' + version_hash + c.TICKERS_INFO_SUFFIX)
+
+        return paths
+
+    def _save_risks_and_trends(self, tickers, paths, days_before_start):
+
+        min_start_date = min([dates['start_date'] for _, dates in self.tickers_and_dates.items()])
+        max_end_date = max([dates['end_date'] for _, dates in self.tickers_and_dates.items()])
+        last_ticker = list(self.tickers_and_dates)[-1]
+
+        # Same dates for any tickers subset, last ticker needed for first rows
+        data_tickers = list(dict.fromkeys(tickers + [last_ticker]))
+        data_gen = self.DataGen({ticker: {'start_date': min_start_date, 'end_date': max_end_date} \
+            for ticker in data_tickers}, self._db_strategy_model, days_batch=30,
+            days_before_start=days_before_start, week=False, volume=True)
+
+        candles_columns = ['open_price', 'close_price', 'max_price', 'min_price', 'volume']
+        candles = {ticker: {column: [] for column in candles_columns} for ticker in data_tickers}
+        days = {ticker: [] for ticker in data_tickers}
+
+        # First rows have no indicators, until a day with candle of the last ticker
+        init_rows = None
+        while True:
+            try:
+                day_info = next(data_gen)
+
+                if day_info.empty:
+                    continue
+
+                # Tickers with more than one candle in the day are skipped
+                day_info = day_info[day_info['ticker'].isin(data_tickers)] \
+                    .drop_duplicates(subset='ticker', keep=False)
+
+                for ticker, day, *values in zip(day_info['ticker'], day_info['day'],
+                    *(day_info[column] for column in candles_columns)):
+                    days[ticker].append(day)
+                    for column, value in zip(candles_columns, values):
+                        candles[ticker][column].append(value)
+
+                if init_rows is None and (day_info['ticker'] == last_ticker).any():
+                    init_rows = {ticker: len(days[ticker]) for ticker in data_tickers}
+            except StopIteration:
+                break
+
+        if init_rows is None:
+            init_rows = {ticker: len(days[ticker]) for ticker in data_tickers}
+
+        # Tickers are independent
+        histories_args = [[candles[ticker][column] for column in candles_columns] \
+            + [init_rows[ticker]] for ticker in tickers]
+
+        if len(histories_args) > 1 and not current_process().daemon:
+            with Pool(min(len(histories_args), psutil.cpu_count(logical=False) or 1)) as pool:
+                histories = pool.starmap(TickerRiskState.get_history, histories_args)
         else:
-            # Trend parameters
-            N_pri = 20
-            N_vol = 60
-            N_dot = 2
-            lpf_alpha = 0.1
-            spearman_up_threshold = 0.5
-            downtrend_inertia = 3
-            anomalies_inertia = 2
-            crisis_halt_inertia = 8
-            # Risk parameters
-            N_delta = 20
-            N_peak_window = 80
-            peaks_window_size = 5
-            min_peaks_for_analysis = 5
-            climbs_lpf_alpha = 0.5
-            gain_loss_ratio = 3
-            risk_lpf_alpha = 0.3
-            down_inertia_alpha = 0.10
-
-            days_before_start = int(max(N_pri, N_vol, N_dot) * 1.5)
-            data_gen = self.DataGen(self.tickers_and_dates, self._db_strategy_model,
-                days_batch=30, days_before_start=days_before_start, week=False, volume=True)
-
-            # General support variables
-            last_mid_prices = {ticker: [] for ticker in self.tickers_and_dates}
-            last_volumes = {ticker: [] for ticker in self.tickers_and_dates}
-            last_max_prices = {ticker: [] for ticker in self.tickers_and_dates}
-            last_min_prices = {ticker: [] for ticker in self.tickers_and_dates}
-            last_open_prices = {ticker: [] for ticker in self.tickers_and_dates}
-            last_close_prices = {ticker: [] for ticker in self.tickers_and_dates}
-            last_deltas = {ticker: [] for ticker in self.tickers_and_dates}
-            last_max_peaks = {ticker: [] for ticker in self.tickers_and_dates}
-            last_min_peaks = {ticker: [] for ticker in self.tickers_and_dates}
-            days = {ticker: [] for ticker in self.tickers_and_dates}
-            ref_spear = [i for i in range(max(N_pri, N_vol))]
-
-            # Variables of Trend identification
-            cum_spearman = {ticker: [] for ticker in self.tickers_and_dates}
-            cum_spearman = {ticker: [] for ticker in self.tickers_and_dates}
-            avg_price = {ticker: [] for ticker in self.tickers_and_dates}
-            std_price = {ticker: [] for ticker in self.tickers_and_dates}
-            avg_volume = {ticker: [] for ticker in self.tickers_and_dates}
-            std_volume = {ticker: [] for ticker in self.tickers_and_dates}
-            mid_prices_dot = {ticker: [] for ticker in self.tickers_and_dates}
-            volume_anomalies = {ticker: [] for ticker in self.tickers_and_dates}
-            price_down_anomalies = {ticker: [] for ticker in self.tickers_and_dates}
-
-            # Trend auxiliary variables
-            downtrend_inertia_counter = {ticker: downtrend_inertia for ticker in self.tickers_and_dates}
-            crisis_inertia_counter = {ticker: crisis_halt_inertia for ticker in self.tickers_and_dates}
-            anomalies_counter = {ticker: 0 for ticker in self.tickers_and_dates}
-            in_uptrend_flag = {ticker: False for ticker in self.tickers_and_dates}
-
-            # Risk auxiliary variables
-            mid_prices_dot_for_risk = {ticker: [] for ticker in self.tickers_and_dates}
-            std_price_deltas = {ticker: [] for ticker in self.tickers_and_dates}
-            avg_climbs = {ticker: [] for ticker in self.tickers_and_dates}
-            std_climbs = {ticker: [] for ticker in self.tickers_and_dates}
-            fixed_min_risk = {ticker: [] for ticker in self.tickers_and_dates}
-            variable_min_risk = {ticker: [] for ticker in self.tickers_and_dates}
-
-            # Trend Output Variables
-            uptrend = {ticker: [] for ticker in self.tickers_and_dates}
-            downtrend = {ticker: [] for ticker in self.tickers_and_dates}
-            crisis = {ticker: [] for ticker in self.tickers_and_dates}
-
-            # Risk Output Variables
-            max_risk = {ticker: [] for ticker in self.tickers_and_dates}
-            min_risk = {ticker: [] for ticker in self.tickers_and_dates}
-
-
-            first_iteration = True
-            start_date = pd.Timestamp( min([dates['start_date'] for _, dates in self.tickers_and_dates.items()]) )
-            start_date_flag = False
-            while True:
-                try:
-                    day_info = next(data_gen)
-
-                    if day_info.empty:
-                        continue
+            histories = [TickerRiskState.get_history(*args) for args in histories_args]
+
+        for ticker, history in zip(tickers, histories):
+            for column in ('fixed_min_risk', 'variable_min_risk', 'min_risk'):
+                history[column] = [round(risk, 4) for risk in history[column]]
+
+            TickerRiskState.save_history(paths[ticker], days[ticker], history)
 
-                    if start_date_flag is False and day_info['day'].head(1).squeeze() >= start_date:
-                        start_date = day_info['day'].head(1).squeeze()
-                        start_date_flag = True
-
-                    for tck_idx, ticker in enumerate(self.tickers_and_dates):
-
-                        if day_info[day_info['ticker'] == ticker].empty:
-                            continue
-
-                        open = day_info[(day_info['ticker'] == ticker)]['open_price'].squeeze()
-                        close = day_info[(day_info['ticker'] == ticker)]['close_price'].squeeze()
-                        high = day_info[(day_info['ticker'] == ticker)]['max_price'].squeeze()
-                        low = day_info[(day_info['ticker'] == ticker)]['min_price'].squeeze()
-                        volume = day_info[(day_info['ticker'] == ticker)]['volume'].squeeze()
-                        day = day_info[(day_info['ticker'] == ticker)]['day'].squeeze()
-
-                        if isinstance(open, pd.Series) or \
-                            isinstance(close, pd.Series) or \
-                            isinstance(high, pd.Series) or \
-                            isinstance(low, pd.Series) or \
-                            isinstance(volume, pd.Series) or \
-                            isinstance(day, pd.Series):
-                            continue
-
-                        if first_iteration is True:
-                            days[ticker].append( day )
-
-                            # Support variables
-                            last_mid_prices[ticker].append( (open+close)/2 )
-                            last_max_prices[ticker].append( high )
-                            last_min_prices[ticker].append( low )
-                            last_open_prices[ticker].append( open )
-                            last_close_prices[ticker].append( close )
-                            last_deltas[ticker].append( high-low )
-                            last_volumes[ticker].append( volume )
-
-                            # Variables of trend identification
-                            cum_spearman[ticker].append( 0.0 )
-                            avg_price[ticker].append( 0.0 )
-                            std_price[ticker].append( 0.0 )
-                            avg_volume[ticker].append( 0.0 )
-                            std_volume[ticker].append( 0.0 )
-                            mid_prices_dot[ticker].append( 0.0 )
-                            volume_anomalies[ticker].append( False )
-                            price_down_anomalies[ticker].append( False )
-
-                            # Variables of Risk identification
-                            mid_prices_dot_for_risk[ticker].append( 0.0 )
-                            std_price_deltas[ticker].append( 0.0 )
-                            avg_climbs[ticker].append( 0.0 )
-                            std_climbs[ticker].append( 0.0 )
-                            variable_min_risk[ticker].append( 0.0 )
-                            fixed_min_risk[ticker].append( 0.0 )
-                            max_risk[ticker].append( 0.0 )
-                            min_risk[ticker].append( 0.0 )
-
-                            # Trend Output Variables
-                            uptrend[ticker].append( False )
-                            downtrend[ticker].append( True )
-                            crisis[ticker].append( False )
-
-                            if tck_idx == len(self.tickers_and_dates) - 1:
-                                first_iteration = False
-
-                        else:
-
-                            # Variables of trend identification Section
-                            if len(last_mid_prices[ticker]) >= N_pri:
-                                cum_spearman[ticker].append( stats.spearmanr(
-                                    ref_spear[0:N_pri],
-                                    last_mid_prices[ticker][len(last_mid_prices[ticker]) - N_pri : len(last_mid_prices[ticker])]).correlation )
-                                avg_price[ticker].append( np.mean(
-                                    last_mid_prices[ticker][len(last_mid_prices[ticker]) - N_pri : len(last_mid_prices[ticker])]) )
-                                std_price[ticker].append( np.std(
-                                    last_mid_prices[ticker][len(last_mid_prices[ticker]) - N_pri : len(last_mid_prices[ticker])]) )
-                            else:
-                                cum_spearman[ticker].append( 0.0 )
-                                avg_price[ticker].append( 0.0 )
-                                std_price[ticker].append( 0.0 )
-
-                            if len(last_volumes[ticker]) >= N_vol:
-                                avg_volume[ticker].append( np.mean(
-                                    last_volumes[ticker][len(last_volumes[ticker]) - N_vol : len(last_volumes[ticker])]) )
-                                std_volume[ticker].append( np.std(
-                                    last_volumes[ticker][len(last_volumes[ticker]) - N_vol : len(last_volumes[ticker])]) )
-                            else:
-                                avg_volume[ticker].append( 0.0 )
-                                std_volume[ticker].append( 0.0 )
-
-                            if len(last_mid_prices[ticker]) >= N_dot:
-                                # LPF for prices derivative ( y[i] := α * x[i] + (1-α) * y[i-1] )
-                                y0 = lpf_alpha * ( (last_mid_prices[ticker][-1] - last_mid_prices[ticker][-2])\
-                                    / ((last_mid_prices[ticker][-2] + last_mid_prices[ticker][-1])/2) ) \
-                                    + (1-lpf_alpha) * mid_prices_dot[ticker][-1]
-
-                                y1 = risk_lpf_alpha * ( (last_mid_prices[ticker][-1] - last_mid_prices[ticker][-2])\
-                                    / ((last_mid_prices[ticker][-2] + last_mid_prices[ticker][-1])/2) ) \
-                                    + (1-risk_lpf_alpha) * mid_prices_dot_for_risk[ticker][-1]
-
-                                mid_prices_dot[ticker].append( y0 )
-                                mid_prices_dot_for_risk[ticker].append( y1 )
-                            else:
-                                mid_prices_dot[ticker].append( 0.0 )
-                                mid_prices_dot_for_risk[ticker].append( 0.0 )
-
-                            # Volume and Price Down Anomalies Section
-                            if last_volumes[ticker][-1] > avg_volume[ticker][-1] + std_volume[ticker][-1]:
-                                volume_anomalies[ticker].append( True )
-                            else:
-                                volume_anomalies[ticker].append( False )
-
-                            if last_mid_prices[ticker][-1] < avg_price[ticker][-1] + std_price[ticker][-1]:
-                                price_down_anomalies[ticker].append( True )
-                            else:
-                                price_down_anomalies[ticker].append( False )
-
-                            # Standard Deviation of Price Deltas
-                            if len(last_deltas[ticker]) < N_delta:
-                                std_price_deltas[ticker].append( 0.0 )
-                            else:
-                                std_price_deltas[ticker].append( np.std( last_deltas[ticker][len(last_deltas[ticker]) - N_delta : len(last_deltas[ticker])] ) )
-
-                            # Peaks for Climbs Identification
-                            peaks = find_candles_peaks(
-                                last_max_prices[ticker][max(0, len(last_max_prices[ticker])-N_peak_window) : len(last_max_prices[ticker])],
-                                last_min_prices[ticker][max(0, len(last_min_prices[ticker])-N_peak_window) : len(last_min_prices[ticker])],
-                                window_size=peaks_window_size)
-
-                            if peaks is not None and len(peaks) >= min_peaks_for_analysis \
-                                and len(avg_climbs[ticker]) >= N_peak_window*0.75:
-                                climbs = []
-                                for idx in range(len(peaks)):
-                                    if idx > 0:
-                                        if peaks[idx]['type'] == 'max' and peaks[idx-1]['type'] == 'min':
-                                            if peaks[idx]['magnitude'] > peaks[idx-1]['magnitude']:
-                                                climbs.append( round((peaks[idx]['magnitude'] - peaks[idx-1]['magnitude']) \
-                                                    / peaks[idx-1]['magnitude'], 4) )
-
-                                y_mean = climbs_lpf_alpha * np.mean(np.array(climbs)) \
-                                    + (1-climbs_lpf_alpha) * avg_climbs[ticker][-1]
-                                y_std = climbs_lpf_alpha * np.std(np.array(climbs)) + \
-                                    (1-climbs_lpf_alpha) * std_climbs[ticker][-1]
-
-                                avg_climbs[ticker].append( y_mean )
-                                std_climbs[ticker].append( y_std )
-                            else:
-                                avg_climbs[ticker].append( 0.0 )
-                                std_climbs[ticker].append( 0.0 )
-
-
-                            # Trend Analysis Section
-                            # Trend Analysis: Downtrend Analysis
-                            if len(mid_prices_dot[ticker]) <= N_dot:
-                                downtrend[ticker].append( False )
-                            else:
-                                if mid_prices_dot[ticker][-1] < 0:
-                                    downtrend[ticker].append( True )
-                                    downtrend_inertia_counter[ticker] = 0
-                                else:
-                                    if downtrend_inertia_counter[ticker] < downtrend_inertia:
-                                        downtrend[ticker].append( True )
-                                        downtrend_inertia_counter[ticker] += 1
-                                    else:
-                                        downtrend[ticker].append( False )
-
-                            # Trend Analysis: Crisis Analysis
-                            if len(volume_anomalies[ticker]) < N_vol:
-                                crisis[ticker].append( False )
-                            else:
-                                if volume_anomalies[ticker][-1] is True and price_down_anomalies[ticker][-1] is True:
-                                    anomalies_counter[ticker] += 1
-                                    if anomalies_counter[ticker] >= anomalies_inertia:
-                                        crisis[ticker].append( True )
-                                        crisis_inertia_counter[ticker] = 0
-                                    else:
-                                        if crisis_inertia_counter[ticker] < crisis_halt_inertia:
-                                            crisis[ticker].append( True )
-                                            crisis_inertia_counter[ticker] += 1
-                                        else:
-                                            crisis[ticker].append( False )
-                                else:
-                                    if crisis_inertia_counter[ticker] < crisis_halt_inertia:
-                                        crisis[ticker].append( True )
-                                        crisis_inertia_counter[ticker] += 1
-                                    else:
-                                        crisis[ticker].append( False )
-
-                                    if anomalies_counter[ticker] != 0:
-                                        anomalies_counter[ticker] = 0
-
-                            # Trend Analysis: Uptrend Analysis
-                            if len(cum_spearman[ticker]) < N_pri:
-                                uptrend[ticker].append( False )
-                            else:
-                                if in_uptrend_flag[ticker] is False:
-                                    if mid_prices_dot[ticker][-1] > 0 and cum_spearman[ticker][-1] >= spearman_up_threshold:
-                                        uptrend[ticker].append( True )
-                                        in_uptrend_flag[ticker] = True
-                                    else:
-                                        uptrend[ticker].append( False )
-                                else:
-                                    if mid_prices_dot[ticker][-1] > 0 and cum_spearman[ticker][-1] >= spearman_up_threshold:
-                                        uptrend[ticker].append( True )
-                                    else:
-                                        uptrend[ticker].append( False )
-                                        in_uptrend_flag[ticker] = False
-
-                            # Risk Analysis
-                            if len(last_mid_prices[ticker]) < N_delta:
-                                fixed_min_risk[ticker].append( 0.0 )
-                            else:
-                                # Two times half standard deviation = standard deviation
-                                fixed_min_risk[ticker].append(
-                                    std_price_deltas[ticker][-1] / last_mid_prices[ticker][-1] )
-
-                            if len(mid_prices_dot_for_risk[ticker]) <= N_dot:
-                                variable_min_risk[ticker].append( 0.0 )
-                            else:
-                                variable_min_risk[ticker].append(
-                                    max( -mid_prices_dot_for_risk[ticker][-1], 0) )
-
-                            if len(fixed_min_risk[ticker]) < max(N_delta, N_dot):
-                                min_risk[ticker].append( 0.0 )
-                            else:
-                                # down_inertia_alpha
-                                new_min_risk = fixed_min_risk[ticker][-1] + variable_min_risk[ticker][-1]
-
-                                if new_min_risk >= min_risk[ticker][-1]:
-                                    min_risk[ticker].append( new_min_risk )
-                                else:
-                                    # LPF for downward inertia only ( y[i] := α * x[i] + (1-α) * y[i-1] )
-                                    y = down_inertia_alpha * (new_min_risk) \
-                                        + (1-down_inertia_alpha) * min_risk[ticker][-1]
-
-                                    min_risk[ticker].append( y )
-
-                            if len(avg_climbs[ticker]) < N_peak_window * 0.75:
-                                max_risk[ticker].append( 0.0 )
-                            else:
-                                max_risk[ticker].append( round(
-                                    (avg_climbs[ticker][-1] - 0.5 * std_climbs[ticker][-1]) / gain_loss_ratio, 4))
-
-                            # Support variables must be the last to avoid non-causality
-                            last_mid_prices[ticker].append( (open+close)/2 )
-                            last_max_prices[ticker].append( high )
-                            last_min_prices[ticker].append( low )
-                            last_open_prices[ticker].append( open )
-                            last_close_prices[ticker].append( close )
-                            last_deltas[ticker].append( high-low )
-                            last_volumes[ticker].append( volume )
-                            days[ticker].append( day )
-                except StopIteration:
-                    break
-
-            for tck_idx, ticker in enumerate(self.tickers_and_dates):
-                last_max_peaks[ticker] = [False] * len(last_max_prices[ticker])
-                last_min_peaks[ticker] = [False] * len(last_min_prices[ticker])
-
-                peaks = find_candles_peaks(
-                    last_max_prices[ticker], last_min_prices[ticker], window_size=peaks_window_size)
-
-                for peak in peaks:
-                    if peak['type'] == 'min':
-                        last_min_peaks[ticker][peak['index']] = True
-                    else:
-                        last_max_peaks[ticker][peak['index']] = True
-
-            first_write = True
-            for idx, ticker in enumerate(self.tickers_and_dates):
-                start_idx = days[ticker].index(start_date)
-
-                pd.DataFrame({'ticker': ticker,
-                    'day': days[ticker][start_idx:],
-                    'last_mid_prices': last_mid_prices[ticker][start_idx:],
-                    'last_deltas': last_deltas[ticker][start_idx:],
-                    'last_volumes': last_volumes[ticker][start_idx:],
-                    'last_max_prices': last_max_prices[ticker][start_idx:],
-                    'last_min_prices': last_min_prices[ticker][start_idx:],
-                    'last_open_prices': last_open_prices[ticker][start_idx:],
-                    'last_close_prices': last_close_prices[ticker][start_idx:],
-                    'last_max_peaks': last_max_peaks[ticker][start_idx:],
-                    'last_min_peaks': last_min_peaks[ticker][start_idx:],
-
-                    'avg_volume': avg_volume[ticker][start_idx:],
-                    'std_volume': std_volume[ticker][start_idx:],
-                    'mid_prices_dot': mid_prices_dot[ticker][start_idx:],
-                    'mid_prices_dot_for_risk': mid_prices_dot_for_risk[ticker][start_idx:],
-                    'avg_price': avg_price[ticker][start_idx:],
-                    'std_price': std_price[ticker][start_idx:],
-                    'std_price_deltas': std_price_deltas[ticker][start_idx:],
-
-                    'volume_anomalies': volume_anomalies[ticker][start_idx:],
-                    'price_down_anomalies': price_down_anomalies[ticker][start_idx:],
-                    'crisis': crisis[ticker][start_idx:],
-
-                    'downtrend': downtrend[ticker][start_idx:],
-
-                    'uptrend': uptrend[ticker][start_idx:],
-
-                    'fixed_min_risk': [round(risk, 4) for risk in fixed_min_risk[ticker][start_idx:]],
-                    'variable_min_risk': [round(risk, 4) for risk in variable_min_risk[ticker][start_idx:]],
-                    'min_risk': [round(risk, 4) for risk in min_risk[ticker][start_idx:]],
-
-                    'avg_climbs': avg_climbs[ticker][start_idx:],
-                    'std_climbs': std_climbs[ticker][start_idx:],
-                    'max_risk': max_risk[ticker][start_idx:]}).\
-                    to_csv(self.tickers_info_path, mode='w' if first_write else 'a',
-                    index=False, header=True if first_write else False)
-
-                if first_write:
-                    first_write = False
-
-            self.ticker_day_risks = pd.read_csv(self.tickers_info_path, sep=',',
-                usecols=columns)
+            # Remove superseded versions of the same context
+            prefix = paths[ticker].name[:-len(c.TICKERS_INFO_SUFFIX)].rsplit('_', 1)[0]
+            for path in paths[ticker].parent.glob(glob.escape(prefix) + '_*' + \
+                c.TICKERS_INFO_SUFFIX):
+                if path != paths[ticker]:
+                    path.unlink(missing_ok=True)
 
     def _load_models(self, day=None, wfo=True):
         """WFO = Walk Forward Optimization"""
 
-        path_prefix = Path(__file__).parent.parent / c.MODELS_PATH
+        model_tag = MLDerivationStrategy._get_model_tag(self._current_model_tag, day, wfo)
 
-        if wfo is False and self._current_model_tag is None:
+        if model_tag != self._current_model_tag:
+            self._set_model_tag(model_tag)
+
+    def _set_model_tag(self, model_tag):
+
+        self._current_model_tag = model_tag
+
+        if self.use_signal_table:
+            self._signal_table = SignalTable.load(self._get_signal_table_path(
+                model_tag, self._days_before_start))
+
+            if self._signal_table is not None:
+                logger.debug(f"Using signal table of model tag \'{model_tag}\'.")
+                # Models are loaded on demand, only if a signal is missing
+                return
+
+        self._load_tag_models(model_tag)
+
+    @staticmethod
+    def _get_model_tag(current_model_tag, day, wfo=True):
+        """
+        Get model tag of a day.
+
+        Args
+        ----------
+        current_model_tag : str
+            Model tag of previous day. None if no model was loaded yet.
+        day : `pd.Timestamp`
+            Day.
+        wfo : bool, default True
+            Walk Forward Optimization: move to next tag when current one ends.
+
+        Returns
+        ----------
+        str
+            Model tag. None if day is before `WFO_START_DATE`.
+        """
+        if current_model_tag is None:
             if day >= pd.Timestamp(c.WFO_START_DATE):
                 for key, value in c.WFO_MODEL_TAGS.items():
                     if day <= pd.Timestamp(year=value['end_year'], month=value['end_month'], \
                         day=value['end_day']):
+                        return key
 
-                        self._current_model_tag = key
+        elif wfo is True:
+            if day > pd.Timestamp(year=c.WFO_MODEL_TAGS[current_model_tag]['end_year'],
+                month=c.WFO_MODEL_TAGS[current_model_tag]['end_month'],
+                day=c.WFO_MODEL_TAGS[current_model_tag]['end_day']):
 
-                        for _, (ticker, _) in enumerate(self.tickers_and_dates.items()):
-                            self._models[ticker] = joblib.load(path_prefix / \
-                            (ticker + '_' + self._current_model_tag + c.MODEL_SUFFIX))
+                next_index = list(c.WFO_MODEL_TAGS.keys()).index(current_model_tag) + 1
+                return list(c.WFO_MODEL_TAGS.keys())[next_index]
 
-                        break
+        return current_model_tag
 
-        elif wfo is True:
-            if self._current_model_tag is not None:
-                if day > pd.Timestamp(year=c.WFO_MODEL_TAGS[self._current_model_tag]['end_year'],
-                    month=c.WFO_MODEL_TAGS[self._current_model_tag]['end_month'],
-                    day=c.WFO_MODEL_TAGS[self._current_model_tag]['end_day']):
+    def _load_tag_models(self, model_tag):
 
-                    next_index = list(c.WFO_MODEL_TAGS.keys()).index(self._current_model_tag) + 1
-                    self._current_model_tag = list(c.WFO_MODEL_TAGS.keys())[next_index]
+        for ticker in self.tickers_and_dates:
+            self._models[ticker] = ModelCache.get(ticker, model_tag)
 
-                    for _, (ticker, _) in enumerate(self.tickers_and_dates.items()):
-                        self._models[ticker] = joblib.load(path_prefix / \
-                        (ticker + '_' + self._current_model_tag + c.MODEL_SUFFIX))
-            else:
-                if day >= pd.Timestamp(c.WFO_START_DATE):
-                    for key, value in c.WFO_MODEL_TAGS.items():
-                        if day <= pd.Timestamp(year=value['end_year'], month=value['end_month'], \
-                            day=value['end_day']):
+        self._models_tag = model_tag
 
-                            self._current_model_tag = key
+    def _get_model(self, ticker):
 
-                            for _, (ticker, _) in enumerate(self.tickers_and_dates.items()):
-                                self._models[ticker] = joblib.load(path_prefix / \
-                                (ticker + '_' + self._current_model_tag + c.MODEL_SUFFIX))
+        if self._models_tag != self._current_model_tag:
+            self._load_tag_models(self._current_model_tag)
 
-                            break
+        return self._models[ticker]
 
     def _initialize_tcks_priority(self, tcks_priority):
 
@@ -2435,22 +3047,48 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
         if data_validation_flag is False:
             return False
 
+        if not self._lockstep:
+            self._update_mid_prices(self.last_data[ticker_name], business_data)
+
+    def _update_rejected_tickers(self, tcks_priority, indexes, market_cube, day_idx):
+
+        super()._update_rejected_tickers(tcks_priority, indexes, market_cube, day_idx)
+
+        if self._lockstep or not indexes:
+            return
+
+        # Same indicators of `_process_auxiliary_data()`, prices of all tickers at once
+        daily_fields = market_cube.daily_fields
+        open_prices = market_cube.daily[day_idx, :, daily_fields['open_price']]
+        close_prices = market_cube.daily[day_idx, :, daily_fields['close_price']]
+
+        for index in indexes:
+            ticker = tcks_priority[index].ticker
+            cube_idx = market_cube.ticker_index[ticker]
+
+            self._update_mid_prices(self.last_data[ticker], {
+                'open_price_day': open_prices[cube_idx],
+                'close_price_day': close_prices[cube_idx]})
+
+    def _update_mid_prices(self, ticker_data, business_data):
+
         # Spearman corelations and mid prices derivative
-        new_mid = round((self.last_data[ticker_name]['open'] + self.last_data[ticker_name]['close'])/2, 6)
+        new_mid = round((ticker_data['open'] + ticker_data['close'])/2, 6)
 
         if new_mid >= 1e-2:
-            self.last_data[ticker_name]['mid'].append( new_mid )
+            ticker_data['mid'].append( new_mid )
+            ticker_data['spearman'].push( new_mid )
 
-            if len(self.last_data[ticker_name]['mid']) >= 2:
-                self.last_data[ticker_name]['mid_dot'] = \
-                    self.mid_prices_lpf_alpha * ((self.last_data[ticker_name]['mid'][-1] - self.last_data[ticker_name]['mid'][-2]) / self.last_data[ticker_name]['mid'][-2]) + \
-                    (1 - self.mid_prices_lpf_alpha) * self.last_data[ticker_name]['mid_dot']
+            if len(ticker_data['mid']) >= 2:
+                ticker_data['mid_dot'] = \
+                    self.mid_prices_lpf_alpha * ((ticker_data['mid'][-1] - ticker_data['mid'][-2]) / ticker_data['mid'][-2]) + \
+                    (1 - self.mid_prices_lpf_alpha) * ticker_data['mid_dot']
 
-            if len(self.last_data[ticker_name]['mid']) > self.last_prices_max_length:
-                self.last_data[ticker_name]['mid'].pop(0)
+            if len(ticker_data['mid']) > self.last_prices_max_length:
+                ticker_data['mid'].pop(0)
 
-        self.last_data[ticker_name]['open'] = business_data['open_price_day']
-        self.last_data[ticker_name]['close'] = business_data['close_price_day']
+        ticker_data['open'] = business_data['open_price_day']
+        ticker_data['close'] = business_data['close_price_day']
 
 
     @staticmethod
@@ -2469,66 +3107,162 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
     def _check_business_rules(self, business_data, tcks_priority, tck_idx,
         purchase_price):
 
+        ticker = tcks_priority[tck_idx].ticker
+
+        risk = self._get_candidate_risk(ticker, business_data)
+        prediction = self._get_precomputed_signal(ticker, business_data['day'], risk) \
+            if risk is not None else None
+
+        if risk is not None and prediction is None:
+            features = self._get_ticker_features(self.last_data[ticker], risk)
+            prediction = self._get_model(ticker).predict([features])[0]
+            self._share_prediction(ticker, risk, prediction)
+
+        if prediction is None:
+            return False
+
+        if prediction == 1:
+            business_data['stop_loss_day'] = round(purchase_price * (1 - risk), 2)
+            return True
+
+        return False
+
+    def _get_candidate_risk(self, ticker, business_data):
+        """
+        Get operation risk of a purchase candidate.
+
+        Args
+        ----------
+        ticker : str
+            Ticker name.
+        business_data : `dict`
+            Parsed business data of the day.
+
+        Returns
+        ----------
+        float
+            Operation risk. None if candidate is rejected before prediction
+            (crisis, downtrend or no risk available).
+        """
         if self.enable_crisis_halt:
-            crisis_flag = self.ticker_day_risks.loc[
-                (self.ticker_day_risks['ticker'] == tcks_priority[tck_idx].ticker) & \
-                (self.ticker_day_risks['day'] == business_data['day'].strftime('%Y-%m-%d')), \
-                ['crisis']].squeeze()
+            crisis_flag = self.risk_table.get(ticker, business_data['day'], 'crisis')
 
             if crisis_flag:
-                return False
+                return None
 
         # if business_data['day'] == pd.Timestamp('2019-12-16T00'):
         #     print()
 
-        risk = self._get_risk(tcks_priority[tck_idx].ticker, business_data['day'])
+        risk = self._get_risk(ticker, business_data['day'])
         if risk is None:
-            return False
+            return None
 
         if self.enable_downtrend_halt:
-            downtrend_flag = self.ticker_day_risks.loc[
-                (self.ticker_day_risks['ticker'] == tcks_priority[tck_idx].ticker) & \
-                (self.ticker_day_risks['day'] == business_data['day'].strftime('%Y-%m-%d')), \
-                ['downtrend']].squeeze()
+            downtrend_flag = self.risk_table.get(ticker, business_data['day'], 'downtrend')
 
             if downtrend_flag:
-                return False
+                return None
+
+        return risk
+
+    def _get_eligibility_mask(self, market_cube):
+
+        mask = super()._get_eligibility_mask(market_cube)
+
+        # Same rejections as `_get_candidate_risk()`
+        if self.enable_crisis_halt:
+            crisis, valid = self.risk_table.get_grid(market_cube.tickers, market_cube.days,
+                'crisis')
+            mask &= ~(valid & crisis.astype(bool))
+
+        min_risk, min_risk_valid = self.risk_table.get_grid(market_cube.tickers,
+            market_cube.days, 'min_risk')
+        max_risk, max_risk_valid = self.risk_table.get_grid(market_cube.tickers,
+            market_cube.days, 'avg_climbs')
+        mask &= min_risk_valid & max_risk_valid & ~(max_risk < min_risk)
 
+        if self.enable_downtrend_halt:
+            downtrend, valid = self.risk_table.get_grid(market_cube.tickers, market_cube.days,
+                'downtrend')
+            mask &= ~(valid & downtrend.astype(bool))
+
+        return mask
+
+    def _get_ticker_features(self, ticker_data, risk):
+        """
+        Get model input features.
+
+        Args
+        ----------
+        ticker_data : `dict`
+            Ticker entry of `last_data`.
+        risk : float
+            Operation risk.
 
-        mid_prices_dot = self.last_data[tcks_priority[tck_idx].ticker]['mid_dot']
+        Returns
+        ----------
+        `list` of float
+            Features (risk, mid prices derivative and spearman correlations).
+        """
+        mid_prices_dot = ticker_data['mid_dot']
         spearman_corrs = [0.0 for _ in self.spearman_correlations]
+        correlations = ticker_data['spearman'].correlations()
 
         for spear_idx, spear_n in enumerate(self.spearman_correlations):
-            if len(self.last_data[tcks_priority[tck_idx].ticker]['mid']) >= spear_n:
-                corr = stats.spearmanr(self.spearman_reference[:spear_n],
-                    self.last_data[tcks_priority[tck_idx].ticker]['mid'][len(self.last_data[tcks_priority[tck_idx].ticker]['mid']) - spear_n : len(self.last_data[tcks_priority[tck_idx].ticker]['mid'])]).correlation
+            if len(ticker_data['mid']) >= spear_n:
+                corr = correlations[spear_idx]
 
                 if math.isnan(corr):
                     corr = 0.0
 
                 spearman_corrs[spear_idx] = round(corr, 4)
 
-        X_test = [[risk, mid_prices_dot, *spearman_corrs]]
+        return [risk, mid_prices_dot, *spearman_corrs]
 
-        prediction = self.models[tcks_priority[tck_idx].ticker].predict(X_test)
+    def _get_precomputed_signal(self, ticker, day, risk):
+        """
+        Get prediction from signal table or from another lockstep variant.
 
-        if prediction[0] == 1:
-            business_data['stop_loss_day'] = round(purchase_price * (1 - risk), 2)
-            return True
+        Args
+        ----------
+        ticker : str
+            Ticker name.
+        day : `pd.Timestamp`
+            Day.
+        risk : float
+            Operation risk, must match the one used in precomputation.
 
-        return False
+        Returns
+        ----------
+        Model prediction. None if not available.
+        """
+        if self._shared_predictions is not None and (ticker, risk) in self._shared_predictions:
+            return self._shared_predictions[(ticker, risk)]
+
+        if self._signal_table is None:
+            return None
+
+        signal = self._signal_table.get(ticker, day, self.operation_risk)
+
+        if signal is None or signal[0] != risk:
+            return None
+
+        return signal[1]
+
+    def _share_prediction(self, ticker, risk, prediction):
+        # Same ticker and risk have the same features on the same day
+        if self._shared_predictions is not None:
+            self._shared_predictions[(ticker, risk)] = prediction
 
-    def _get_risk(self, ticker, day, force=False):
+    def _get_risk(self, ticker, day, force=False, operation_risk=None):
 
-        min_risk = self.ticker_day_risks.loc[
-            (self.ticker_day_risks['ticker'] == ticker) & \
-            (self.ticker_day_risks['day'] == day.strftime('%Y-%m-%d')), ['min_risk']].squeeze()
+        if operation_risk is None:
+            operation_risk = self.operation_risk
 
-        max_risk = self.ticker_day_risks.loc[
-            (self.ticker_day_risks['ticker'] == ticker) & \
-            (self.ticker_day_risks['day'] == day.strftime('%Y-%m-%d')), ['avg_climbs']].squeeze()
+        min_risk = self.risk_table.get(ticker, day, 'min_risk')
+        max_risk = self.risk_table.get(ticker, day, 'avg_climbs')
 
-        if isinstance(min_risk, pd.Series) or isinstance(max_risk, pd.Series):
+        if min_risk is None or max_risk is None:
             return None
 
         if max_risk < min_risk:
@@ -2537,7 +3271,7 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
             else:
                 return None
 
-        risk = min_risk + (max_risk - min_risk) * self.operation_risk
+        risk = min_risk + (max_risk - min_risk) * operation_risk
 
         return round(risk, 3)
 
@@ -2668,6 +3402,8 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
             profit = amount - tcks_priority[tck_idx].loaned
             tcks_priority[tck_idx].profit = round(tcks_priority[tck_idx].profit + profit, 2)
             self.total_profit = round(self.total_profit + profit, 2)
+            self.portfolio_stats.update_profit(tcks_priority[tck_idx].ticker,
+                tcks_priority[tck_idx].profit)
             tcks_priority[tck_idx].loaned = 0.0
             tcks_priority[tck_idx].op_count += 1
 
@@ -2684,6 +3420,8 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
             profit = amount - tcks_priority[tck_idx].loaned
             tcks_priority[tck_idx].profit = round(tcks_priority[tck_idx].profit + profit, 2)
             self.total_profit = round(self.total_profit + profit, 2)
+            self.portfolio_stats.update_profit(tcks_priority[tck_idx].ticker,
+                tcks_priority[tck_idx].profit)
             tcks_priority[tck_idx].loaned = 0.0
 
             self.total_op_count += 1
@@ -2699,6 +3437,8 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
             profit = amount - tcks_priority[tck_idx].loaned
             tcks_priority[tck_idx].profit = round(tcks_priority[tck_idx].profit + profit, 2)
             self.total_profit = round(self.total_profit + profit, 2)
+            self.portfolio_stats.update_profit(tcks_priority[tck_idx].ticker,
+                tcks_priority[tck_idx].profit)
             tcks_priority[tck_idx].loaned = 0.0
             tcks_priority[tck_idx].op_count += 1
             tcks_priority[tck_idx].op_suc_count += 1
@@ -2717,6 +3457,8 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
             profit = amount - tcks_priority[tck_idx].loaned
             tcks_priority[tck_idx].profit = round(tcks_priority[tck_idx].profit + profit, 2)
             self.total_profit = round(self.total_profit + profit, 2)
+            self.portfolio_stats.update_profit(tcks_priority[tck_idx].ticker,
+                tcks_priority[tck_idx].profit)
             tcks_priority[tck_idx].loaned = 0.0
             tcks_priority[tck_idx].op_count += 1
 
@@ -2727,9 +3469,8 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
 
     def _get_profit_statistics(self, tcks_priority):
 
-        profits = np.array([card.profit for card in tcks_priority])
         mean = self.total_profit / len(self.tickers_and_dates)
-        std = np.std(profits)
+        std = self.portfolio_stats.profit_std
 
         return mean, std
 
@@ -2770,8 +3511,9 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
                 # elif ticker_card.profit < 1e-2 and ticker_card.profit > (1 - 1e-2):
                 #     pontuation[idx] += profit
 
-            new_order = [tck for tck in sorted(tcks_priority,
-                key=lambda card: pontuation[tcks_priority.index(card)], reverse=True)]
+            # Only open operation is scored: same as a stable sort by pontuation
+            new_order = AdaptedAndreMoraesStrategy._partition_by_priority(tcks_priority,
+                [int(points != open_operation) for points in pontuation], 2)
 
             # Method 2
             # new_order = sorted(tcks_priority, key=lambda ticker_state: \
@@ -2789,15 +3531,13 @@ class MLDerivationStrategy(AdaptedAndreMoraesStrategy):
         if day is not None and day.date() >= self.first_date:
             self.capital_in_use = (self.max_capital - self.available_capital) / self.max_capital
 
-            self.capital_in_use_last_values.append( self.capital_in_use )
-            if len(self.capital_in_use_last_values) > self.n_avg:
-                self.capital_in_use_last_values.pop(0)
+            self.portfolio_stats.add_capital_in_use(self.capital_in_use)
 
             self.last_capital_in_use_mavg = self.capital_in_use_mavg
 
             if not self.first_update:
 
-                self.capital_in_use_mavg = np.mean( self.capital_in_use_last_values )
+                self.capital_in_use_mavg = self.portfolio_stats.capital_in_use_mavg
 
                 # self.capital_in_use_dot = self.der_lpf_alpha * (self.capital_in_use_mavg - self.last_capital_in_use_mavg) \
                 #     + (1 - self.der_lpf_alpha) * (self.capital_in_use_dot)
@@ -2,13 +2,20 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 from datetime import timedelta
+from collections import deque
+from multiprocessing import Pool, current_process
+import math
+import time
+import traceback
+import psutil
 import logging
 from logging.handlers import RotatingFileHandler
-import yfinance as yf
 
 import constants as c
 from utils import PC, has_workdays_in_between, RunTime, Trend, compare_peaks
 from db_model import DBTickerModel
+from peaks import StreamingPeakDetector, find_candles_peaks, analyze_peaks
+from yahoo_fetcher import YahooFinanceFetcher
 
 # Configure Logging
 logger = logging.getLogger(__name__)
@@ -78,11 +85,14 @@ class TickerManager:
     ----------
     bool : update()
         Update ticker data.
+    list : prefetch_candles(ticker_managers)
+        Request missing daily candlesticks of many tickers concurrently.
     bool : generate_features(trend_status_ema_weight=0.95, consolidation_tolerance=0.05,
         lpf_alpha=0.8)
         Generate features from daily and weekly candlesticks and save in database.
     """
     db_ticker_model = DBTickerModel()
+    yahoo_fetcher = YahooFinanceFetcher()
     total_tickers = 0
 
     def __init__(self, ticker, start_date, end_date, ordinary_ticker=True, holidays=None):
@@ -172,10 +182,236 @@ class TickerManager:
 
         return update_happened
 
+    @staticmethod
+    def prefetch_candles(ticker_managers):
+        """
+        Request missing daily candlesticks of many tickers concurrently.
+
+        Yahoo Finance responses of the intervals `update()` is going to request
+        are cached by `yahoo_fetcher`, which limits concurrent requests.
+        Database is only read, `update()` must be called after it.
+
+        Args
+        ----------
+        ticker_managers : `list` of `TickerManager`
+            Tickers, with holidays already set.
+
+        Returns
+        ----------
+        `list` of `tuple`
+            Failed requests (symbol, start date, end date).
+        """
+        requests = []
+
+        for tm in ticker_managers:
+            for interval in tm._get_missing_daily_intervals():
+                requests.append((tm._get_yfinance_symbol(), interval['start_date'],
+                    interval['end_date']))
+
+        return TickerManager.yahoo_fetcher.prefetch(requests)
+
+    @staticmethod
+    def update_panel(ticker_managers):
+        """
+        Update daily candlesticks of many tickers at once.
+
+        Same database result of `update()` of each ticker, but the missing
+        intervals of all tickers are downloaded in one Yahoo Finance panel per
+        distinct interval (see `YahooFinanceFetcher.get_panel()`), checked by
+        column operations across all panels and loaded in a single database
+        transaction.
+
+        Args
+        ----------
+        ticker_managers : `list` of `TickerManager`
+            Tickers, with holidays already set.
+
+        Returns
+        ----------
+        `dict`
+            True if any update was necessary, False if not. Key must be the
+            `TickerManager`.
+        """
+        update_happened = {tm: False for tm in ticker_managers}
+        requests = [dict(interval, tm=tm) for tm in ticker_managers \
+            for interval in tm._get_missing_daily_intervals()]
+
+        if not requests:
+            return update_happened
+
+        requests_df = pd.DataFrame({
+            'ticker': [request['tm'].ticker for request in requests],
+            'symbol': [request['tm']._get_yfinance_symbol() for request in requests],
+            'ordinary': [request['tm'].ordinary_ticker for request in requests],
+            'start_date': pd.to_datetime([request['start_date'] for request in requests]),
+            'end_date': pd.to_datetime([request['end_date'] for request in requests]),
+            'oldest_date_in_db': pd.to_datetime([request.get('oldest_date_in_db') \
+                for request in requests]),
+            'last_update_in_db': pd.to_datetime([request.get('last_update_in_db') \
+                for request in requests])})
+        requests_df.index.name = 'request'
+
+        # One panel per interval, so symbols only download their own interval
+        # (most tickers share the same missing interval)
+        candles = []
+        for (start_date, end_date), group_df in requests_df.groupby(['start_date', 'end_date']):
+            try:
+                panel = TickerManager.yahoo_fetcher.get_panel(group_df['symbol'].tolist(),
+                    start_date.date(), end_date.date())
+            except Exception as error:
+                logger.error('Error getting yfinance data, error:\n{}'.format(error))
+                # sys.exit(c.YFINANCE_ERR)
+                raise error
+
+            # One row per symbol and day, in the interval of its request
+            group_candles_df = TickerManager._get_panel_candles(panel, group_df['symbol'])
+            group_candles_df = group_candles_df.merge(group_df[['symbol', 'start_date',
+                'end_date']].reset_index(), on='symbol')
+            candles.append(group_candles_df[(group_candles_df['day'] >= start_date) &
+                (group_candles_df['day'] <= end_date)])
+
+        candles_df = pd.concat(candles, ignore_index=True)
+
+        # Panel rows of days the symbol has no data
+        prices = ['Open', 'High', 'Low', 'Close']
+        candles_df = candles_df[candles_df[prices + ['Volume']].notna().any(axis=1)]
+        candles_df = candles_df.fillna({'Dividends': 0, 'Stock Splits': 0}) \
+            .reset_index(drop=True)
+        downloaded = candles_df['request'].value_counts()
+
+        splits_df = candles_df.loc[candles_df['Stock Splits'] != 0,
+            ['request', 'day', 'Stock Splits']]
+        dividends_df = candles_df.loc[candles_df['Dividends'] != 0,
+            ['request', 'day', 'Dividends']]
+
+        # Normalization factor of each request: product of the splits after the
+        # last update date
+        after_update = splits_df['day'] >= \
+            splits_df['request'].map(requests_df['last_update_in_db'])
+        normalizations_df = splits_df[after_update].groupby('request')['Stock Splits'] \
+            .agg(lambda ratios: math.prod(ratios.tolist(), start=1.0)) \
+            .rename('normalization_factor').to_frame()
+        normalizations_df = normalizations_df[normalizations_df['normalization_factor'] != 1.0]
+
+        # Yahoo Finance consistency on data changes if ticker is not ordinary
+        candles_df['ordinary'] = candles_df['request'].map(requests_df['ordinary'])
+        corrupted = (candles_df[prices] == 0).any(axis=1) | (candles_df['ordinary'] &
+            (candles_df[prices + ['Volume']].isna().any(axis=1) | (candles_df['Volume'] == 0)))
+        candles_df = candles_df[~corrupted].copy()
+        checked = candles_df['request'].value_counts()
+
+        TickerManager._adjust_to_database_constraints(candles_df)
+        adjusted = candles_df['request'].value_counts()
+
+        for request, row in requests_df.iterrows():
+            if downloaded.get(request, 0) == 0:
+                message = "Yahoo Finance has no data for ticker"
+            elif checked.get(request, 0) == 0:
+                message = "Yahoo Finance data corrupted for ticker"
+            elif adjusted.get(request, 0) == 0:
+                message = "No valid data to update for ticker"
+            else:
+                update_happened[requests[request]['tm']] = True
+                continue
+
+            logger.warning(f"{message} \'{row['ticker']}\' "
+                f"(\'{row['start_date'].strftime('%Y-%m-%d')}\', "
+                f"\'{row['end_date'].strftime('%Y-%m-%d')}\').")
+
+        # Splits, dividends and normalization only of requests with new candles
+        splits_df = splits_df[splits_df['request'].isin(adjusted.index)].copy()
+        dividends_df = dividends_df[dividends_df['request'].isin(adjusted.index)].copy()
+        normalizations_df = normalizations_df[normalizations_df.index.isin(adjusted.index)]
+
+        normalizations_df = normalizations_df.join(requests_df[['ticker', 'oldest_date_in_db',
+            'start_date']]).rename(columns={'oldest_date_in_db': 'start_date',
+            'start_date': 'end_date'})
+        normalizations_df['end_date'] = normalizations_df['end_date'] - timedelta(days=1)
+
+        for df in [candles_df, splits_df, dividends_df]:
+            df.insert(0, 'ticker', df['request'].map(requests_df['ticker']))
+
+        TickerManager.db_ticker_model.load_daily_data(candles_df, splits_df, dividends_df,
+            normalizations_df)
+
+        for tm, updated in update_happened.items():
+            if updated is True:
+                logger.info(f"Ticker \'{tm.ticker}\' updated daily candlesticks.")
+
+                # Only common tickers should have derived candlesticks
+                if tm.ordinary_ticker is True:
+                    tm._update_weekly_candles()
+
+        logger.info(f"Panel of {len(requests_df['symbol'].unique())} ticker(s) loaded: "
+            f"{len(candles_df)} candle(s), {len(splits_df)} split(s), "
+            f"{len(dividends_df)} dividend(s), {len(normalizations_df)} normalization(s).")
+
+        return update_happened
+
+    @staticmethod
+    def _get_panel_candles(panel, symbols):
+        """
+        Reshape a wide panel of `YahooFinanceFetcher.get_panel()` to one row per
+        symbol and day.
+
+        Args
+        ----------
+        panel : `pandas.DataFrame`
+            DataFrame with index of dates and columns (symbol, field).
+        symbols : `list` of str
+            Yahoo Finance symbols. Missing symbols have NaN values.
+
+        Returns
+        ----------
+        `pandas.DataFrame`
+            DataFrame with columns 'symbol', 'day', 'Open', 'High', 'Low',
+            'Close', 'Volume', 'Dividends' and 'Stock Splits'.
+        """
+        fields = ['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
+        symbols = list(symbols)
+
+        days = pd.DatetimeIndex(panel.index)
+        if days.tz is not None:
+            days = days.tz_localize(None)
+
+        values = panel.reindex(columns=pd.MultiIndex.from_product([symbols, fields])) \
+            .to_numpy(dtype=float).reshape(len(days) * len(symbols), len(fields))
+
+        candles_df = pd.DataFrame(values, columns=fields)
+        candles_df.insert(0, 'symbol', np.tile(np.array(symbols, dtype=object), len(days)))
+        candles_df.insert(1, 'day', np.repeat(days.normalize().to_numpy(), len(symbols)))
+
+        return candles_df
+
     def _update_missing_daily_data(self):
         """
         Update ticker daily candlesticks.
 
+        Missing intervals from `_get_missing_daily_intervals()`.
+
+        Returns
+        ----------
+        bool
+            True if any update was necessary, False if not.
+        """
+        update_happened = False
+
+        for interval in self._get_missing_daily_intervals():
+            update_flag = self._update_candles_splits_and_dividends(**interval)
+            if update_flag is True:
+                update_happened = True
+
+        if update_happened is True:
+            logger.info(f"Ticker \'{self.ticker}\' updated daily candlesticks.")
+        # else:
+        #     logger.info(f"Ticker \'{self.ticker}\' did not updated daily candlesticks.")
+
+        return update_happened
+
+    def _get_missing_daily_intervals(self):
+        """
+        Get intervals of daily candlesticks missing in database.
+
         Three cases are handled, in order:
                                 ----------------------------> +
         Database interval:                |---------|
@@ -190,13 +426,14 @@ class TickerManager:
 
         Returns
         ----------
-        bool
-            True if any update was necessary, False if not.
+        `list` of `dict`
+            Arguments of `_update_candles_splits_and_dividends()` of each
+            missing interval, in update order. Empty if already updated.
         """
         last_update_in_db = None
         start_date_in_db = None
         end_date_in_db = None
-        update_happened = False
+        intervals = []
 
         # Get database interval range
         date_range_df = TickerManager.db_ticker_model.get_date_range(self.ticker)
@@ -222,35 +459,24 @@ class TickerManager:
                 and has_workdays_in_between(end_date_in_db, self.end_date,
                 self.holidays, consider_recent_date=True) is False):
                 # logger.info(f"Ticker \'{self.ticker}\' already updated.")
-                return False
+                return intervals
 
             # Database lacks most recent data
             if has_workdays_in_between(end_date_in_db, self.end_date, self.holidays,
                 consider_recent_date=True) is True:
-                update_flag = self._update_candles_splits_and_dividends(end_date_in_db+timedelta(days=1),
-                    self.end_date, oldest_date_in_db=start_date_in_db,
-                    last_update_in_db=last_update_in_db)
-                if update_flag is True:
-                    update_happened = True
+                intervals.append({'start_date': end_date_in_db+timedelta(days=1),
+                    'end_date': self.end_date, 'oldest_date_in_db': start_date_in_db,
+                    'last_update_in_db': last_update_in_db})
 
             # Database lacks oldest data
             if has_workdays_in_between(self.start_date, start_date_in_db,
                 self.holidays, consider_oldest_date=True) is True:
-                update_flag = self._update_candles_splits_and_dividends(self.start_date,
-                    start_date_in_db-timedelta(days=1))
-                if update_flag is True:
-                    update_happened = True
+                intervals.append({'start_date': self.start_date,
+                    'end_date': start_date_in_db-timedelta(days=1)})
         else:
-            update_flag = self._update_candles_splits_and_dividends(self.start_date, self.end_date)
-            if update_flag is True:
-                update_happened = True
-
-        if update_happened is True:
-            logger.info(f"Ticker \'{self.ticker}\' updated daily candlesticks.")
-        # else:
-        #     logger.info(f"Ticker \'{self.ticker}\' did not updated daily candlesticks.")
+            intervals.append({'start_date': self.start_date, 'end_date': self.end_date})
 
-        return update_happened
+        return intervals
 
     def _update_candles_splits_and_dividends(self, start_date, end_date,
         oldest_date_in_db=None, last_update_in_db=None):
@@ -378,18 +604,11 @@ class TickerManager:
         `pandas.DataFrame`
             DataFrame with candles.
         """
-        ticker = self.ticker
         hist = None
 
-        if self._ordinary_ticker is True:
-            ticker += '.SA'
-
         try:
-            msft = yf.Ticker(ticker)
-            hist = msft.history(
-                start=start_date.strftime('%Y-%m-%d'),
-                end=(end_date+timedelta(days=1)).strftime('%Y-%m-%d'),
-                prepost=True, back_adjust=True, rounding=True)
+            hist = TickerManager.yahoo_fetcher.get_history(self._get_yfinance_symbol(),
+                start_date, end_date)
         except Exception as error:
             logger.error('Error getting yfinance data, error:\n{}'.format(error))
             # sys.exit(c.YFINANCE_ERR)
@@ -397,6 +616,13 @@ class TickerManager:
 
         return hist
 
+    def _get_yfinance_symbol(self):
+
+        if self._ordinary_ticker is True:
+            return self.ticker + '.SA'
+
+        return self.ticker
+
     def _get_splits_and_norm_factor(self, candles_df, last_update_date=None):
         """
         Get new dataframe of splits and calculate the normalization factor.
@@ -423,30 +649,31 @@ class TickerManager:
         splits_df = candles_df[candles_df['Stock Splits'] != 0].copy()
 
         if last_update_date is not None:
-            for index, row in splits_df.iterrows():
-                if index.date() >= last_update_date:
-                    normalization_factor = normalization_factor * row['Stock Splits']
+            normalization_factor = math.prod(splits_df.loc[splits_df.index.date >= \
+                last_update_date, 'Stock Splits'].tolist(), start=normalization_factor)
 
         return splits_df, normalization_factor
 
-    def _adjust_to_database_constraints(self, candles_df):
+    @staticmethod
+    def _adjust_to_database_constraints(candles_df):
         """
         Verify and correct candlestick data according to database constraints.
 
+        Column operations, so candles of many tickers can be adjusted at once.
+
         Args
         ----------
         candles_df : `pandas.DataFrame`
             DataFrame of candles with columns 'Open', 'High', 'Low', 'Close'.
         """
-
-        candles_df['Low'] = candles_df.apply(lambda x:
-            x['Close'] if x['Low'] > x['Close'] else x['Low'], axis=1)
-        candles_df['Low'] = candles_df.apply(lambda x:
-            x['Open'] if x['Low'] > x['Open'] else x['Low'], axis=1)
-        candles_df['High'] = candles_df.apply(lambda x:
-            x['Close'] if x['High'] < x['Close'] else x['High'], axis=1)
-        candles_df['High'] = candles_df.apply(lambda x:
-            x['Open'] if x['High'] < x['Open'] else x['High'], axis=1)
+        candles_df['Low'] = candles_df['Low'].mask(candles_df['Low'] > candles_df['Close'],
+            candles_df['Close'])
+        candles_df['Low'] = candles_df['Low'].mask(candles_df['Low'] > candles_df['Open'],
+            candles_df['Open'])
+        candles_df['High'] = candles_df['High'].mask(candles_df['High'] < candles_df['Close'],
+            candles_df['Close'])
+        candles_df['High'] = candles_df['High'].mask(candles_df['High'] < candles_df['Open'],
+            candles_df['Open'])
 
         candles_df.drop(candles_df.loc[(candles_df['Open'] < 0.0) | \
             (candles_df['High'] < 0.0) | (candles_df['Low'] < 0.0) | \
@@ -484,68 +711,17 @@ class TickerManager:
                 TickerManager.db_ticker_model.delete_features(self.ticker, interval='1d')
                 TickerManager.db_ticker_model.delete_features(self.ticker, interval='1wk')
 
-                # Prevent algorithm inertia in first values
-                days_before_initial_date = 180
-
-                # Day interval
-                candles_df = TickerManager.db_ticker_model.get_candlesticks(
-                    self.ticker, self.start_date, self.end_date,
-                    days_before_initial_date, interval='1d')
-
-                trends, target_prices, stop_losses, peaks = \
-                    self.find_target_buy_price_and_trend(candles_df,
-                    time_column_name='day', close_column_name='close_price',
-                    max_colum_name='max_price', min_column_name='min_price')
-
-                ema_17 = pd.Series([0])
-                ema_17 = pd.concat([ema_17, candles_df['close_price'].ewm(span=17,
-                    adjust=False).mean()], ignore_index=True)
-                ema_17.drop(ema_17.index[-1], inplace=True)
-
-                ema_72 = pd.Series([0])
-                ema_72 = pd.concat([ema_72, candles_df['close_price'].ewm(span=72,
-                    adjust=False).mean()], ignore_index=True)
-                ema_72.drop(ema_72.index[-1], inplace=True)
-
-                if trends is not None and \
-                    target_prices is not None and stop_losses is not None and \
-                    peaks is not None:
-                    features_df = pd.DataFrame({'ticker': self._ticker,
-                        'day': candles_df['day'], 'target_buy_price': target_prices,
-                        'stop_loss': stop_losses, 'ema_17': ema_17, 'ema_72': ema_72,
-                        'up_down_trend_status': trends, 'peak': peaks})
-                    TickerManager.db_ticker_model.upsert_features(features_df,
+                daily_features_df, weekly_features_df = self._compute_features(
+                    *self._get_features_candles())
+
+                if daily_features_df is not None:
+                    TickerManager.db_ticker_model.upsert_features(daily_features_df,
                         interval='1d')
                 else:
                     return False
 
-                # Week interval
-                candles_df = TickerManager.db_ticker_model.get_candlesticks(
-                    self.ticker, self.start_date, self.end_date,
-                    days_before_initial_date, interval='1wk')
-
-                ema_17 = pd.Series([0])
-                ema_17 = pd.concat([ema_17, candles_df['close_price'].ewm(span=17,
-                    adjust=False).mean()], ignore_index=True)
-                ema_17.drop(ema_17.index[-1], inplace=True)
-
-                ema_72 = pd.Series([0])
-                ema_72 = pd.concat([ema_72, candles_df['close_price'].ewm(span=72,
-                    adjust=False).mean()], ignore_index=True)
-                ema_72.drop(ema_72.index[-1], inplace=True)
-
-                peaks = [0] * len(candles_df)
-                peaks_raw = TickerManager.find_candles_peaks(candles_df['max_price'].to_list(),
-                    candles_df['min_price'].to_list())
-                if peaks_raw is not None:
-                    for peak in peaks_raw:
-                        peaks[peak['index']] = peak['magnitude']
-
-                if candles_df.empty is False and peaks_raw is not None:
-                    features_df = pd.DataFrame({'ticker': self._ticker,
-                        'week': candles_df['week'], 'ema_17': ema_17,
-                        'ema_72': ema_72, 'peak': peaks})
-                    TickerManager.db_ticker_model.upsert_features(features_df,
+                if weekly_features_df is not None:
+                    TickerManager.db_ticker_model.upsert_features(weekly_features_df,
                         interval='1wk')
                 else:
                     return False
@@ -555,6 +731,242 @@ class TickerManager:
             raise error
         return True
 
+    @staticmethod
+    def generate_features_batch(ticker_managers, processes=None,
+        batch_size=c.FEATURES_BATCH_SIZE):
+        """
+        Generate features of many tickers in parallel processes.
+
+        Same database result of `generate_features()` of each ticker. This
+        process reads candlesticks and sends them to a process pool, which
+        computes daily and weekly features. It is also the single database
+        writer: finished features are saved `batch_size` tickers at a time by
+        `DBTickerModel.replace_features()`, while the pool computes the other
+        tickers.
+
+        A failed ticker (candles reading or features computation) is logged and
+        does not stop the others. Its previous features are deleted, as in
+        `generate_features()`.
+
+        Args
+        ----------
+        ticker_managers : `list` of `TickerManager`
+            Tickers.
+        processes : int, optional
+            Maximum number of processes, number of physical cores if not given.
+        batch_size : int, default `c.FEATURES_BATCH_SIZE`
+            Number of tickers saved per transaction.
+
+        Returns
+        ----------
+        `dict`
+            True if features were generated, False if not. Key must be the
+            `TickerManager`.
+        """
+        if batch_size < 1:
+            logger.error(f"Error argument \'batch_size\' must be at least 1, got {batch_size}.")
+            # sys.exit(c.INVALID_ARGUMENT_ERR)
+            raise Exception
+
+        # Non ordinary tickers have no features
+        features_ok = {tm: True for tm in ticker_managers}
+        ordinary_tms = [tm for tm in ticker_managers if tm.ordinary_ticker is True]
+
+        if not ordinary_tms:
+            return features_ok
+
+        processes = min(processes or psutil.cpu_count(logical=False) or 1, len(ordinary_tms))
+        start = time.perf_counter()
+        pending = deque()
+        batch = []
+
+        def write(wait=False):
+            while pending and (wait or pending[0][1].ready()):
+                tm, result = pending.popleft()
+                daily_features_df, weekly_features_df, run_time, error = result.get()
+
+                if error is not None:
+                    logger.error(f"Error generating features for ticker \'{tm.ticker}\', "
+                        f"error:\n{error}")
+                else:
+                    logger.info(f"Ticker \'{tm.ticker}\' features computed in "
+                        f"{run_time:.2f} second(s).")
+
+                batch.append((tm, daily_features_df, weekly_features_df))
+
+                if len(batch) >= batch_size:
+                    TickerManager._write_features(batch, features_ok)
+                    batch.clear()
+
+            if wait and batch:
+                TickerManager._write_features(batch, features_ok)
+                batch.clear()
+
+        if processes > 1 and not current_process().daemon:
+            pool = Pool(processes)
+        else:
+            pool = None
+
+        try:
+            for tm in ordinary_tms:
+                logger.info(f"Generating features for ticker \'{tm.ticker}\'.")
+
+                # Failed reads are reported as failed tickers, like failed computations
+                try:
+                    args = (tm, *tm._get_features_candles())
+                except Exception:
+                    TickerManager.db_ticker_model.rollback()
+                    pending.append((tm, _FinishedResult((None, None, 0.0,
+                        traceback.format_exc()))))
+                    write()
+                    continue
+
+                if pool is not None:
+                    pending.append((tm, pool.apply_async(_compute_ticker_features, args)))
+                else:
+                    pending.append((tm, _FinishedResult(_compute_ticker_features(*args))))
+
+                # Save finished tickers while the pool computes the others
+                write()
+
+            write(wait=True)
+        except Exception as error:
+            logger.exception(f"Error generating features, error:\n{error}")
+            # sys.exit(c.UPDATING_DB_ERR)
+            raise error
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        failures = [tm.ticker for tm, ok in features_ok.items() if ok is False]
+        logger.info(f"Features of {len(ordinary_tms) - len(failures)} of {len(ordinary_tms)} "
+            f"ticker(s) generated in {time.perf_counter() - start:.2f} second(s) with "
+            f"{processes} process(es)." + (f" Failed: {', '.join(failures)}." if failures else ""))
+
+        return features_ok
+
+    @staticmethod
+    def _write_features(batch, features_ok):
+        """Save features of a batch of (`TickerManager`, daily, weekly features)."""
+        start = time.perf_counter()
+
+        daily_features = [daily for _, daily, _ in batch if daily is not None]
+        weekly_features = [weekly for _, daily, weekly in batch \
+            if daily is not None and weekly is not None]
+
+        TickerManager.db_ticker_model.replace_features([tm.ticker for tm, _, _ in batch],
+            pd.concat(daily_features, ignore_index=True) if daily_features else pd.DataFrame(),
+            pd.concat(weekly_features, ignore_index=True) if weekly_features else pd.DataFrame())
+
+        for tm, daily_features_df, weekly_features_df in batch:
+            features_ok[tm] = daily_features_df is not None and weekly_features_df is not None
+
+        logger.info(f"Features of {len(batch)} ticker(s) saved in "
+            f"{time.perf_counter() - start:.2f} second(s).")
+
+    def _get_features_candles(self):
+        """
+        Get daily and weekly candlesticks of `_compute_features()`.
+
+        Returns
+        ----------
+        `pandas.DataFrame`
+            Daily candlesticks.
+        `pandas.DataFrame`
+            Weekly candlesticks.
+        """
+        # Prevent algorithm inertia in first values
+        days_before_initial_date = 180
+
+        daily_candles_df = TickerManager.db_ticker_model.get_candlesticks(
+            self.ticker, self.start_date, self.end_date,
+            days_before_initial_date, interval='1d')
+
+        weekly_candles_df = TickerManager.db_ticker_model.get_candlesticks(
+            self.ticker, self.start_date, self.end_date,
+            days_before_initial_date, interval='1wk')
+
+        return daily_candles_df, weekly_candles_df
+
+    def _compute_features(self, daily_candles_df, weekly_candles_df):
+        """
+        Compute daily and weekly features.
+
+        No database access, so it can run in other processes.
+
+        Args
+        ----------
+        daily_candles_df : `pandas.DataFrame`
+            Daily candlesticks of `_get_features_candles()`.
+        weekly_candles_df : `pandas.DataFrame`
+            Weekly candlesticks of `_get_features_candles()`.
+
+        Returns
+        ----------
+        `pandas.DataFrame` or None
+            Daily features, None if they could not be computed.
+        `pandas.DataFrame` or None
+            Weekly features, None if they (or daily features) could not be
+            computed.
+        """
+        # Day interval
+        candles_df = daily_candles_df
+
+        trends, target_prices, stop_losses, peaks = \
+            self.find_target_buy_price_and_trend(candles_df,
+            time_column_name='day', close_column_name='close_price',
+            max_colum_name='max_price', min_column_name='min_price')
+
+        ema_17 = pd.Series([0])
+        ema_17 = pd.concat([ema_17, candles_df['close_price'].ewm(span=17,
+            adjust=False).mean()], ignore_index=True)
+        ema_17.drop(ema_17.index[-1], inplace=True)
+
+        ema_72 = pd.Series([0])
+        ema_72 = pd.concat([ema_72, candles_df['close_price'].ewm(span=72,
+            adjust=False).mean()], ignore_index=True)
+        ema_72.drop(ema_72.index[-1], inplace=True)
+
+        if trends is not None and \
+            target_prices is not None and stop_losses is not None and \
+            peaks is not None:
+            daily_features_df = pd.DataFrame({'ticker': self._ticker,
+                'day': candles_df['day'], 'target_buy_price': target_prices,
+                'stop_loss': stop_losses, 'ema_17': ema_17, 'ema_72': ema_72,
+                'up_down_trend_status': trends, 'peak': peaks})
+        else:
+            return None, None
+
+        # Week interval
+        candles_df = weekly_candles_df
+
+        ema_17 = pd.Series([0])
+        ema_17 = pd.concat([ema_17, candles_df['close_price'].ewm(span=17,
+            adjust=False).mean()], ignore_index=True)
+        ema_17.drop(ema_17.index[-1], inplace=True)
+
+        ema_72 = pd.Series([0])
+        ema_72 = pd.concat([ema_72, candles_df['close_price'].ewm(span=72,
+            adjust=False).mean()], ignore_index=True)
+        ema_72.drop(ema_72.index[-1], inplace=True)
+
+        peaks = [0] * len(candles_df)
+        peaks_raw = TickerManager.find_candles_peaks(candles_df['max_price'].to_list(),
+            candles_df['min_price'].to_list())
+        if peaks_raw is not None:
+            for peak in peaks_raw:
+                peaks[peak['index']] = peak['magnitude']
+
+        if candles_df.empty is False and peaks_raw is not None:
+            weekly_features_df = pd.DataFrame({'ticker': self._ticker,
+                'week': candles_df['week'], 'ema_17': ema_17,
+                'ema_72': ema_72, 'peak': peaks})
+        else:
+            return daily_features_df, None
+
+        return daily_features_df, weekly_features_df
+
     def find_target_buy_price_and_trend(self, prices_df, close_column_name='Close',
         time_column_name = 'day', max_colum_name='High', min_column_name='Low',
         window_size=17, peaks_tolerance=0.01, outlier_tolerance=0.10):
@@ -576,8 +988,14 @@ class TickerManager:
         last_update_percent = update_step
         print(f"\nTicker : \'{self.ticker}\' ({self.ticker_number}/{TickerManager.total_tickers})")
 
+        # Peaks of the candles until each day, updated one candle at a time
+        peak_detector = StreamingPeakDetector(window_size=window_size)
+        max_prices = prices_df[max_colum_name].to_list()
+        min_prices = prices_df[min_column_name].to_list()
+        peaks = None
+
         # For each day
-        for index, row in prices_df.iterrows():
+        for position, (index, row) in enumerate(prices_df.iterrows()):
 
             completion_percentage = (index+1)/df_length
             if completion_percentage + 1e-5 >= last_update_percent:
@@ -588,18 +1006,15 @@ class TickerManager:
             target_price = undefined_value
             stop_loss = undefined_value
 
+            peak_detector.add(max_prices[position], min_prices[position])
+
             # if prices_df.loc[prices_df.index[index]][time_column_name] == pd.Timestamp('2017-07-13T00'):
             #     print()
 
             if index >= minimum_data_points:
 
-                max_prices = prices_df.loc[prices_df.index <= index, [max_colum_name]] \
-                    .squeeze().to_list()
-                min_prices = prices_df.loc[prices_df.index <= index, [min_column_name]] \
-                    .squeeze().to_list()
-
-                peaks = TickerManager.find_candles_peaks(max_prices, min_prices,
-                    window_size=window_size)
+                # Only the last 4 peaks are used until the last day
+                peaks = peak_detector.get_peaks(last=4 if position != df_length - 1 else None)
 
                 if peaks is not None and len(peaks) > 3:
                     if peaks[-4]['type'] == 'max':
@@ -680,137 +1095,14 @@ class TickerManager:
 
     @staticmethod
     def find_candles_peaks(max_prices, min_prices, window_size=17):
-
-        if len(max_prices) != len(min_prices):
-            return None
-
-        votes = np.zeros_like(max_prices)
-        last_windows_index = window_size - 1
-
-        # Create moving windows and detect local minima and local maxima
-        if len(max_prices) > window_size:
-            for i in range(len(max_prices) - window_size):
-                max_subsequence = max_prices[i:i + window_size]
-                min_subsequence = min_prices[i:i + window_size]
-
-                # Vote only if value is not in the window border
-                argmax = np.argmax(max_subsequence)
-                if argmax not in [0, last_windows_index]:
-                    votes[i + argmax] += 1
-
-                argmin = np.argmin(min_subsequence)
-                if argmin not in [0, last_windows_index]:
-                    votes[i + argmin] -= 1
-
-            votes = [vote if abs(vote) >= window_size // 2 else 0 for vote in votes]
-
-            max_peaks_index = [index for index, vote in enumerate(votes) if vote > 0]
-            min_peaks_index = [index for index, vote in enumerate(votes) if vote < 0]
-
-            max_peaks_values = [max_prices[max_peak] for max_peak in max_peaks_index]
-            min_peaks_values = [min_prices[min_peak] for min_peak in min_peaks_index]
-
-        else:
-            return None
-
-        return TickerManager.analyze_peaks(max_peaks_index, min_peaks_index,
-            max_peaks_values, min_peaks_values)
+        """Find candles peaks, see `peaks.find_candles_peaks()`."""
+        return find_candles_peaks(max_prices, min_prices, window_size=window_size)
 
     @staticmethod
     def analyze_peaks(max_peaks_index, min_peaks_index, max_peaks_values, min_peaks_values):
-
-        if (max_peaks_index is None or len(max_peaks_index) < 2) or \
-            (min_peaks_index is None or len(min_peaks_index) < 2):
-            return None
-
-        # ordered_peaks = sorted(max_peaks_index + min_peaks_index)
-        ordered_peaks = [{'type': 'max', 'index': p_index, 'value':
-            max_peaks_values[max_peaks_index.index(p_index)]}
-            if p_index in max_peaks_index
-            else {'type': 'min', 'index': p_index, 'value':
-            min_peaks_values[min_peaks_index.index(p_index)]}
-            for p_index in sorted(max_peaks_index + min_peaks_index)]
-        peaks_number = len(ordered_peaks)
-
-        # print('Ordered Peaks:')
-        # for peak in ordered_peaks:
-        #     print(peak)
-        # print()
-
-        # Create sequences of max and min peaks
-        first_peak = 'max' if max_peaks_index[0] < min_peaks_index[0] else 'min'
-        sequences = []
-        current_sequence = {'type': first_peak, 'index': [], 'magnitude': ordered_peaks[0]['value']}
-        current_type = first_peak
-
-        for i, peak in enumerate(ordered_peaks):
-            if peak['type'] == current_type:
-                current_sequence['index'].append(peak['index'])
-                current_sequence['magnitude'] = max(current_sequence['magnitude'], peak['value']) \
-                    if current_type == 'max' else min(current_sequence['magnitude'], peak['value'])
-            else:
-                sequences.append(current_sequence.copy())
-                current_type = peak['type']
-                current_sequence['type'] = peak['type']
-                current_sequence['index'] = [peak['index']]
-                current_sequence['magnitude'] = peak['value']
-
-            if i == peaks_number - 1:
-                sequences.append(current_sequence.copy())
-
-        # print('Ordered Sequences:')
-        # for sequence in sequences:
-        #     print(sequence)
-        # print()
-
-        # Remove invalid peak sequences
-        ok = False
-        while not ok:
-            last_sequence = {}
-            for i, sequence in enumerate(sequences):
-                if i != 0:
-                    if sequence['type'] == 'min' and last_sequence['type'] == 'max':
-                        if sequence['magnitude'] >= last_sequence['magnitude']:
-                            del sequences[i]
-                            break
-                    elif sequence['type'] == 'max' and last_sequence['type'] == 'min':
-                        if sequence['magnitude'] <= last_sequence['magnitude']:
-                            del sequences[i]
-                            break
-                    # Last and current of same type
-                    else:
-                        sequences[i]['magnitude'] = max(sequence['magnitude'], last_sequence['magnitude']) \
-                            if sequence['type'] == 'max' else \
-                            min(sequence['magnitude'], last_sequence['magnitude'])
-                        sequences[i]['index'].extend(last_sequence['index'])
-                        del sequences[i-1]
-                        break
-                last_sequence = sequence
-                if i == len(sequences) - 1:
-                    ok = True
-
-        # print('Filtered and Ordered Sequences:')
-        # for sequence in sequences:
-        #     print(sequence)
-        # print()
-
-        # Choose peak representative of each sequence
-        for i in range(len(sequences)):
-            if len(sequences[i]['index']) > 1:
-                if sequences[i]['type'] == 'max':
-                    selected_index = max_peaks_index[max_peaks_values.index(sequences[i]['magnitude'])]
-                else:
-                    selected_index = min_peaks_index[min_peaks_values.index(sequences[i]['magnitude'])]
-                sequences[i]['index'] = selected_index
-            else:
-                sequences[i]['index'] = sequences[i]['index'][0]
-
-        # print('Final Sequence:')
-        # for sequence in sequences:
-        #     print(sequence)
-        # print()
-
-        return sequences
+        """Filter candles peaks, see `peaks.analyze_peaks()`."""
+        return analyze_peaks(max_peaks_index, min_peaks_index, max_peaks_values,
+            min_peaks_values)
 
     # TODO : Implement 'margin_from_peak'
     @staticmethod
@@ -899,4 +1191,44 @@ class TickerManager:
 
             trend = Trend.DOWNTREND.value
 
-        return trend
\ No newline at end of file
+        return trend
+
+
+class _FinishedResult:
+    """Result of `_compute_ticker_features()` computed in this process."""
+    def __init__(self, result):
+        self._result = result
+
+    def ready(self):
+        return True
+
+    def get(self):
+        return self._result
+
+
+def _compute_ticker_features(tm, daily_candles_df, weekly_candles_df):
+    """
+    Compute features of a ticker, in a pool worker.
+
+    Errors are returned, not raised, so the other tickers are not affected.
+
+    Returns
+    ----------
+    `pandas.DataFrame` or None
+        Daily features.
+    `pandas.DataFrame` or None
+        Weekly features.
+    float
+        Run time in seconds.
+    str or None
+        Error traceback.
+    """
+    start = time.perf_counter()
+
+    try:
+        daily_features_df, weekly_features_df = tm._compute_features(daily_candles_df,
+            weekly_candles_df)
+    except Exception:
+        return None, None, time.perf_counter() - start, traceback.format_exc()
+
+    return daily_features_df, weekly_features_df, time.perf_counter() - start, None
@@ -0,0 +1,600 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from collections import deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import constants as c
+from peaks import find_candles_peaks, get_windows_extrema, find_window_peaks
+from rolling_spearman import RollingSpearman
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+class TickerRiskState:
+    """
+    Incremental risks and trends of a single ticker, one candle at a time.
+
+    Same day step of `MLDerivationStrategy._load_risks_and_trends_file()`, but
+    keeping only the last values each indicator needs (bounded windows and
+    filter states), so each new day costs the same whatever the history length.
+
+    Values of a day only depend on previous candles, so the row of a day is
+    calculated before its candle is added.
+
+    Properties
+    ----------
+    length : int
+        Number of candles added.
+
+    Methods
+    ----------
+    push(open_price, close_price, max_price, min_price, volume)
+        Get risks and trends of the candle day and add the candle.
+    get_history(open_prices, close_prices, max_prices, min_prices, volumes, init_rows=1)
+        Get risks and trends of a whole candles history.
+    get_parameters()
+        Get trend and risk parameters.
+    save_history(path, days, history)
+        Save risks and trends history to `.npz` file.
+    load_history(path, columns=None)
+        Load risks and trends history from `.npz` file.
+    """
+    # Trend parameters
+    N_pri = 20
+    N_vol = 60
+    N_dot = 2
+    lpf_alpha = 0.1
+    spearman_up_threshold = 0.5
+    downtrend_inertia = 3
+    anomalies_inertia = 2
+    crisis_halt_inertia = 8
+    # Risk parameters
+    N_delta = 20
+    N_peak_window = 80
+    peaks_window_size = 5
+    min_peaks_for_analysis = 5
+    climbs_lpf_alpha = 0.5
+    gain_loss_ratio = 3
+    risk_lpf_alpha = 0.3
+    down_inertia_alpha = 0.10
+
+    _parameters = ('N_pri', 'N_vol', 'N_dot', 'lpf_alpha', 'spearman_up_threshold',
+        'downtrend_inertia', 'anomalies_inertia', 'crisis_halt_inertia', 'N_delta',
+        'N_peak_window', 'peaks_window_size', 'min_peaks_for_analysis', 'climbs_lpf_alpha',
+        'gain_loss_ratio', 'risk_lpf_alpha', 'down_inertia_alpha')
+
+    def __init__(self):
+        cls = TickerRiskState
+
+        # Last candles
+        self._mid_prices = deque(maxlen=max(cls.N_pri, cls.N_dot))
+        self._volumes = deque(maxlen=cls.N_vol)
+        self._deltas = deque(maxlen=cls.N_delta)
+        self._max_prices = deque(maxlen=cls.N_peak_window)
+        self._min_prices = deque(maxlen=cls.N_peak_window)
+        self._spearman = RollingSpearman((cls.N_pri,))
+        self._length = 0
+
+        # Last values of filters
+        self._mid_prices_dot = 0.0
+        self._mid_prices_dot_for_risk = 0.0
+        self._avg_climbs = 0.0
+        self._std_climbs = 0.0
+        self._min_risk = 0.0
+
+        # Inertia counters
+        self._downtrend_inertia_counter = cls.downtrend_inertia
+        self._crisis_inertia_counter = cls.crisis_halt_inertia
+        self._anomalies_counter = 0
+        self._in_uptrend_flag = False
+
+    @property
+    def length(self):
+        return self._length
+
+    def push(self, open_price, close_price, max_price, min_price, volume):
+        """
+        Get risks and trends of the candle day and add the candle.
+
+        Args
+        ----------
+        open_price : float
+            Open price.
+        close_price : float
+            Close price.
+        max_price : float
+            Max price.
+        min_price : float
+            Min price.
+        volume : float
+            Volume.
+
+        Returns
+        ----------
+        `dict`
+            'uptrend', 'downtrend', 'crisis', 'min_risk', 'max_risk' and
+            'avg_climbs' of the day, as written in the risks and trends file.
+        """
+        if self._length == 0:
+            row = {'uptrend': False, 'downtrend': True, 'crisis': False, 'min_risk': 0.0,
+                'max_risk': 0.0, 'avg_climbs': 0.0}
+        else:
+            row = self._get_row()
+
+        # Candle must be the last to avoid non-causality
+        self._mid_prices.append((open_price + close_price) / 2)
+        self._spearman.push(self._mid_prices[-1])
+        self._max_prices.append(max_price)
+        self._min_prices.append(min_price)
+        self._deltas.append(max_price - min_price)
+        self._volumes.append(volume)
+        self._length += 1
+
+        return row
+
+    def _get_row(self):
+
+        cls = TickerRiskState
+        # Rows already calculated, same as candles added
+        n_rows = self._length
+
+        # Trend identification
+        if self._length >= cls.N_pri:
+            last_mid_prices = list(self._mid_prices)[-cls.N_pri:]
+            cum_spearman = self._spearman.correlation(cls.N_pri)
+            avg_price = np.mean(last_mid_prices)
+            std_price = np.std(last_mid_prices)
+        else:
+            cum_spearman = 0.0
+            avg_price = 0.0
+            std_price = 0.0
+
+        if self._length >= cls.N_vol:
+            avg_volume = np.mean(list(self._volumes))
+            std_volume = np.std(list(self._volumes))
+        else:
+            avg_volume = 0.0
+            std_volume = 0.0
+
+        if self._length >= cls.N_dot:
+            # LPF for prices derivative ( y[i] := α * x[i] + (1-α) * y[i-1] )
+            mid_dot = (self._mid_prices[-1] - self._mid_prices[-2]) \
+                / ((self._mid_prices[-2] + self._mid_prices[-1])/2)
+
+            self._mid_prices_dot = cls.lpf_alpha * mid_dot \
+                + (1-cls.lpf_alpha) * self._mid_prices_dot
+            self._mid_prices_dot_for_risk = cls.risk_lpf_alpha * mid_dot \
+                + (1-cls.risk_lpf_alpha) * self._mid_prices_dot_for_risk
+        else:
+            self._mid_prices_dot = 0.0
+            self._mid_prices_dot_for_risk = 0.0
+
+        # Volume and price down anomalies
+        volume_anomaly = self._volumes[-1] > avg_volume + std_volume
+        price_down_anomaly = self._mid_prices[-1] < avg_price + std_price
+
+        # Standard deviation of price deltas
+        if self._length < cls.N_delta:
+            std_price_deltas = 0.0
+        else:
+            std_price_deltas = np.std(list(self._deltas))
+
+        # Peaks for climbs identification
+        peaks = find_candles_peaks(list(self._max_prices), list(self._min_prices),
+            window_size=cls.peaks_window_size)
+
+        if peaks is not None and len(peaks) >= cls.min_peaks_for_analysis \
+            and n_rows >= cls.N_peak_window*0.75:
+            climbs = []
+            for idx in range(len(peaks)):
+                if idx > 0:
+                    if peaks[idx]['type'] == 'max' and peaks[idx-1]['type'] == 'min':
+                        if peaks[idx]['magnitude'] > peaks[idx-1]['magnitude']:
+                            climbs.append( round((peaks[idx]['magnitude'] - peaks[idx-1]['magnitude']) \
+                                / peaks[idx-1]['magnitude'], 4) )
+
+            self._avg_climbs = cls.climbs_lpf_alpha * np.mean(np.array(climbs)) \
+                + (1-cls.climbs_lpf_alpha) * self._avg_climbs
+            self._std_climbs = cls.climbs_lpf_alpha * np.std(np.array(climbs)) + \
+                (1-cls.climbs_lpf_alpha) * self._std_climbs
+        else:
+            self._avg_climbs = 0.0
+            self._std_climbs = 0.0
+
+        # Trend analysis: downtrend
+        if n_rows + 1 <= cls.N_dot:
+            downtrend = False
+        else:
+            if self._mid_prices_dot < 0:
+                downtrend = True
+                self._downtrend_inertia_counter = 0
+            else:
+                if self._downtrend_inertia_counter < cls.downtrend_inertia:
+                    downtrend = True
+                    self._downtrend_inertia_counter += 1
+                else:
+                    downtrend = False
+
+        # Trend analysis: crisis
+        if n_rows + 1 < cls.N_vol:
+            crisis = False
+        else:
+            if volume_anomaly and price_down_anomaly:
+                self._anomalies_counter += 1
+                if self._anomalies_counter >= cls.anomalies_inertia:
+                    crisis = True
+                    self._crisis_inertia_counter = 0
+                else:
+                    crisis = self._get_crisis_inertia()
+            else:
+                crisis = self._get_crisis_inertia()
+
+                if self._anomalies_counter != 0:
+                    self._anomalies_counter = 0
+
+        # Trend analysis: uptrend
+        if n_rows + 1 < cls.N_pri:
+            uptrend = False
+        else:
+            uptrend = bool(self._mid_prices_dot > 0 and cum_spearman >= cls.spearman_up_threshold)
+            self._in_uptrend_flag = uptrend
+
+        # Risk analysis
+        if self._length < cls.N_delta:
+            fixed_min_risk = 0.0
+        else:
+            # Two times half standard deviation = standard deviation
+            fixed_min_risk = std_price_deltas / self._mid_prices[-1]
+
+        if n_rows + 1 <= cls.N_dot:
+            variable_min_risk = 0.0
+        else:
+            variable_min_risk = max( -self._mid_prices_dot_for_risk, 0)
+
+        if n_rows + 1 < max(cls.N_delta, cls.N_dot):
+            self._min_risk = 0.0
+        else:
+            # down_inertia_alpha
+            new_min_risk = fixed_min_risk + variable_min_risk
+
+            if new_min_risk >= self._min_risk:
+                self._min_risk = new_min_risk
+            else:
+                # LPF for downward inertia only ( y[i] := α * x[i] + (1-α) * y[i-1] )
+                self._min_risk = cls.down_inertia_alpha * (new_min_risk) \
+                    + (1-cls.down_inertia_alpha) * self._min_risk
+
+        if n_rows + 1 < cls.N_peak_window * 0.75:
+            max_risk = 0.0
+        else:
+            max_risk = round(
+                (self._avg_climbs - 0.5 * self._std_climbs) / cls.gain_loss_ratio, 4)
+
+        return {'uptrend': uptrend, 'downtrend': downtrend, 'crisis': crisis,
+            'min_risk': round(self._min_risk, 4), 'max_risk': max_risk,
+            'avg_climbs': self._avg_climbs}
+
+    @classmethod
+    def get_history(cls, open_prices, close_prices, max_prices, min_prices, volumes,
+        init_rows=1):
+        """
+        Get risks and trends of a whole candles history.
+
+        Same rows as `MLDerivationStrategy._load_risks_and_trends_file()` for one
+        ticker. Moving averages, deviations and Spearman correlations are
+        calculated over all windows at once, and the argmax of each peaks window
+        only once for the whole history. Only filters and inertia counters,
+        which depend on their own last value, are scanned day by day.
+
+        Args
+        ----------
+        open_prices : `list` of float
+            Open prices.
+        close_prices : `list` of float
+            Close prices.
+        max_prices : `list` of float
+            Max prices.
+        min_prices : `list` of float
+            Min prices.
+        volumes : `list` of float
+            Volumes.
+        init_rows : int, default 1
+            Number of first rows without indicators, filters at rest. At least 1.
+
+        Returns
+        ----------
+        `dict`
+            Columns of the risks and trends file, except 'ticker' and 'day'.
+            Risk columns are not rounded.
+        """
+        n_candles = len(open_prices)
+
+        if n_candles > 0 and init_rows < 1:
+            logger.error(f"Risks and trends history needs at least one row without "
+                f"indicators, 'init_rows'={init_rows}.")
+            # sys.exit(c.INVALID_ARGUMENT_ERR)
+            raise Exception
+
+        open_prices = np.array(open_prices)
+        close_prices = np.array(close_prices)
+        max_prices = np.array(max_prices)
+        min_prices = np.array(min_prices)
+        volumes = np.array(volumes)
+
+        mid_prices = (open_prices + close_prices) / 2
+        deltas = max_prices - min_prices
+
+        # Indicators of a row only use previous candles
+        avg_price, std_price = _get_window_stats(mid_prices, cls.N_pri)
+        avg_volume, std_volume = _get_window_stats(volumes, cls.N_vol)
+        _, std_price_deltas = _get_window_stats(deltas, cls.N_delta)
+
+        cum_spearman = np.zeros(n_candles)
+        cum_spearman[cls.N_pri:] = RollingSpearman.get_window_correlations(
+            mid_prices[:-1], cls.N_pri)
+
+        mid_dot = np.zeros(n_candles)
+        mid_dot[cls.N_dot:] = (mid_prices[1:-1] - mid_prices[:-2])[:n_candles - cls.N_dot] \
+            / ((mid_prices[:-2] + mid_prices[1:-1])/2)[:n_candles - cls.N_dot]
+
+        for column in (avg_price, std_price, avg_volume, std_volume, std_price_deltas):
+            column[:init_rows] = 0.0
+
+        volume_anomalies = np.zeros(n_candles, dtype=bool)
+        volume_anomalies[init_rows:] = volumes[init_rows-1:-1] \
+            > avg_volume[init_rows:] + std_volume[init_rows:]
+
+        price_down_anomalies = np.zeros(n_candles, dtype=bool)
+        price_down_anomalies[init_rows:] = mid_prices[init_rows-1:-1] \
+            < avg_price[init_rows:] + std_price[init_rows:]
+
+        # Argmax and argmin of each peaks window
+        max_argmax, min_argmin = get_windows_extrema(max_prices, min_prices,
+            cls.peaks_window_size)
+
+        history = {'mid_prices_dot': [0.0] * n_candles,
+            'mid_prices_dot_for_risk': [0.0] * n_candles,
+            'avg_climbs': [0.0] * n_candles, 'std_climbs': [0.0] * n_candles,
+            'fixed_min_risk': [0.0] * n_candles, 'variable_min_risk': [0.0] * n_candles,
+            'min_risk': [0.0] * n_candles, 'max_risk': [0.0] * n_candles,
+            'uptrend': [False] * n_candles, 'downtrend': [True] * n_candles,
+            'crisis': [False] * n_candles}
+
+        # Filters and counters at rest
+        mid_prices_dot = mid_prices_dot_for_risk = 0.0
+        avg_climbs = std_climbs = min_risk = 0.0
+        downtrend_inertia_counter = cls.downtrend_inertia
+        crisis_inertia_counter = cls.crisis_halt_inertia
+        anomalies_counter = 0
+
+        for idx in range(init_rows, n_candles):
+
+            if idx >= cls.N_dot:
+                # LPF for prices derivative ( y[i] := α * x[i] + (1-α) * y[i-1] )
+                mid_prices_dot = cls.lpf_alpha * mid_dot[idx] \
+                    + (1-cls.lpf_alpha) * mid_prices_dot
+                mid_prices_dot_for_risk = cls.risk_lpf_alpha * mid_dot[idx] \
+                    + (1-cls.risk_lpf_alpha) * mid_prices_dot_for_risk
+            else:
+                mid_prices_dot = mid_prices_dot_for_risk = 0.0
+
+            # Peaks for climbs identification
+            peaks = None
+            if idx >= cls.N_peak_window*0.75:
+                peaks = find_window_peaks(max_prices, min_prices, max_argmax, min_argmin,
+                    max(0, idx - cls.N_peak_window), idx, cls.peaks_window_size)
+
+            if peaks is not None and len(peaks) >= cls.min_peaks_for_analysis:
+                climbs = []
+                for peak_idx in range(1, len(peaks)):
+                    if peaks[peak_idx]['type'] == 'max' and peaks[peak_idx-1]['type'] == 'min':
+                        if peaks[peak_idx]['magnitude'] > peaks[peak_idx-1]['magnitude']:
+                            climbs.append( round((peaks[peak_idx]['magnitude'] \
+                                - peaks[peak_idx-1]['magnitude']) \
+                                / peaks[peak_idx-1]['magnitude'], 4) )
+
+                avg_climbs = cls.climbs_lpf_alpha * np.mean(np.array(climbs)) \
+                    + (1-cls.climbs_lpf_alpha) * avg_climbs
+                std_climbs = cls.climbs_lpf_alpha * np.std(np.array(climbs)) + \
+                    (1-cls.climbs_lpf_alpha) * std_climbs
+            else:
+                avg_climbs = std_climbs = 0.0
+
+            # Trend analysis: downtrend
+            if idx + 1 <= cls.N_dot:
+                downtrend = False
+            elif mid_prices_dot < 0:
+                downtrend = True
+                downtrend_inertia_counter = 0
+            elif downtrend_inertia_counter < cls.downtrend_inertia:
+                downtrend = True
+                downtrend_inertia_counter += 1
+            else:
+                downtrend = False
+
+            # Trend analysis: crisis
+            if idx + 1 < cls.N_vol:
+                crisis = False
+            else:
+                anomaly = volume_anomalies[idx] and price_down_anomalies[idx]
+
+                if anomaly:
+                    anomalies_counter += 1
+
+                if anomaly and anomalies_counter >= cls.anomalies_inertia:
+                    crisis = True
+                    crisis_inertia_counter = 0
+                elif crisis_inertia_counter < cls.crisis_halt_inertia:
+                    crisis = True
+                    crisis_inertia_counter += 1
+                else:
+                    crisis = False
+
+                if not anomaly:
+                    anomalies_counter = 0
+
+            # Trend analysis: uptrend
+            uptrend = idx + 1 >= cls.N_pri and bool(mid_prices_dot > 0 \
+                and cum_spearman[idx] >= cls.spearman_up_threshold)
+
+            # Risk analysis
+            if idx < cls.N_delta:
+                fixed_min_risk = 0.0
+            else:
+                # Two times half standard deviation = standard deviation
+                fixed_min_risk = std_price_deltas[idx] / mid_prices[idx-1]
+
+            if idx + 1 <= cls.N_dot:
+                variable_min_risk = 0.0
+            else:
+                variable_min_risk = max( -mid_prices_dot_for_risk, 0)
+
+            if idx + 1 < max(cls.N_delta, cls.N_dot):
+                min_risk = 0.0
+            else:
+                new_min_risk = fixed_min_risk + variable_min_risk
+
+                if new_min_risk >= min_risk:
+                    min_risk = new_min_risk
+                else:
+                    # LPF for downward inertia only ( y[i] := α * x[i] + (1-α) * y[i-1] )
+                    min_risk = cls.down_inertia_alpha * (new_min_risk) \
+                        + (1-cls.down_inertia_alpha) * min_risk
+
+            if idx + 1 < cls.N_peak_window * 0.75:
+                max_risk = 0.0
+            else:
+                max_risk = round((avg_climbs - 0.5 * std_climbs) / cls.gain_loss_ratio, 4)
+
+            history['mid_prices_dot'][idx] = mid_prices_dot
+            history['mid_prices_dot_for_risk'][idx] = mid_prices_dot_for_risk
+            history['avg_climbs'][idx] = avg_climbs
+            history['std_climbs'][idx] = std_climbs
+            history['fixed_min_risk'][idx] = fixed_min_risk
+            history['variable_min_risk'][idx] = variable_min_risk
+            history['min_risk'][idx] = min_risk
+            history['max_risk'][idx] = max_risk
+            history['uptrend'][idx] = uptrend
+            history['downtrend'][idx] = downtrend
+            history['crisis'][idx] = crisis
+
+        # Peaks of the whole history
+        last_max_peaks = [False] * n_candles
+        last_min_peaks = [False] * n_candles
+
+        for peak in find_window_peaks(max_prices, min_prices, max_argmax, min_argmin,
+            0, n_candles, cls.peaks_window_size):
+            if peak['type'] == 'min':
+                last_min_peaks[peak['index']] = True
+            else:
+                last_max_peaks[peak['index']] = True
+
+        return {'last_mid_prices': mid_prices, 'last_deltas': deltas,
+            'last_volumes': volumes, 'last_max_prices': max_prices,
+            'last_min_prices': min_prices, 'last_open_prices': open_prices,
+            'last_close_prices': close_prices, 'last_max_peaks': last_max_peaks,
+            'last_min_peaks': last_min_peaks, 'avg_volume': avg_volume,
+            'std_volume': std_volume, 'mid_prices_dot': history['mid_prices_dot'],
+            'mid_prices_dot_for_risk': history['mid_prices_dot_for_risk'],
+            'avg_price': avg_price, 'std_price': std_price,
+            'std_price_deltas': std_price_deltas, 'volume_anomalies': volume_anomalies,
+            'price_down_anomalies': price_down_anomalies, 'crisis': history['crisis'],
+            'downtrend': history['downtrend'], 'uptrend': history['uptrend'],
+            'fixed_min_risk': history['fixed_min_risk'],
+            'variable_min_risk': history['variable_min_risk'],
+            'min_risk': history['min_risk'], 'avg_climbs': history['avg_climbs'],
+            'std_climbs': history['std_climbs'], 'max_risk': history['max_risk']}
+
+    @classmethod
+    def get_parameters(cls):
+        """
+        Get trend and risk parameters.
+
+        Returns
+        ----------
+        `dict`
+            Parameter name and value.
+        """
+        return {parameter: getattr(cls, parameter) for parameter in cls._parameters}
+
+    @staticmethod
+    def save_history(path, days, history):
+        """
+        Save risks and trends history to `.npz` file, one array per column.
+
+        Args
+        ----------
+        path : `Path`
+            File path.
+        days : `list` of `pd.Timestamp`
+            Day of each row.
+        history : `dict`
+            Columns, as returned by `get_history()`.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(path, 'wb') as file:
+            np.savez(file, day=np.array(days, dtype='datetime64[D]'),
+                **{column: np.asarray(values) for column, values in history.items()})
+
+        logger.debug(f"Risks and trends history saved: '{path}' ({len(days)} rows).")
+
+    @staticmethod
+    def load_history(path, columns=None):
+        """
+        Load risks and trends history from `.npz` file.
+
+        Only the given columns are read from the file.
+
+        Args
+        ----------
+        path : `Path`
+            File path.
+        columns : `list` of str, optional
+            Columns to load, besides 'day'. All columns if None.
+
+        Returns
+        ----------
+        `dict`
+            'day' and columns arrays, or None if file does not exist.
+        """
+        if not path.exists():
+            return None
+
+        with np.load(path, allow_pickle=False) as data:
+            if columns is None:
+                columns = [column for column in data.files if column != 'day']
+
+            return {column: data[column] for column in ['day'] + list(columns)}
+
+    def _get_crisis_inertia(self):
+
+        if self._crisis_inertia_counter < TickerRiskState.crisis_halt_inertia:
+            self._crisis_inertia_counter += 1
+            return True
+
+        return False
+
+
+def _get_window_stats(values, window):
+    """Mean and standard deviation of the `window` values before each row, 0.0 if fewer."""
+    avg = np.zeros(len(values))
+    std = np.zeros(len(values))
+
+    if len(values) > window:
+        # Contiguous copy: each window is reduced alone, same sums as `np.mean(window_values)`
+        windows = np.ascontiguousarray(sliding_window_view(values[:-1], window))
+        avg[window:] = windows.mean(axis=1)
+        std[window:] = windows.std(axis=1)
+
+    return avg, std
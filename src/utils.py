@@ -5,9 +5,12 @@ from contextlib import ContextDecorator
 from time import time
 from datetime import timedelta
 import numpy as np
+import pandas as pd
 from enum import Enum
 
 import constants as c
+# Peaks detection moved to `peaks`, names kept for existing imports
+from peaks import analyze_peaks, find_candles_peaks
 
 # Configure Logging
 logger = logging.getLogger(__name__)
@@ -252,135 +255,57 @@ def take_best_n_indexes(series, n):
     # return tuple(best_indexes)
     return tuple([best_value[1] for _, best_value in enumerate(best_values)])
 
-def analyze_peaks(max_peaks_index, min_peaks_index, max_peaks_values, min_peaks_values):
-
-    if (max_peaks_index is None or len(max_peaks_index) < 2) or \
-        (min_peaks_index is None or len(min_peaks_index) < 2):
-        return None
-
-    # ordered_peaks = sorted(max_peaks_index + min_peaks_index)
-    ordered_peaks = [{'type': 'max', 'index': p_index, 'value':
-        max_peaks_values[max_peaks_index.index(p_index)]}
-        if p_index in max_peaks_index
-        else {'type': 'min', 'index': p_index, 'value':
-        min_peaks_values[min_peaks_index.index(p_index)]}
-        for p_index in sorted(max_peaks_index + min_peaks_index)]
-    peaks_number = len(ordered_peaks)
-
-    # print('Ordered Peaks:')
-    # for peak in ordered_peaks:
-    #     print(peak)
-    # print()
-
-    # Create sequences of max and min peaks
-    first_peak = 'max' if max_peaks_index[0] < min_peaks_index[0] else 'min'
-    sequences = []
-    current_sequence = {'type': first_peak, 'index': [], 'magnitude': ordered_peaks[0]['value']}
-    current_type = first_peak
-
-    for i, peak in enumerate(ordered_peaks):
-        if peak['type'] == current_type:
-            current_sequence['index'].append(peak['index'])
-            current_sequence['magnitude'] = max(current_sequence['magnitude'], peak['value']) \
-                if current_type == 'max' else min(current_sequence['magnitude'], peak['value'])
-        else:
-            sequences.append(current_sequence.copy())
-            current_type = peak['type']
-            current_sequence['type'] = peak['type']
-            current_sequence['index'] = [peak['index']]
-            current_sequence['magnitude'] = peak['value']
-
-        if i == peaks_number - 1:
-            sequences.append(current_sequence.copy())
-
-    # print('Ordered Sequences:')
-    # for sequence in sequences:
-    #     print(sequence)
-    # print()
-
-    # Remove invalid peak sequences
-    ok = False
-    while not ok:
-        last_sequence = {}
-        for i, sequence in enumerate(sequences):
-            if i != 0:
-                if sequence['type'] == 'min' and last_sequence['type'] == 'max':
-                    if sequence['magnitude'] >= last_sequence['magnitude']:
-                        del sequences[i]
-                        break
-                elif sequence['type'] == 'max' and last_sequence['type'] == 'min':
-                    if sequence['magnitude'] <= last_sequence['magnitude']:
-                        del sequences[i]
-                        break
-                # Last and current of same type
-                else:
-                    sequences[i]['magnitude'] = max(sequence['magnitude'], last_sequence['magnitude']) \
-                        if sequence['type'] == 'max' else \
-                        min(sequence['magnitude'], last_sequence['magnitude'])
-                    sequences[i]['index'].extend(last_sequence['index'])
-                    del sequences[i-1]
-                    break
-            last_sequence = sequence
-            if i == len(sequences) - 1:
-                ok = True
-
-    # print('Filtered and Ordered Sequences:')
-    # for sequence in sequences:
-    #     print(sequence)
-    # print()
-
-    # Choose peak representative of each sequence
-    for i in range(len(sequences)):
-        if len(sequences[i]['index']) > 1:
-            if sequences[i]['type'] == 'max':
-                selected_index = max_peaks_index[max_peaks_values.index(sequences[i]['magnitude'])]
-            else:
-                selected_index = min_peaks_index[min_peaks_values.index(sequences[i]['magnitude'])]
-            sequences[i]['index'] = selected_index
-        else:
-            sequences[i]['index'] = sequences[i]['index'][0]
-
-    # print('Final Sequence:')
-    # for sequence in sequences:
-    #     print(sequence)
-    # print()
-
-    return sequences
-
-
-def find_candles_peaks(max_prices, min_prices, window_size=17):
+def count_active_intervals(dates, start_dates, end_dates, groups=None):
+    """
+    Count active intervals per day.
 
-    if len(max_prices) != len(min_prices):
-        return None
+    An interval is active from its start date until its end date, both
+    inclusive. Intervals without end date (None or NaT) are active from the
+    start date on. Counted with a difference array: +1 at the first day index
+    of each interval, -1 after the last one, then a cumulative sum.
 
-    votes = np.zeros_like(max_prices)
-    last_windows_index = window_size - 1
+    Args
+    ----------
+    dates : `list` of `pd.Timestamp`
+        Sorted dates.
+    start_dates : `list` of `pd.Timestamp`
+        Start date of each interval.
+    end_dates : `list` of `pd.Timestamp`
+        End date of each interval. None or NaT if not ended.
+    groups : `list`, optional
+        Group (e.g. ticker) of each interval.
 
-    # Create moving windows and detect local minima and local maxima
-    if len(max_prices) > window_size:
-        for i in range(len(max_prices) - window_size):
-            max_subsequence = max_prices[i:i + window_size]
-            min_subsequence = min_prices[i:i + window_size]
+    Returns
+    ----------
+    `np.ndarray` of int
+        Active intervals per day, if `groups` is None.
+    `dict` of `np.ndarray` of int
+        Active intervals per day of each group, otherwise.
+    """
+    dates = pd.to_datetime(dates).to_numpy()
+    start_dates = pd.to_datetime(start_dates).to_numpy()
+    end_dates = pd.to_datetime(end_dates).to_numpy()
 
-            # Vote only if value is not in the window border
-            argmax = np.argmax(max_subsequence)
-            if argmax not in [0, last_windows_index]:
-                votes[i + argmax] += 1
+    start_indexes = np.searchsorted(dates, start_dates, side='left')
+    end_indexes = np.searchsorted(dates, end_dates, side='right')
+    end_indexes[np.isnat(end_dates)] = len(dates)
 
-            argmin = np.argmin(min_subsequence)
-            if argmin not in [0, last_windows_index]:
-                votes[i + argmin] -= 1
+    valid = start_indexes < end_indexes
 
-        votes = [vote if abs(vote) >= window_size // 2 else 0 for vote in votes]
+    if groups is None:
+        group_names = [None]
+        group_indexes = np.zeros(len(start_indexes), dtype=np.int64)
+    else:
+        group_names, group_indexes = np.unique(np.asarray(groups), return_inverse=True)
+        group_names = group_names.tolist()
 
-        max_peaks_index = [index for index, vote in enumerate(votes) if vote > 0]
-        min_peaks_index = [index for index, vote in enumerate(votes) if vote < 0]
+    diff = np.zeros((len(group_names), len(dates) + 1), dtype=np.int64)
+    np.add.at(diff, (group_indexes[valid], start_indexes[valid]), 1)
+    np.add.at(diff, (group_indexes[valid], end_indexes[valid]), -1)
 
-        max_peaks_values = [max_prices[max_peak] for max_peak in max_peaks_index]
-        min_peaks_values = [min_prices[min_peak] for min_peak in min_peaks_index]
+    counts = np.cumsum(diff[:, :-1], axis=1)
 
-    else:
-        return None
+    if groups is None:
+        return counts[0]
 
-    return analyze_peaks(max_peaks_index, min_peaks_index,
-        max_peaks_values, min_peaks_values)
+    return {group: counts[idx] for idx, group in enumerate(group_names)}
@@ -0,0 +1,294 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import hashlib
+import os
+import pickle
+import threading
+import time
+import pandas as pd
+import yfinance as yf
+
+import constants as c
+
+# Configure Logging
+logger = logging.getLogger(__name__)
+log_path = Path(__file__).parent.parent / c.LOG_PATH / c.LOG_FILENAME
+file_handler = RotatingFileHandler(log_path, maxBytes=c.LOG_FILE_MAX_SIZE, backupCount=10)
+formatter = logging.Formatter(c.LOG_FORMATTER_STRING)
+file_handler.setFormatter(formatter)
+logger.addHandler(file_handler)
+file_handler.setLevel(logging.DEBUG)
+logger.setLevel(logging.DEBUG)
+
+
+class YahooFinanceFetcher:
+    """
+    Yahoo Finance daily candlesticks requests, with retries and on-disk cache.
+
+    Raw responses are saved in `c.YAHOO_CACHE_PATH`, one file per (symbol,
+    start date, end date). Prices are back adjusted, so every new split or
+    dividend changes the prices of past intervals too: intervals are always
+    requested again, and a cached response is only replayed if the request
+    fails or returns no data (Yahoo Finance often answers failures with empty
+    frames). Panels missing any symbol are incomplete, handled the same way.
+    Empty and incomplete responses are never cached.
+
+    With `replay`, cached responses are replayed without any request, for fast
+    offline runs. Intervals not cached are still requested.
+
+    Requests of many intervals run concurrently in a thread pool with
+    `prefetch()`, so they are limited by network concurrency. Responses are
+    kept in memory until the first `get_history()` call of the same interval.
+
+    Many symbols can also be requested at once, in a single wide frame, with
+    `get_panel()`. Panels are cached the same way, by symbols set and interval.
+
+    Args
+    ----------
+    max_workers : int, default 8
+        Maximum number of concurrent requests of `prefetch()`.
+    retries : int, default 3
+        Number of retries of a failed request.
+    backoff : float, default 1.0
+        Seconds before the first retry, doubled on each retry.
+    replay : bool, default False
+        Replay cached responses without requesting them again.
+
+    Properties
+    ----------
+    max_workers : int
+        Maximum number of concurrent requests of `prefetch()`.
+    replay : bool
+        Replay cached responses without requesting them again.
+
+    Methods
+    ----------
+    get_history(symbol, start_date, end_date)
+        Get daily candlesticks of a closed interval.
+    get_panel(symbols, start_date, end_date)
+        Get daily candlesticks of many symbols in a single frame.
+    prefetch(requests)
+        Request intervals concurrently, kept for `get_history()`.
+    """
+    def __init__(self, max_workers=8, retries=3, backoff=1.0, replay=False):
+
+        if max_workers < 1:
+            logger.error(f"Error argument \'max_workers\' must be at least 1, "
+                f"got {max_workers}.")
+            # sys.exit(c.INVALID_ARGUMENT_ERR)
+            raise Exception
+
+        self._max_workers = max_workers
+        self._retries = retries
+        self._backoff = backoff
+        self._replay = replay
+        self._cache_path = Path(__file__).parent.parent / c.YAHOO_CACHE_PATH
+        # Prefetched responses not read yet
+        self._prefetched = {}
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    @max_workers.setter
+    def max_workers(self, max_workers):
+        self._max_workers = max_workers
+
+    @property
+    def replay(self):
+        return self._replay
+
+    @replay.setter
+    def replay(self, replay):
+        self._replay = replay
+
+    def get_history(self, symbol, start_date, end_date):
+        """
+        Get daily candlesticks of a closed interval.
+
+        Args
+        ----------
+        symbol : str
+            Yahoo Finance symbol.
+        start_date : `datetime.date`
+            Start date.
+        end_date : `datetime.date`
+            End date.
+
+        Returns
+        ----------
+        `pandas.DataFrame`
+            DataFrame with candles, same as `yf.Ticker.history()`.
+        """
+        if (symbol, start_date, end_date) in self._prefetched:
+            return self._prefetched.pop((symbol, start_date, end_date))
+
+        return self._get(symbol, self._get_cache_path(symbol, start_date, end_date),
+            lambda: yf.Ticker(symbol).history(
+            start=start_date.strftime('%Y-%m-%d'),
+            end=(end_date+timedelta(days=1)).strftime('%Y-%m-%d'),
+            prepost=True, back_adjust=True, rounding=True))
+
+    def get_panel(self, symbols, start_date, end_date):
+        """
+        Get daily candlesticks of many symbols in a single frame.
+
+        Symbols are requested by Yahoo Finance download, using `max_workers`
+        threads. Dates missing for a symbol but present for another are NaN.
+
+        Args
+        ----------
+        symbols : `list` of str
+            Yahoo Finance symbols.
+        start_date : `datetime.date`
+            Start date.
+        end_date : `datetime.date`
+            End date.
+
+        Returns
+        ----------
+        `pandas.DataFrame`
+            DataFrame with candles of all symbols, index of dates and columns
+            (symbol, field). Fields are the same as `get_history()` columns.
+        """
+        symbols = sorted(set(symbols))
+        digest = hashlib.md5(','.join(symbols).encode()).hexdigest()
+        name = f"panel of {len(symbols)} symbol(s)"
+
+        panel = self._get(name, self._get_cache_path(f"panel_{digest}", start_date, end_date),
+            lambda: yf.download(symbols, start=start_date.strftime('%Y-%m-%d'),
+            end=(end_date+timedelta(days=1)).strftime('%Y-%m-%d'), actions=True,
+            auto_adjust=True, back_adjust=True, prepost=True, rounding=True,
+            group_by='ticker', threads=self._max_workers, progress=False),
+            lambda panel: YahooFinanceFetcher._is_complete_panel(panel, symbols))
+
+        # Single symbol downloads may not have the symbol column level
+        if not panel.empty and panel.columns.nlevels == 1:
+            panel = panel.copy()
+            panel.columns = pd.MultiIndex.from_product([symbols, panel.columns])
+
+        return panel
+
+    def prefetch(self, requests):
+        """
+        Request intervals concurrently, kept for `get_history()`.
+
+        Failed requests are logged, not raised: `get_history()` tries again
+        when the interval is needed.
+
+        Args
+        ----------
+        requests : `list` of `tuple`
+            Symbol, start date and end date of each request.
+
+        Returns
+        ----------
+        `list` of `tuple`
+            Failed requests.
+        """
+        requests = list(dict.fromkeys(requests))
+        failures = []
+
+        if not requests:
+            return failures
+
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=min(self._max_workers, len(requests))) as executor:
+            futures = [executor.submit(self.get_history, *request) for request in requests]
+
+            for request, future in zip(requests, futures):
+                try:
+                    self._prefetched[request] = future.result()
+                except Exception as error:
+                    logger.error(f"Error prefetching \'{request[0]}\' "
+                        f"(\'{request[1].strftime('%Y-%m-%d')}\', "
+                        f"\'{request[2].strftime('%Y-%m-%d')}\'), error:\n{error}")
+                    failures.append(request)
+
+        logger.info(f"Prefetched {len(requests) - len(failures)} of {len(requests)} "
+            f"Yahoo Finance request(s) in {round(time.perf_counter() - start, 1)} second(s) "
+            f"with {self._max_workers} worker(s).")
+
+        return failures
+
+    def _get(self, name, path, request, is_complete=None):
+
+        cached = self._load(path)
+
+        if self._replay and cached is not None:
+            return cached['history']
+
+        try:
+            history = self._request(name, request)
+        except Exception as error:
+            if cached is None:
+                raise error
+
+            logger.warning(f"Request of \'{name}\' failed, using cached response of "
+                f"\'{cached['request_date'].strftime('%Y-%m-%d')}\'.")
+            return cached['history']
+
+        # Not retried: intervals without trading days are empty too
+        if history.empty or (is_complete is not None and not is_complete(history)):
+            if cached is not None:
+                logger.warning(f"Request of \'{name}\' returned "
+                    f"{'no' if history.empty else 'incomplete'} data, using cached response "
+                    f"of \'{cached['request_date'].strftime('%Y-%m-%d')}\'.")
+                return cached['history']
+
+            return history
+
+        self._save(path, {'request_date': date.today(), 'history': history})
+
+        return history
+
+    def _request(self, name, request):
+
+        for attempt in range(self._retries + 1):
+            try:
+                return request()
+            except Exception as error:
+                if attempt == self._retries:
+                    raise error
+
+                delay = self._backoff * 2 ** attempt
+                logger.warning(f"Request of \'{name}\' failed, retrying in {delay} "
+                    f"second(s), error:\n{error}")
+                time.sleep(delay)
+
+    @staticmethod
+    def _is_complete_panel(panel, symbols):
+        """Check whether every symbol has any data in the panel."""
+        if panel.columns.nlevels == 1:
+            return bool(panel.notna().to_numpy().any())
+
+        panel_symbols = set(panel.columns.get_level_values(0))
+
+        return all(symbol in panel_symbols and bool(panel[symbol].notna().to_numpy().any()) \
+            for symbol in symbols)
+
+    def _get_cache_path(self, symbol, start_date, end_date):
+        return self._cache_path / (f"{symbol}_{start_date.strftime('%Y-%m-%d')}_"
+            f"{end_date.strftime('%Y-%m-%d')}" + c.YAHOO_CACHE_SUFFIX)
+
+    @staticmethod
+    def _load(path):
+        if not path.exists():
+            return None
+
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+    @staticmethod
+    def _save(path, response):
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Written aside and renamed, readers never see a partial file
+        temp_path = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'wb') as file:
+            pickle.dump(response, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)